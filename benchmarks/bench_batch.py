@@ -0,0 +1,72 @@
+"""Compares parsing many argument lists with a loop around FlagHandler.parse and with \
+FlagHandler.parse_many.
+
+Run from the repository root with `python benchmarks/bench_batch.py`.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Batch benchmark.")
+    fh.str_flag("-n", "Job name.", optional=False, aliases=["--name"])
+    fh.str_flag("-q", "Queue.", "default", aliases=["--queue"])
+    fh.int_flag("-c", "CPUs.", 1, aliases=["--cpus"])
+    fh.int_flag("-m", "Memory (MB).", 1024, aliases=["--memory"])
+    fh.int_flag("-p", "Priority.", 0, aliases=["--priority"])
+    fh.bool_flag("-r", "Retry on failure.", aliases=["--retry"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    for i in range(20):
+        fh.str_flag(f"--extra-{i}", "Unused option.", "")
+    return fh
+
+
+def build_argvs(count: int) -> list[list[str]]:
+    rng = random.Random(0)
+    argvs = []
+    for i in range(count):
+        argv = ["job", "--name", f"job-{i}", "-c", str(rng.randint(1, 64)),
+                "--memory", str(rng.randint(1, 512) * 1024)]
+        if rng.random() < 0.5:
+            argv += ["--queue", rng.choice(["short", "long", "gpu"])]
+        if rng.random() < 0.3:
+            argv.append("--retry")
+        argvs.append(argv)
+    return argvs
+
+
+def timed(function) -> float:  # type: ignore[no-untyped-def]
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    rows = 200_000
+    argvs = build_argvs(rows)
+
+    fh = build_handler()
+    loop_time = timed(lambda: [fh.parse(argv) for argv in argvs])
+    compiled_fh = build_handler()
+    compiled_fh.compile()
+    compiled_loop_time = timed(lambda: [compiled_fh.parse(argv) for argv in argvs])
+    many_time = timed(lambda: compiled_fh.parse_many(argvs))
+    pool_time = timed(lambda: compiled_fh.parse_many(argvs, processes=os.cpu_count()))
+
+    print(f"{rows} rows")
+    for label, seconds in (("loop around parse", loop_time),
+                           ("loop around compiled parse", compiled_loop_time),
+                           ("parse_many", many_time),
+                           (f"parse_many, {os.cpu_count()} processes", pool_time)):
+        print(f"{label:>32}: {seconds:7.3f} s {rows / seconds:>12,.0f} rows/s "
+              f"{loop_time / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compares the throughput of a reference per-token loop, of FlagHandler.parse and of the parser \
+from FlagHandler.compile().
+
+Run from the repository root with `python benchmarks/bench_compile.py`. The reference loop is how \
+parse worked before the dispatch tables: every token is looked for in the list of flags, its type \
+is matched and its value converted, then the defaults are filled in. FlagHandler.parse uses the \
+same dispatch tables as the compiled parser (rebuilt when flags are added), so those two should be \
+close, and the speedups are against the reference.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler(number_of_flags: int) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Compile benchmark.")
+    for i in range(number_of_flags):
+        match i % 3:
+            case 0:
+                fh.int_flag(f"-i{i}", "An int flag.", 0, aliases=[f"--int-{i}"])
+            case 1:
+                fh.str_flag(f"-s{i}", "A string flag.", "", aliases=[f"--string-{i}"])
+            case 2:
+                fh.bool_flag(f"-b{i}", "A bool flag.", aliases=[f"--bool-{i}"])
+    return fh
+
+
+def build_argv(number_of_tokens: int) -> list[str]:
+    argv = ["bench"]
+    i = 0
+    while len(argv) - 1 < number_of_tokens:
+        match i % 3:
+            case 0:
+                argv += [f"--int-{i}", str(i)]
+            case 1:
+                argv += [f"-s{i}", "value"]
+            case 2:
+                argv += [f"--bool-{i}"]
+        i += 1
+    return argv
+
+
+def reference_parse(fh: flags.FlagHandler, args: list[str]) -> dict[str, flags.flag_value]:
+    result: dict[str, flags.flag_value] = {}
+    i = 1
+    while i < len(args):
+        arg = args[i]
+        for flag in fh.flags:
+            if arg == flag.flag or arg in flag.aliases:
+                break
+        else:
+            raise ValueError(f"Couldn't understand token `{arg}`.")
+        match flag:
+            case flags.IntFlag() | flags.StringFlag():
+                assert i + 1 < len(args), f"Expected more arguments for flag `{arg}`."
+                result[flag.flag] = flag._convert(args[i + 1])
+                i += 1
+            case flags.BoolFlag():
+                result[flag.flag] = True
+        i += 1
+    missing = []
+    for flag in fh.flags:
+        if flag.flag in result:
+            continue
+        if flag.optional and flag.default_value is not None:
+            result[flag.flag] = flag._convert(flag.default_value)
+        else:
+            missing.append(flag.flag)
+    assert not missing, f"You need to pass the following obligatory flags: {', '.join(missing)}"
+    return result
+
+
+def main() -> None:
+    print(f"{'tokens':>8} {'reference (us)':>15} {'parse (us)':>17} {'compiled (us)':>17}")
+    for number_of_tokens in (10, 100, 1_000):
+        # Every flag appears once, so the results hold no repeated flags.
+        argv = build_argv(number_of_tokens)
+        number_of_flags = len(argv)
+        repeats = max(10, 20_000 // number_of_tokens)
+
+        interpreted = build_handler(number_of_flags)
+        interpreted.parse(argv)  # Adds the help flag, like compile does.
+        assert reference_parse(interpreted, argv) == dict(interpreted.parse_result(argv).items())
+        compiled = build_handler(number_of_flags).compile()
+
+        def per_parse(parse):  # type: ignore[no-untyped-def]
+            return timeit.timeit(parse, number=repeats) / repeats
+
+        reference_time = per_parse(lambda: reference_parse(interpreted, argv))
+        interpreted_time = per_parse(lambda: interpreted.parse(argv))
+        compiled_time = per_parse(lambda: compiled.parse(argv))
+        print(f"{len(argv) - 1:>8} {reference_time * 1e6:>15.1f} "
+              f"{interpreted_time * 1e6:>10.1f} {reference_time / interpreted_time:>5.1f}x "
+              f"{compiled_time * 1e6:>10.1f} {reference_time / compiled_time:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compares prefix completion through FlagHandler.complete (a radix trie) with scanning every flag.
+
+Run from the repository root with `python benchmarks/bench_completion.py`.
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler(rng: random.Random, number_of_flags: int) -> flags.FlagHandler:
+    words = sorted({"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+                    for _ in range(400)})
+    names: set[str] = set()
+    while len(names) < number_of_flags:
+        names.add("--" + "-".join(rng.sample(words, 2)))
+    fh = flags.FlagHandler("Completion benchmark.")
+    for i, name in enumerate(sorted(names)):
+        fh.int_flag(name, "A flag.", 0, aliases=[f"-f{i}"])
+    return fh
+
+
+def scan(fh: flags.FlagHandler, prefix: str) -> list[str]:
+    return sorted(name for flag in fh.flags for name in (flag.flag, *flag.aliases)
+                  if name.startswith(prefix))
+
+
+def main() -> None:
+    rng = random.Random(0)
+    print(f"{'flags':>8} {'trie (us)':>10} {'scan (us)':>10}")
+    for number_of_flags in (100, 1_000, 10_000):
+        fh = build_handler(rng, number_of_flags)
+        names = [flag.flag for flag in fh.flags]
+        prefixes = [rng.choice(names)[:rng.randint(3, 6)] for _ in range(50)]
+        fh.complete([""])  # Builds the trie.
+        for prefix in prefixes:
+            assert fh.complete([prefix]) == scan(fh, prefix)
+        trie = timeit.timeit(lambda: [fh.complete([prefix]) for prefix in prefixes], number=5)
+        scanned = timeit.timeit(lambda: [scan(fh, prefix) for prefix in prefixes], number=5)
+        print(f"{number_of_flags:>8} {trie / (5 * len(prefixes)) * 1e6:>10.1f} "
+              f"{scanned / (5 * len(prefixes)) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
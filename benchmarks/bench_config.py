@@ -0,0 +1,91 @@
+"""Measures the cost of reading a large TOML config file (see FlagHandler.config_file).
+
+Run from the repository root with `python benchmarks/bench_config.py`. A config file of a few \
+megabytes is generated (200 scalar flags and two long lists). It reports:
+- in one process: the first parse (which reads and checks the file), parsing again with the file \
+unchanged, and parsing with a new handler with the same flags (the in-memory cache);
+- the wall time of a short-lived program that parses once, without a cache directory and with a \
+warm one (see `FlagHandler.compile(cache_dir=...)`).
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flags  # noqa: E402
+
+# A short-lived program: builds the handler below and parses once.
+PROGRAM = """
+import sys
+sys.path.insert(0, "benchmarks")
+import bench_config
+bench_config.build_handler(*sys.argv[1:]).parse(["config"])
+"""
+
+
+def build_handler(path: str, cache_dir: Optional[str] = None) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Config benchmark.")
+    fh.output_function = lambda text: None
+    for i in range(200):
+        fh.int_flag(f"--int-{i}", "An int flag.", 0)
+    fh.int_list_flag("--ids", "Many ints.")
+    fh.str_list_flag("--hosts", "Many strings.")
+    fh.config_file(path, required=True)
+    if cache_dir is not None:
+        fh.compile(cache_dir=cache_dir)
+    return fh
+
+
+def write_config(path: str) -> None:
+    with open(path, "w") as file:
+        for i in range(200):
+            file.write(f"int-{i} = {i}\n")
+        file.write("ids = [" + ", ".join(str(i) for i in range(200_000)) + "]\n")
+        file.write("hosts = [" + ", ".join(f'"host-{i}.example.com"' for i in range(50_000))
+                   + "]\n")
+
+
+def timed(function) -> float:  # type: ignore[no-untyped-def]
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run_time(*args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", PROGRAM, *args], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.toml")
+        write_config(path)
+        print(f"config file: {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        fh = build_handler(path)
+        first = timed(lambda: fh.parse(["config"]))
+        again = statistics.median(timed(lambda: fh.parse(["config"])) for _ in range(100))
+        other = build_handler(path)
+        other_handler = timed(lambda: other.parse(["config"]))
+        print(f"first parse:            {first * 1000:9.3f} ms")
+        print(f"parse again:            {again * 1000:9.3f} ms")
+        print(f"new handler, same file: {other_handler * 1000:9.3f} ms")
+
+        subprocess.run([sys.executable, "-m", "py_compile", "flags.py"], cwd=ROOT, check=True)
+        no_cache = statistics.median(run_time(path) for _ in range(5))
+        cache_dir = os.path.join(directory, "cache")
+        run_time(path, cache_dir)  # Fills the cache.
+        warm = statistics.median(run_time(path, cache_dir) for _ in range(5))
+        print(f"program, no cache:      {no_cache * 1000:9.1f} ms")
+        print(f"program, warm cache:    {warm * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
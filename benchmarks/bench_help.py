@@ -0,0 +1,32 @@
+"""Times rendering the help message of a handler with many flags, the first time and after.
+
+Run from the repository root with `python benchmarks/bench_help.py`.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler(number_of_flags: int) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Help benchmark.")
+    for i in range(number_of_flags):
+        fh.int_flag(f"-f{i}", f"Flag number {i}.", i, optional=i % 10 != 0,
+                    aliases=[f"--flag-{i}"])
+    return fh
+
+
+def main() -> None:
+    print(f"{'flags':>8} {'first (us)':>12} {'cached (us)':>12}")
+    for number_of_flags in (10, 100, 1_000):
+        fh = build_handler(number_of_flags)
+        first = timeit.timeit(lambda: fh._generate_help_message("bench.py"), number=1)
+        cached = timeit.timeit(lambda: fh._generate_help_message("bench.py"), number=10_000)
+        print(f"{number_of_flags:>8} {first * 1e6:>12.1f} {cached / 10_000 * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Measures the memory used per registered flag and per parse result, with tracemalloc.
+
+Run from the repository root with `python benchmarks/bench_memory.py`.
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+NUMBER_OF_FLAGS = 10_000
+NUMBER_OF_RESULTS = 10_000
+
+
+def build_handler(number_of_flags: int) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Memory benchmark.")
+    for i in range(number_of_flags):
+        fh.int_flag(f"-f{i}", "A flag.", 0, aliases=[f"--flag-{i}"])
+    return fh
+
+
+def measure(function):  # type: ignore[no-untyped-def]
+    # Returns what `function` returns and how many bytes it left allocated.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = function()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, after - before
+
+
+def main() -> None:
+    _, handler_bytes = measure(lambda: build_handler(NUMBER_OF_FLAGS))
+    print(f"{handler_bytes / NUMBER_OF_FLAGS:10.1f} bytes per registered flag (with one alias)")
+
+    fh = build_handler(20)
+    argv = ["bench", "-f1", "1", "--flag-2", "2", "-f3", "3"]
+    fh.parse(argv)  # Adds the help flag before measuring.
+    _, results_bytes = measure(lambda: [fh.parse(argv) for _ in range(NUMBER_OF_RESULTS)])
+    print(f"{results_bytes / NUMBER_OF_RESULTS:10.1f} bytes per parse result (21 flags)")
+
+
+if __name__ == "__main__":
+    main()
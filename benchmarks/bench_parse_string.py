@@ -0,0 +1,99 @@
+"""Compares splitting command lines with `shlex.split` and then parsing the words against \
+FlagHandler.parse_string and FlagHandler.parse_strings, on a synthetic log file of command lines.
+
+Run from the repository root with `python benchmarks/bench_parse_string.py`. The log file is \
+written to a temporary directory and read back line by line, as a real log would be.
+"""
+import os
+import random
+import shlex
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Command line benchmark.")
+    fh.str_flag("-n", "Job name.", optional=False, aliases=["--name"])
+    fh.str_flag("-q", "Queue.", "default", aliases=["--queue"])
+    fh.str_flag("-d", "Description.", "", aliases=["--description"])
+    fh.int_flag("-c", "CPUs.", 1, aliases=["--cpus"])
+    fh.int_flag("-m", "Memory (MB).", 1024, aliases=["--memory"])
+    fh.bool_flag("-r", "Retry on failure.", aliases=["--retry"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    for i in range(20):
+        fh.str_flag(f"--extra-{i}", "Unused option.", "")
+    fh.compile()
+    return fh
+
+
+def write_log(path: str, count: int) -> None:
+    # Only forms that `shlex.split` followed by `parse` understands too (no `--flag=value` or
+    # bundled switches), so both sides parse the same lines.
+    rng = random.Random(0)
+    with open(path, "w") as file:
+        for i in range(count):
+            words = ["/usr/bin/job", "--name", f"job-{i}", "-c", str(rng.randint(1, 64)),
+                     "--memory", str(rng.randint(1, 512) * 1024)]
+            if rng.random() < 0.5:
+                words += ["--queue", rng.choice(["short", "long", "gpu"])]
+            if rng.random() < 0.3:
+                words.append("--retry")
+            if rng.random() < 0.3:
+                words += ["-d", f"'nightly run {i}'"]
+            if rng.random() < 0.1:
+                words += ["--extra-3", '"path with \\"quotes\\""']
+            file.write(" ".join(words) + "\n")
+
+
+def timed(function) -> float:  # type: ignore[no-untyped-def]
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    rows = 200_000
+    fh = build_handler()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "commands.log")
+        write_log(path, rows)
+
+        def shlex_loop() -> None:
+            with open(path) as file:
+                for line in file:
+                    fh.parse_result(shlex.split(line))
+
+        def parse_string_loop() -> None:
+            with open(path) as file:
+                for line in file:
+                    fh.parse_string(line)
+
+        def shlex_parse_many() -> None:
+            with open(path) as file:
+                fh.parse_many(shlex.split(line) for line in file)
+
+        def parse_strings() -> None:
+            with open(path) as file:
+                fh.parse_strings(file)
+
+        shlex_time = timed(shlex_loop)
+        results = [
+            ("shlex.split + parse_result", shlex_time),
+            ("parse_string", timed(parse_string_loop)),
+            ("shlex.split + parse_many", timed(shlex_parse_many)),
+            ("parse_strings", timed(parse_strings)),
+        ]
+
+    print(f"{rows} lines")
+    for label, seconds in results:
+        print(f"{label:>28}: {seconds:7.3f} s {rows / seconds:>12,.0f} lines/s "
+              f"{shlex_time / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Times flag registration and parsing for growing numbers of flags.
+
+Run from the repository root with `python benchmarks/bench_registration.py`. If lookups are O(1), \
+the time per flag should stay roughly flat as the flag count grows. (Parsing visits every flag once \
+to fill in defaults, so it is measured per registered flag too.)
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def build_handler(number_of_flags: int) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Registration benchmark.")
+    for i in range(number_of_flags):
+        fh.int_flag(f"-f{i}", f"Flag number {i}.", 0, aliases=[f"--flag-number-{i}"])
+    return fh
+
+
+def build_argv(number_of_flags: int) -> list[str]:
+    argv = ["bench"]
+    for i in range(0, number_of_flags, max(1, number_of_flags // 100)):
+        argv += [f"--flag-number-{i}", str(i)]
+    return argv
+
+
+def main() -> None:
+    print(f"{'flags':>8} {'register (us/flag)':>20} {'parse (us/flag)':>18}")
+    for number_of_flags in (100, 1_000, 5_000, 10_000):
+        repeats = max(1, 20_000 // number_of_flags)
+        register_time = timeit.timeit(lambda: build_handler(number_of_flags), number=repeats)
+
+        fh = build_handler(number_of_flags)
+        argv = build_argv(number_of_flags)
+        parse_time = timeit.timeit(lambda: fh.parse(argv), number=repeats)
+
+        print(f"{number_of_flags:>8} "
+              f"{register_time / repeats / number_of_flags * 1e6:>20.3f} "
+              f"{parse_time / repeats / number_of_flags * 1e6:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
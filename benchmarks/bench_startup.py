@@ -0,0 +1,72 @@
+"""Measures the startup cost of a short-lived program that uses `flags`.
+
+Run from the repository root with `python benchmarks/bench_startup.py`. It reports:
+- the import time of `flags`, from `python -X importtime`;
+- the wall time of a program with 2000 flags that misspells a flag (so it needs the \
+typo-suggestion index) and then renders the help, without a cache, with an empty cache (cold) \
+and with a filled cache (warm), see `FlagHandler.compile(cache_dir=...)`.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAM = """
+import sys
+import flags
+
+rng = __import__("random").Random(0)
+words = sorted({"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 8)))
+                for _ in range(400)})
+fh = flags.FlagHandler("Startup benchmark.")
+fh.output_function = lambda text: None
+names = set()
+while len(names) < 2000:
+    names.add("--" + "-".join(rng.sample(words, 2)))
+for i, name in enumerate(sorted(names)):
+    fh.int_flag(f"-f{i}", "A flag.", 0, aliases=[name])
+cache_dir = sys.argv[1] if len(sys.argv) > 1 else None
+fh.compile(cache_dir=cache_dir)
+try:
+    fh.parse(["startup", sorted(names)[7][:-1]])
+except ValueError:
+    pass
+fh._generate_help_message("startup")
+"""
+
+
+def import_time() -> int:
+    # Microseconds, as reported by `-X importtime` (cumulative, for `flags` itself).
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import flags"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    return int(output.strip().splitlines()[-1].split("|")[1])
+
+
+def run_time(*args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", PROGRAM, *args], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    # Make sure the bytecode of flags.py is compiled, so it isn't counted.
+    subprocess.run([sys.executable, "-m", "py_compile", "flags.py"], cwd=ROOT, check=True)
+    print(f"import flags: {statistics.median(import_time() for _ in range(7)) / 1000:.2f} ms")
+
+    no_cache = statistics.median(run_time() for _ in range(5))
+    cold, warm = [], []
+    for _ in range(5):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(run_time(cache_dir))
+            warm.append(run_time(cache_dir))
+    print(f"no cache: {no_cache * 1000:.1f} ms")
+    print(f"cold:     {statistics.median(cold) * 1000:.1f} ms")
+    print(f"warm:     {statistics.median(warm) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Times typo suggestions (FlagHandler._find_closest_flags) for growing numbers of flags.
+
+Run from the repository root with `python benchmarks/bench_suggestions.py`.
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+
+def random_words(rng: random.Random, count: int) -> list[str]:
+    words: set[str] = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))))
+    return sorted(words)
+
+
+def build_handler(rng: random.Random, number_of_flags: int) -> tuple[flags.FlagHandler, list[str]]:
+    words = random_words(rng, 400)
+    names: set[str] = set()
+    while len(names) < 2 * number_of_flags:
+        names.add("--" + "-".join(rng.sample(words, rng.randint(2, 3))))
+    ordered_names = sorted(names)
+    fh = flags.FlagHandler("Suggestion benchmark.")
+    for i in range(number_of_flags):
+        fh.int_flag(ordered_names[2*i], "A flag.", aliases=[ordered_names[2*i+1]])
+    return fh, ordered_names
+
+
+def typo(rng: random.Random, name: str) -> str:
+    # Swap two letters and append one.
+    i = rng.randrange(2, len(name) - 1)
+    return name[:i] + name[i+1] + name[i] + name[i+2:] + rng.choice(string.ascii_lowercase)
+
+
+def main() -> None:
+    rng = random.Random(0)
+    print(f"{'flags':>8} {'first (ms)':>12} {'next (ms)':>12}")
+    for number_of_flags in (100, 1_000, 5_000):
+        fh, names = build_handler(rng, number_of_flags)
+        queries = [typo(rng, name) for name in rng.sample(names, 50)]
+        # The first suggestion also builds the index.
+        first = timeit.timeit(lambda: fh._find_closest_flags(queries[0]), number=1)
+        following = timeit.timeit(lambda: [fh._find_closest_flags(q) for q in queries], number=5)
+        print(f"{number_of_flags:>8} {first * 1e3:>12.3f} "
+              f"{following / (5 * len(queries)) * 1e3:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Benchmarks `flags` against an equivalent `argparse` parser, for growing schema sizes.
+
+Run from the repository root with `python benchmarks/bench_suite.py`. For every size, a synthetic \
+schema is generated (a third each of int, string and bool flags, each with one long alias) and \
+registered both with `flags.FlagHandler` and with `argparse.ArgumentParser`. The suite measures:
+- registration: time per registered flag;
+- parse: time per token of an argument list that uses (up to) 50 flags;
+- typo: latency of rejecting a misspelled flag (for `flags`, including the suggestions), the \
+first time and after that;
+- help: time to render the help message, the first time and after that;
+- memory: peak memory (tracemalloc) of registering the schema and parsing once.
+
+A table is printed and the numbers are written as JSON (see --output). Only the standard library \
+is needed.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flags  # noqa: E402
+
+FLAG_TYPES = ("int", "str", "bool")
+
+
+class ArgumentError(Exception):
+    pass
+
+
+class RaisingArgumentParser(argparse.ArgumentParser):
+    # argparse exits on errors, even with exit_on_error=False for unknown arguments.
+    def error(self, message: str) -> Any:
+        raise ArgumentError(message)
+
+
+def synthetic_schema(rng: random.Random, number_of_flags: int) -> list[tuple[str, str, str]]:
+    """Returns (type, name, alias) for every flag. Aliases are made of words, so typos are \
+    realistic."""
+    words: set[str] = set()
+    while len(words) < 400:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))))
+    ordered_words = sorted(words)
+    aliases: set[str] = set()
+    while len(aliases) < number_of_flags:
+        aliases.add("--" + "-".join(rng.sample(ordered_words, rng.randint(2, 3))))
+    return [(FLAG_TYPES[i % 3], f"-f{i}", alias) for i, alias in enumerate(sorted(aliases))]
+
+
+def build_flags(schema: list[tuple[str, str, str]]) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Benchmark suite.")
+    fh.output_function = lambda text: None
+    for flag_type, name, alias in schema:
+        if flag_type == "int":
+            fh.int_flag(name, "An int flag.", 0, aliases=[alias])
+        elif flag_type == "str":
+            fh.str_flag(name, "A string flag.", "", aliases=[alias])
+        else:
+            fh.bool_flag(name, "A bool flag.", aliases=[alias])
+    return fh
+
+
+def build_argparse(schema: list[tuple[str, str, str]]) -> argparse.ArgumentParser:
+    parser = RaisingArgumentParser(description="Benchmark suite.", allow_abbrev=False)
+    for flag_type, name, alias in schema:
+        if flag_type == "int":
+            parser.add_argument(name, alias, type=int, default=0, help="An int flag.")
+        elif flag_type == "str":
+            parser.add_argument(name, alias, default="", help="A string flag.")
+        else:
+            parser.add_argument(name, alias, action="store_true", help="A bool flag.")
+    return parser
+
+
+def argument_list(rng: random.Random, schema: list[tuple[str, str, str]]) -> list[str]:
+    # Uses up to 50 distinct flags, by name or by alias.
+    tokens: list[str] = []
+    for flag_type, name, alias in rng.sample(schema, min(50, len(schema))):
+        tokens.append(rng.choice((name, alias)))
+        if flag_type == "int":
+            tokens.append(str(rng.randrange(1000)))
+        elif flag_type == "str":
+            tokens.append(rng.choice(string.ascii_lowercase) * 3)
+    return tokens
+
+
+def misspell(rng: random.Random, alias: str) -> str:
+    # Swap two letters and append one.
+    i = rng.randrange(2, len(alias) - 1)
+    return alias[:i] + alias[i+1] + alias[i] + alias[i+2:] + rng.choice(string.ascii_lowercase)
+
+
+def seconds(function: Callable[[], Any], number: int) -> float:
+    """Median time of one call to `function`, over 5 rounds of `number` calls."""
+    rounds = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def once(function: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def expect_error(function: Callable[[], Any]) -> Callable[[], None]:
+    def call() -> None:
+        try:
+            function()
+        except (ValueError, ArgumentError):
+            return
+        raise AssertionError("The misspelled flag was accepted.")
+    return call
+
+
+def peak_memory(function: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(number_of_flags: int) -> dict[str, dict[str, float]]:
+    rng = random.Random(number_of_flags)
+    schema = synthetic_schema(rng, number_of_flags)
+    argv = argument_list(rng, schema)
+    typos = [misspell(rng, alias) for _, _, alias in rng.sample(schema, min(20, len(schema)))]
+    # Fewer repetitions for bigger schemas, so each size takes about as long.
+    number = max(1, 2_000 // number_of_flags)
+    results: dict[str, dict[str, float]] = {}
+
+    for library, build, parse, render_help in (
+        ("flags", build_flags,
+         lambda parser, args: parser.parse(["bench", *args]),
+         lambda parser: parser._generate_help_message("bench")),
+        ("argparse", build_argparse,
+         lambda parser, args: parser.parse_args(args),
+         lambda parser: parser.format_help()),
+    ):
+        registration = seconds(lambda: build(schema), number)
+        parser = build(schema)
+        parse(parser, argv)  # Warm up (for `flags`, builds the dispatch table).
+        parse_time = seconds(lambda: parse(parser, argv), 5 * number)
+        typo_first = once(expect_error(lambda: parse(parser, [typos[0]])))
+        typo_next = statistics.median(
+            seconds(expect_error(lambda: parse(parser, [typo])), 1) for typo in typos[1:] or typos)
+        help_first = once(lambda: render_help(parser))
+        help_next = seconds(lambda: render_help(parser), number)
+        memory = peak_memory(lambda: parse(build(schema), argv))
+        results[library] = {
+            "registration_us_per_flag": registration / number_of_flags * 1e6,
+            "parse_us_per_token": parse_time / max(1, len(argv)) * 1e6,
+            "typo_first_ms": typo_first * 1e3,
+            "typo_ms": typo_next * 1e3,
+            "help_first_ms": help_first * 1e3,
+            "help_ms": help_next * 1e3,
+            "peak_memory_kib": memory / 1024,
+        }
+    return results
+
+
+def main() -> None:
+    fh = flags.FlagHandler("Benchmarks `flags` against `argparse`. See the module docstring.")
+    sizes_flag = fh.str_flag("--sizes", "Comma-separated numbers of flags.", "10,100,1000,10000")
+    output_flag = fh.str_flag("--output", "Where to write the JSON results.",
+                              "benchmark-results.json", aliases=["-o"])
+    fh.parse(sys.argv)
+
+    sizes = [int(size) for size in sizes_flag.data.split(",")]
+    report: dict[str, Any] = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    print(f"{'flags':>6} {'library':>9} {'reg us/flag':>12} {'parse us/tok':>13} "
+          f"{'typo ms':>14} {'help ms':>16} {'peak KiB':>10}")
+    for size in sizes:
+        results = report["sizes"][str(size)] = measure(size)
+        for library, numbers in results.items():
+            print(f"{size:>6} {library:>9} {numbers['registration_us_per_flag']:>12.2f} "
+                  f"{numbers['parse_us_per_token']:>13.2f} "
+                  f"{numbers['typo_first_ms']:>6.2f}/{numbers['typo_ms']:<7.3f} "
+                  f"{numbers['help_first_ms']:>7.2f}/{numbers['help_ms']:<8.3f} "
+                  f"{numbers['peak_memory_kib']:>10.0f}")
+
+    with open(output_flag.data, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output_flag.data}.")
+
+
+if __name__ == "__main__":
+    main()
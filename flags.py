@@ -1,9 +1,36 @@
-from dataclasses import dataclass
-from typing import Union, Optional, Callable, Any, Sequence, cast
-from typing_extensions import assert_never
-from os.path import basename as os_path_basename
-from functools import partial
-import warnings
+from __future__ import annotations
+
+# Only cheap imports up here, since short-lived programs pay for them on every run. The heavier
+# modules (warnings, re, mmap, hashlib, concurrent.futures...) are imported where they are used, and
+# `typing` is only needed for type checking.
+from _thread import _local, allocate_lock
+from itertools import chain
+from os import environ as os_environ, fstat as os_fstat, stat as os_stat
+from os.path import abspath as os_path_abspath, basename as os_path_basename, \
+    realpath as os_path_realpath
+from time import perf_counter_ns
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from array import array
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from typing import Union, Optional, Callable, Any, Iterable, Iterator, Sequence, NoReturn, \
+        TypeVar, overload
+
+    _T = TypeVar("_T")
+    _F = TypeVar("_F", bound="flag_classes")
+    # A validator of FlagHandler.add_validator and whether it's pure.
+    _Validator = tuple[Callable[[Any], Any], bool]
+
+
+def _assert_never(value: NoReturn) -> NoReturn:
+    # Same as `typing.assert_never` (python 3.11+), without importing `typing`.
+    raise AssertionError(f"Expected code to be unreachable, but got: {value!r}")
+
+
+def _print_without_newline(text: str) -> None:
+    print(text, end="")
+
 
 # DEV SETUP
 
@@ -19,27 +46,62 @@ def _flags_debug_trace(*args: Any, **kwargs: Any) -> None:
 _flags_debug_trace("If you don't want debug logs, change the `_DEBUG` variable in flags.py.")
 
 
+# Set by the scripts of FlagHandler.completion_script when they run the program to complete a
+# command line. Read once, so parsing only checks a global: every way of parsing the program's own
+# command line (FlagHandler and CompiledParser parse, parse_result, parse_result_async,
+# parse_string, stream) prints the completions and exits instead, so the program never runs on a
+# Tab press. parse_many and parse_strings don't: they parse stored command lines, not this one.
+_COMPLETION_VARIABLE = "FLAGS_COMPLETE"
+_COMPLETION_REQUESTED = _COMPLETION_VARIABLE in os_environ
+
+
 # FLAG TYPES:
 
 # TODO: Change Flags to have a "take" method that tries to parse the next argument(s), \
 # i.e. change the responsibility to parse the argument to the flags instead of the \
-# FlagHandler. This will probably make implementing "greedy" flags trivial.
+# FlagHandler. ("Greedy" flags are IntListFlag and StringListFlag, taken by the parser.)
 
 
 # TODO: Refactor code duplication in errors for the diffent kinds of typed flags.
 
-@dataclass
 class Flag:
-    flag: str
-    aliases: Optional[list[str]]
-    description: str
-    default_value: Optional['flag_value']
-    optional: bool
+    # Plain classes with __slots__ rather than dataclasses: small instances, and no need to import
+    # `dataclasses` (and `inspect`, `re`...) at startup.
+    __slots__ = ("flag", "aliases", "description", "default_value", "optional", "env")
+    _fields: tuple[str, ...] = __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[flag_default], optional: bool):
+        self.flag = flag
+        self.aliases = aliases
+        self.description = description
+        self.default_value = default_value
+        self.optional = optional
+        # Environment variable that gives the value when the flag isn't passed (set by the
+        # FlagHandler methods that create flags).
+        self.env: Optional[str] = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None  # type: ignore[assignment]  # Mutable, like the data.
 
 
-@dataclass
 class IntFlag(Flag):
-    _data: Optional[int] = None
+    __slots__ = ("_data",)
+    _fields = Flag._fields + __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[flag_value], optional: bool,
+                 _data: Optional[int] = None):
+        super().__init__(flag, aliases, description, default_value, optional)
+        self._data = _data
 
     @property
     def data(self) -> int:
@@ -51,21 +113,27 @@ Try using FlagHandler.parse(...)."""
     @data.setter
     def data(self, value: str | int) -> None:
         assert value is not None, "You can't set the flag's data to a None value."
+        self._data = self._convert(value)
+
+    @staticmethod
+    def _convert(value: str | int) -> int:
         try:
-            self._data = int(value)
+            return int(value)
             # TODO: There's nothing actually enforcing value is an integer. This would just truncate floats, for example.
         except ValueError:
             raise ValueError(
                 f"`{value}` is not a valid value for an `IntFlag`.")
-        except Exception as e:
-            raise e
 
 
-@dataclass
 class BoolFlag(Flag):
-    _data: Optional[bool] = None
-
-    def __post_init__(self) -> None:
+    __slots__ = ("_data",)
+    _fields = Flag._fields + __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[flag_value], optional: bool,
+                 _data: Optional[bool] = None):
+        super().__init__(flag, aliases, description, default_value, optional)
+        self._data = _data
         if self.default_value is None:
             self.default_value = False
 
@@ -79,21 +147,31 @@ Try using FlagHandler.parse(...)."""
     @data.setter
     def data(self, value: str | bool) -> None:
         assert value is not None, "You can't set the flag's data to a None value."
-        if value in [False, "false", "False", "FALSE" "0", "f", "F"]:
-            self._data = False
-        elif value in [True, "true", "True", "TRUE" "1", "t", "T"]:
-            self._data = True
+        self._data = self._convert(value)
+
+    @staticmethod
+    def _convert(value: str | bool) -> bool:
+        if value in [False, "false", "False", "FALSE", "0", "f", "F"]:
+            return False
+        elif value in [True, "true", "True", "TRUE", "1", "t", "T"]:
+            return True
         else:
             raise ValueError(
                 f"`{value}` is not a valid value for a `BoolFlag`.")
 
 
-@dataclass
 class StringFlag(Flag):
     # TODO: If I do implement a string .take() method, this may consume a flag, since flags are strings.
     # Therefore, this class needs some knowledge of what flag commands are/look like.
     # Maybe enforce that flags must start with "-".
-    _data: Optional[str] = None
+    __slots__ = ("_data",)
+    _fields = Flag._fields + __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[flag_value], optional: bool,
+                 _data: Optional[str] = None):
+        super().__init__(flag, aliases, description, default_value, optional)
+        self._data = _data
 
     @property
     def data(self) -> str:
@@ -105,13 +183,213 @@ Try using FlagHandler.parse(...)."""
     @data.setter
     def data(self, value: str) -> None:
         assert value is not None, "You can't set the flag's data to a None value."
+        self._data = self._convert(value)
+
+    @staticmethod
+    def _convert(value: str) -> str:
         try:
-            self._data = str(value)
+            return str(value)
         except ValueError:
             raise ValueError(
                 f"`{value}` is not a valid value for a `StringFlag`.")
-        except Exception as e:
-            raise e
+
+
+class IntListFlag(Flag):
+    """A "greedy" flag: takes every following token up to the next known flag, as ints, into an \
+    `array.array('q')`. With `stdin=True`, the single value `-` reads the values from stdin \
+    instead (separated by whitespace)."""
+    __slots__ = ("stdin", "_data")
+    _fields = Flag._fields + __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[Sequence[str | int]], optional: bool,
+                 stdin: bool = False, _data: Optional[array[int]] = None):
+        super().__init__(flag, aliases, description,
+                         tuple(default_value) if default_value is not None else (),
+                         optional)
+        self.stdin = stdin
+        self._data = _data
+
+    @property
+    def data(self) -> array[int]:
+        assert self._data is not None, \
+            f"""Tried to access the data for flag `{self.flag}` before assigning a value to it. \
+Try using FlagHandler.parse(...)."""
+        return self._data
+
+    @data.setter
+    def data(self, values: Sequence[str | int]) -> None:
+        assert values is not None, "You can't set the flag's data to a None value."
+        self._data = self._convert_many(values)
+
+    @staticmethod
+    def _convert_many(values: Sequence[str | int]) -> array[int]:
+        # All at once in C. On a bad value, `extend` keeps what it appended before, so the length
+        # says which value failed.
+        from array import array
+        converted = array("q")
+        try:
+            converted.extend(map(int, values))
+        except (ValueError, OverflowError, TypeError):
+            bad_value = values[len(converted)]
+            raise ValueError(f"`{bad_value}` (value {len(converted)} of the list) is not a valid \
+value for an `IntListFlag`.") from None
+        return converted
+
+
+class StringListFlag(Flag):
+    """A "greedy" flag: takes every following token up to the next known flag, as strings, into \
+    a tuple. With `stdin=True`, the single value `-` reads the values from stdin instead \
+    (separated by whitespace)."""
+    __slots__ = ("stdin", "_data")
+    _fields = Flag._fields + __slots__
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[Sequence[str]], optional: bool,
+                 stdin: bool = False, _data: Optional[tuple[str, ...]] = None):
+        super().__init__(flag, aliases, description,
+                         tuple(default_value) if default_value is not None else (),
+                         optional)
+        self.stdin = stdin
+        self._data = _data
+
+    @property
+    def data(self) -> tuple[str, ...]:
+        assert self._data is not None, \
+            f"""Tried to access the data for flag `{self.flag}` before assigning a value to it. \
+Try using FlagHandler.parse(...)."""
+        return self._data
+
+    @data.setter
+    def data(self, values: Sequence[str]) -> None:
+        assert values is not None, "You can't set the flag's data to a None value."
+        self._data = self._convert_many(values)
+
+    @staticmethod
+    def _convert_many(values: Sequence[str]) -> tuple[str, ...]:
+        for index, value in enumerate(values):
+            if not isinstance(value, str):
+                raise ValueError(f"`{value!r}` (value {index} of the list) is not a valid value \
+for a `StringListFlag`.")
+        return tuple(values)
+
+
+class ChoiceFlag(Flag):
+    """A flag whose value must be one of a set of strings, given directly or read (only when the \
+    flag is first used) from a file with one choice per line. Membership is checked in a \
+    frozenset; mistyped values get "did you mean" suggestions from an n-gram index over the \
+    choices, built on the first mistake."""
+    __slots__ = ("choices_file", "_choice_list", "_choices", "_choice_index", "_choice_trie",
+                 "_choices_digest", "_data")
+    _fields = Flag._fields + ("choices_file", "_data")
+
+    def __init__(self, flag: str, aliases: tuple[str, ...], description: str,
+                 default_value: Optional[flag_value], optional: bool,
+                 choices: Optional[Iterable[str]] = None, choices_file: Optional[str] = None,
+                 _data: Optional[str] = None):
+        super().__init__(flag, aliases, description, default_value, optional)
+        if (choices is None) == (choices_file is None):
+            raise ValueError(f"Give either the choices or the file of choices of the flag {flag}.")
+        self.choices_file = choices_file
+        # The choices in the order given (None until loaded from the file) and as a set.
+        self._choice_list: Optional[tuple[str, ...]] = \
+            tuple(choices) if choices is not None else None
+        self._choices: Optional[frozenset[str]] = \
+            frozenset(self._choice_list) if self._choice_list is not None else None
+        self._choice_index: Optional[_NGramIndex] = None
+        self._choice_trie: Optional[_PrefixTrie] = None
+        self._choices_digest: Optional[str] = None  # See _schema_key.
+        self._data = _data
+
+    @property
+    def data(self) -> str:
+        assert self._data is not None, \
+            f"""Tried to access the data for flag `{self.flag}` before assigning a value to it. \
+Try using FlagHandler.parse(...)."""
+        return self._data
+
+    @data.setter
+    def data(self, value: str) -> None:
+        assert value is not None, "You can't set the flag's data to a None value."
+        self._data = self._convert(value)
+
+    @property
+    def choices(self) -> frozenset[str]:
+        """The allowed values (reading the file of choices the first time)."""
+        if self._choices is None:
+            self._load_choices()
+        return self._choices  # type: ignore[return-value]
+
+    def _load_choices(self) -> None:
+        assert self.choices_file is not None
+        try:
+            with open(self.choices_file, encoding="utf-8") as file:
+                choice_list = tuple(line.strip() for line in file if line.strip())
+        except OSError as e:
+            raise ValueError(f"Couldn't read the choices of the flag `{self.flag}` from \
+`{self.choices_file}`: {e.strerror}.")
+        self._choice_list = choice_list
+        self._choices = frozenset(choice_list)
+
+    def _convert(self, value: str) -> str:
+        if value in self.choices:
+            return value
+        suggestions = self._closest_choices(value)
+        maybe = f" Maybe you meant: {', '.join(suggestions)}?" if suggestions else ""
+        raise ValueError(f"`{value}` is not one of the choices of `{self.flag}`.{maybe}")
+
+    def _closest_choices(self, value: str, tolerance: int = 2, limit: int = 5) -> list[str]:
+        # Like FlagHandler._find_closest_flags, over the choices. A lower tolerance than for flag
+        # names: with many similar choices, the candidates within 3 edits are too many to check.
+        if self._choice_index is None:
+            index = _NGramIndex()
+            for choice in self.choices:
+                index.add(choice, 0)
+            self._choice_index = index
+        matches = self._choice_index.search(value, tolerance)
+        return [choice for _, _, choice in sorted(matches)[:limit]]
+
+    def _complete(self, prefix: str) -> list[str]:
+        # The choices that start with `prefix`, for FlagHandler.complete.
+        if self._choice_trie is None:
+            trie = _PrefixTrie()
+            for choice in self.choices:
+                trie.add(choice)
+            self._choice_trie = trie
+        return self._choice_trie.complete(prefix)
+
+    def _schema_key(self) -> tuple[Any, ...]:
+        # What the files cached by FlagHandler._cached_on_disk depend on, see
+        # FlagHandler._schema_hash: the file of choices as it is on disk (without reading it), or
+        # a digest of the choices given, computed once.
+        if self.choices_file is not None:
+            try:
+                stat = os_stat(self.choices_file)
+            except OSError:
+                return (self.choices_file, None)
+            return (self.choices_file, stat.st_mtime_ns, stat.st_size)
+        if self._choices_digest is None:
+            import hashlib
+            self._choices_digest = hashlib.sha256(repr(self._choice_list).encode()).hexdigest()
+        return (self._choices_digest,)
+
+    def _summary(self) -> str:
+        # For the help: a few choices rather than all of them.
+        if self._choice_list is None:
+            return f"One of the lines of `{self.choices_file}`."
+        shown = ", ".join(self._choice_list[:_CHOICES_SHOWN])
+        if len(self._choice_list) > _CHOICES_SHOWN:
+            return f"One of: {shown} (and {len(self._choice_list) - _CHOICES_SHOWN:,} more)."
+        return f"One of: {shown}."
+
+
+_CHOICES_SHOWN = 5  # Choices listed in the help of a ChoiceFlag.
+
+
+def _read_stdin_values() -> list[str]:
+    # The values of a list flag given as `-`: everything on stdin, split on whitespace.
+    import sys
+    return sys.stdin.read().split()
 
 
 def _assert_that_flag_types_havent_changed(expected_number_of_types: int) -> None:
@@ -126,54 +404,137 @@ def _assert_that_flag_types_havent_changed(expected_number_of_types: int) -> Non
 
 
 # type aliases
-_assert_that_flag_types_havent_changed(3)
-flag_classes = IntFlag | BoolFlag | StringFlag
+_assert_that_flag_types_havent_changed(6)
+flag_classes = IntFlag | BoolFlag | StringFlag | IntListFlag | StringListFlag | ChoiceFlag
 flag_classes_type = type[flag_classes]
-flag_value = Union[int, bool, str]
+flag_value = int | bool | str
+# Flag.default_value: a value, or the values of a list flag.
+flag_default = flag_value | tuple[str | int, ...]
+if TYPE_CHECKING:
+    # Values of the list flags (`array` is only imported when needed).
+    list_flag_value = Union[array[int], tuple[str, ...]]
+    # Entries of CompiledParser._dispatch and CompiledParser._greedy_dispatch, see there.
+    _DispatchEntry = tuple[int, Optional[Callable[[str], flag_value]]]
+    _GreedyEntry = tuple[int, Callable[[Sequence[str]], Any], bool]
 
 # Used to show "usage" for each flag
 flag_type_arguments: dict[flag_classes_type, str] = {
     IntFlag: "<int>",
     BoolFlag: "",
     StringFlag: "<string>",
+    IntListFlag: "<int>...",
+    StringListFlag: "<string>...",
+    ChoiceFlag: "<choice>",
 }
 
 
+# Part of the hash of the files saved by `FlagHandler.compile(cache_dir=...)`. Change it whenever
+# what is saved changes shape.
+_CACHE_VERSION = 2
+# Version of the marshal format of the cached files. Version 2 writes the same bytes for equal
+# values (later versions share repeated objects, depending on their reference counts).
+_MARSHAL_VERSION = 2
+
+
+def _unchanged(value: Any) -> Any:
+    return value
+
+
+def _loaded_string(value: Any) -> str:
+    # The `load` of FlagHandler._cached_on_disk for strings.
+    if not isinstance(value, str):
+        raise ValueError(f"Expected a string, got {type(value).__name__}.")
+    return value
+
+
 class FlagHandler:
     def __init__(self, program_description: Optional[str] = None):
-        self.program_description: str = program_description \
+        # Rendered help messages and usages (by program path) and flag descriptions (by flag name).
+        # Cleared when flags are added or the program description changes.
+        self._help_cache: dict[str, str] = {}
+        self._usage_cache: dict[str, str] = {}
+        self._description_cache: dict[str, str] = {}
+
+        self.program_description = program_description \
                                     if program_description is not None\
                                     else ""
 
         # Instance defaults:
         self.flags: list[flag_classes] = []
+        # Maps every flag name and alias to its flag, so lookups don't scan `self.flags`.
+        self._flag_index: dict[str, flag_classes] = {}
         self.help_flag: Optional[BoolFlag] = None
         # The help flag is special because we can set it automatically
-        self.output_function: Callable[[str], Any] = partial(print, end="")
-        self.string_distance_function: Callable[[str, str], int] = naive_levenshtein_distance
+        self.output_function: Callable[[str], Any] = _print_without_newline
+        self.string_distance_function: Callable[[str, str], int] = levenshtein_distance
+        # Index over all names and aliases for typo suggestions. Built lazily, dropped when
+        # flags are added.
+        self._suggestion_index: Optional[_NGramIndex] = None
+        # Set by `compile`. Once set, the flags are frozen.
+        self._compiled: Optional[CompiledParser] = None
+        self._parser_cache: Optional[CompiledParser] = None
+        self._compile_lock = allocate_lock()
+        # Set by `compile`, see there.
+        self._cache_dir: Optional[str] = None
+        self._schema: Optional[str] = None  # See _schema_hash, set by `compile` with a cache_dir.
+        # Receives the timings of the phases of parsing, see Instrumentation. None (the default)
+        # skips the timing altogether.
+        self.instrumentation: Optional[Instrumentation] = None
+        # Subcommands by name, see `subcommand`. Their handlers are only built when invoked.
+        self._subcommands: dict[str, Subcommand] = {}
+        self._subcommand_index: Optional[_NGramIndex] = None
+        # Prefix trie over all names and aliases for completions. Built lazily, dropped when flags
+        # are added.
+        self._completion_trie: Optional[_PrefixTrie] = None
+        # Validators by flag name, see `add_validator`, the outcomes of the pure ones by
+        # (validator, type of the value, value), and the threads that run them (created when
+        # first needed).
+        self._validators: dict[str, list[_Validator]] = {}
+        self._validation_cache: dict[tuple[Callable[[Any], Any], type, Any], Optional[str]] = {}
+        self._validation_executor: Optional[ThreadPoolExecutor] = None
+        self._validation_executor_lock = allocate_lock()
+        # (path, table, required) of the config file, see `config_file`.
+        self._config_file: Optional[tuple[str, Optional[str], bool]] = None
 
     def _check_if_flag_already_exists(self, flag_name: str,
                                       aliases: Optional[list[str]] = None) -> None:
-        if self._find(flag_name):
+        if flag_name in self._flag_index or flag_name in self._subcommands:
             raise ValueError(f"The flag {flag_name} is already in use. \
                 Please choose another name for this flag.")
         if aliases is not None:
             for alias in aliases:
-                if self._find(alias):
+                if alias in self._flag_index or alias in self._subcommands:
                     raise ValueError(f"The flag alias {alias} is already in use. \
                         Please choose another alias for this flag.")
 
-    def _create_typed_flag(self, flag_cls: flag_classes_type, flag_name: str, description: str,
-                           default_value: Optional[str | int] = None, optional: bool = True,
-                           aliases: Optional[list[str]] = None) -> flag_classes:
+    def _create_typed_flag(self, flag_cls: Callable[..., _F], flag_name: str, description: str,
+                           default_value: Optional[str | int | Sequence[str | int]] = None,
+                           optional: bool = True, aliases: Optional[list[str]] = None,
+                           env: Optional[str] = None, **options: Any) -> _F:
+        if self._compiled is not None:
+            raise ValueError(f"Can't add the flag {flag_name}, the flags of this handler were \
+frozen by FlagHandler.compile().")
         self._check_if_flag_already_exists(flag_name, aliases)
-        flag = flag_cls(flag_name, aliases, description, default_value, optional)
+        flag = flag_cls(flag_name, tuple(aliases or ()), description, default_value, optional,
+                        **options)
+        flag.env = env
         self.flags.append(flag)
-        return self.flags[-1]
+        self._index_flag(flag)
+        return flag
+
+    def _index_flag(self, flag: flag_classes) -> None:
+        self._suggestion_index = None
+        self._completion_trie = None
+        self._parser_cache = None
+        self._help_cache.clear()
+        self._usage_cache.clear()
+        self._flag_index[flag.flag] = flag
+        for alias in flag.aliases:
+            self._flag_index[alias] = flag
 
     def int_flag(self, flag_name: str, description: str,
                  default_value: Optional[str | int] = None, optional: bool = True,
-                 aliases: Optional[list[str]] = None) -> IntFlag:
+                 aliases: Optional[list[str]] = None, env: Optional[str] = None) -> IntFlag:
         """Create a flag that can accept int data.
 
         Args:
@@ -184,19 +545,22 @@ class FlagHandler:
             optional (bool, optional): Toggles if the flag is optional. Defaults to True.
             aliases (Optional[list[str]], optional): A list of strings of alternative aliases for\
                 this flag. Defaults to None.
+            env (Optional[str], optional): An environment variable that gives the value when \
+                the flag isn't passed (see FlagHandler.config_file for the order). Defaults to \
+                None.
 
         Returns:
             IntFlag: An IntFlag. To access the data, FlagHandler.parse, then use access the \
                 flag.data attribute.
         """
         flag = self._create_typed_flag(IntFlag, flag_name, description,
-                                       default_value, optional, aliases)
-        flag = cast(IntFlag, flag)
+                                       default_value, optional, aliases, env=env)
+        assert isinstance(flag, IntFlag)
         return flag
 
     def str_flag(self, flag_name: str, description: str,
                  default_value: Optional[str | int] = None, optional: bool = True,
-                 aliases: Optional[list[str]] = None) -> StringFlag:
+                 aliases: Optional[list[str]] = None, env: Optional[str] = None) -> StringFlag:
         """Create a flag that can accept string data.
 
         Args:
@@ -207,19 +571,22 @@ class FlagHandler:
             optional (bool, optional): Toggles if the flag is optional. Defaults to True.
             aliases (Optional[list[str]], optional): A list of strings of alternative aliases for \
                 this flag. Defaults to None.
+            env (Optional[str], optional): An environment variable that gives the value when \
+                the flag isn't passed (see FlagHandler.config_file for the order). Defaults to \
+                None.
 
         Returns:
             StringFlag: A StringFlag. To access the data, FlagHandler.parse, then use access the \
                 flag.data attribute.
         """
         flag = self._create_typed_flag(StringFlag, flag_name, description,
-                                       default_value, optional, aliases)
-        flag = cast(StringFlag, flag)
+                                       default_value, optional, aliases, env=env)
+        assert isinstance(flag, StringFlag)
         return flag
 
     def bool_flag(self, flag_name: str, description: str,
                   default_value: bool = False, optional: bool = True,
-                  aliases: Optional[list[str]] = None) -> BoolFlag:
+                  aliases: Optional[list[str]] = None, env: Optional[str] = None) -> BoolFlag:
         """Create a flag that can accept bool data.
 
         Args:
@@ -230,136 +597,670 @@ class FlagHandler:
             optional (bool, optional): Toggles if the flag is optional. Defaults to True.
             aliases (Optional[list[str]], optional): A list of strings of alternative aliases for \
                 this flag. Defaults to None.
+            env (Optional[str], optional): An environment variable that gives the value when \
+                the flag isn't passed (see FlagHandler.config_file for the order). Defaults to \
+                None.
 
         Returns:
             BoolFlag: A BoolFlag. To access the data, FlagHandler.parse, then use access the \
                 flag.data attribute.
         """
         flag = self._create_typed_flag(BoolFlag, flag_name, description,
-                                       default_value, optional, aliases)
-        flag = cast(BoolFlag, flag)
+                                       default_value, optional, aliases, env=env)
+        assert isinstance(flag, BoolFlag)
+        return flag
+
+    def int_list_flag(self, flag_name: str, description: str,
+                      default_value: Optional[Sequence[str | int]] = None, optional: bool = True,
+                      aliases: Optional[list[str]] = None, stdin: bool = False,
+                      env: Optional[str] = None) -> IntListFlag:
+        """Create a "greedy" flag that takes every following token up to the next flag, as ints \
+            (`--ids 1 2 3`). The values are converted all at once into an `array.array('q')`.
+
+        Args:
+            flag_name (str): The main name for the flag.
+            description (str): A short description of what the flag is used for.
+            default_value (Optional[Sequence[str | int]], optional): The default values for the \
+                flag. Defaults to None (no values).
+            optional (bool, optional): Toggles if the flag is optional. Defaults to True.
+            aliases (Optional[list[str]], optional): A list of strings of alternative aliases for \
+                this flag. Defaults to None.
+            stdin (bool, optional): If True, the single value `-` reads the values from stdin \
+                instead, separated by whitespace. Defaults to False.
+            env (Optional[str], optional): An environment variable that gives the values, \
+                separated by whitespace, when the flag isn't passed (see \
+                FlagHandler.config_file for the order). Defaults to None.
+
+        Returns:
+            IntListFlag: An IntListFlag. To access the data, FlagHandler.parse, then use access \
+                the flag.data attribute.
+        """
+        flag = self._create_typed_flag(IntListFlag, flag_name, description,
+                                       default_value, optional, aliases, env=env, stdin=stdin)
+        assert isinstance(flag, IntListFlag)
         return flag
 
+    def str_list_flag(self, flag_name: str, description: str,
+                      default_value: Optional[Sequence[str]] = None, optional: bool = True,
+                      aliases: Optional[list[str]] = None, stdin: bool = False,
+                      env: Optional[str] = None) -> StringListFlag:
+        """Create a "greedy" flag that takes every following token up to the next flag, as \
+            strings (`--files a.txt b.txt`), into a tuple.
+
+        Args:
+            flag_name (str): The main name for the flag.
+            description (str): A short description of what the flag is used for.
+            default_value (Optional[Sequence[str]], optional): The default values for the flag. \
+                Defaults to None (no values).
+            optional (bool, optional): Toggles if the flag is optional. Defaults to True.
+            aliases (Optional[list[str]], optional): A list of strings of alternative aliases for \
+                this flag. Defaults to None.
+            stdin (bool, optional): If True, the single value `-` reads the values from stdin \
+                instead, separated by whitespace. Defaults to False.
+            env (Optional[str], optional): An environment variable that gives the values, \
+                separated by whitespace, when the flag isn't passed (see \
+                FlagHandler.config_file for the order). Defaults to None.
+
+        Returns:
+            StringListFlag: A StringListFlag. To access the data, FlagHandler.parse, then use \
+                access the flag.data attribute.
+        """
+        flag = self._create_typed_flag(StringListFlag, flag_name, description,
+                                       default_value, optional, aliases, env=env, stdin=stdin)
+        assert isinstance(flag, StringListFlag)
+        return flag
+
+    def add_validator(self, flag: Flag, validator: Callable[[Any], Any],
+                      pure: bool = False) -> None:
+        """Adds a check of the values of a flag, e.g. that a path exists or a port is free. \
+            After the strings are parsed, the validators of the flags that were given (in the \
+            strings, the environment or the config file; not defaults) run together on a thread \
+            pool, and all their errors are raised at once, in a ValidationError. \
+            FlagHandler.parse_result_async runs them on the event loop instead.
+
+        Args:
+            flag (Flag): The flag, as returned by FlagHandler.int_flag (etc.).
+            validator (Callable[[Any], Any]): Called with the converted value. It rejects the \
+                value by raising (the message is reported) or by returning False. It may be a \
+                coroutine function.
+            pure (bool, optional): If True, the outcome only depends on the value, so it's \
+                remembered for later parses with the same value. Defaults to False.
+
+        Raises:
+            ValueError: When the flag isn't one of this handler's.
+        """
+        if self._flag_index.get(flag.flag) is not flag:
+            raise ValueError(f"The flag {flag.flag} doesn't belong to this handler.")
+        self._validators.setdefault(flag.flag, []).append((validator, pure))
+
+    def config_file(self, path: str, table: Optional[str] = None, required: bool = False) -> None:
+        """Reads the values of the flags that aren't passed from a TOML file. The keys are the \
+            names or aliases of the flags without the leading dashes (`port = 8080` for \
+            `--port`). Each value comes from the first of: the parsed strings, the environment \
+            variable of the flag (see FlagHandler.int_flag, etc.), this file, the default. \
+            ParseResult.source tells which one it was.
+
+            The file is checked (unknown keys, values of the wrong type) when it's read, and read \
+            again only when its modification time or size changes. With \
+            `FlagHandler.compile(cache_dir=...)`, the checked values are also saved there, so \
+            later runs skip reading an unchanged file.
+
+        Args:
+            path (str): The path of the TOML file.
+            table (Optional[str], optional): The table with the values, e.g. "tool.myprogram" \
+                for `[tool.myprogram]`. Other tables of the file are ignored. Defaults to None \
+                (the top level).
+            required (bool, optional): If True, a missing file is an error. Otherwise it's like \
+                an empty file. Defaults to False.
+
+        Raises:
+            ValueError: When the handler was already compiled.
+        """
+        if self._compiled is not None:
+            raise ValueError("Can't set the config file, this handler was frozen by \
+FlagHandler.compile().")
+        self._config_file = (path, table, required)
+        self._parser_cache = None
+
+    def choice_flag(self, flag_name: str, description: str,
+                    default_value: Optional[str] = None, optional: bool = True,
+                    aliases: Optional[list[str]] = None, choices: Optional[Iterable[str]] = None,
+                    choices_file: Optional[str] = None, env: Optional[str] = None) -> ChoiceFlag:
+        """Create a flag that accepts one of a set of strings. Mistyped values are rejected with \
+            suggestions of the closest choices, and the help only shows a few of the choices.
+
+        Args:
+            flag_name (str): The main name for the flag.
+            description (str): A short description of what the flag is used for.
+            default_value (Optional[str], optional): The default value for the flag. It isn't \
+                checked against the choices. Defaults to None.
+            optional (bool, optional): Toggles if the flag is optional. Defaults to True.
+            aliases (Optional[list[str]], optional): A list of strings of alternative aliases for \
+                this flag. Defaults to None.
+            choices (Optional[Iterable[str]], optional): The allowed values. Defaults to None.
+            choices_file (Optional[str], optional): Instead of `choices`, a file with one allowed \
+                value per line, only read when the flag is given. Defaults to None.
+            env (Optional[str], optional): An environment variable that gives the value when \
+                the flag isn't passed (see FlagHandler.config_file for the order). Defaults to \
+                None.
+
+        Raises:
+            ValueError: When neither or both of `choices` and `choices_file` are given.
+
+        Returns:
+            ChoiceFlag: A ChoiceFlag. To access the data, FlagHandler.parse, then use access the \
+                flag.data attribute.
+        """
+        flag = self._create_typed_flag(ChoiceFlag, flag_name, description, default_value,
+                                       optional, aliases, env=env, choices=choices,
+                                       choices_file=choices_file)
+        assert isinstance(flag, ChoiceFlag)
+        return flag
+
+    def subcommand(self, name: str, description: str,
+                   factory: Union[Callable[[], FlagHandler], str]) -> Subcommand:
+        """Registers a git-style subcommand (`program <name> [flags of the subcommand]`) with its \
+            own FlagHandler, which is only imported and built when the subcommand is invoked.
+
+        Args:
+            name (str): The name of the subcommand, as given in `args[1]`.
+            description (str): A short description, shown in the help message.
+            factory (Union[Callable[[], FlagHandler], str]): A function that builds the handler \
+                of the subcommand, or where to import it from, as "package.module:attribute". \
+                The attribute can be the handler itself or a function that builds it.
+
+        Raises:
+            ValueError: When the name is already used by a subcommand or a flag, or the module \
+                path isn't of the form "package.module:attribute".
+
+        Returns:
+            Subcommand: The subcommand. `Subcommand.handler` gives its handler (building it).
+        """
+        if self._compiled is not None:
+            raise ValueError(f"Can't add the subcommand {name}, this handler was frozen by \
+FlagHandler.compile().")
+        if name in self._subcommands or name in self._flag_index:
+            raise ValueError(f"The subcommand name {name} is already in use.")
+        if name.startswith(("-", "@")):
+            raise ValueError(f"The subcommand name {name} can't start with `-` or `@`, it would \
+be taken for a flag or an argument file.")
+        if isinstance(factory, str) and factory.count(":") != 1:
+            raise ValueError(f"Expected the module path of the subcommand {name} to be of the \
+form \"package.module:attribute\", got \"{factory}\".")
+        subcommand = self._subcommands[name] = Subcommand(name, description, factory)
+        self._subcommand_index = None
+        self._help_cache.clear()
+        self._usage_cache.clear()
+        return subcommand
+
     def set_program_description(self, program_description: str) -> None:
         self.program_description = program_description
 
+    @property
+    def program_description(self) -> str:
+        return self._program_description
+
+    @program_description.setter
+    def program_description(self, program_description: str) -> None:
+        self._program_description = program_description
+        self._help_cache.clear()
+
     def _find(self, flag_name: str) -> Optional[flag_classes]:
-        for flag in self.flags:
-            if flag_name == flag.flag or flag.aliases is not None and flag_name in flag.aliases:
-                return flag
-        return None
+        return self._flag_index.get(flag_name)
 
-    def parse(self, args: Sequence[str]) -> dict[str, flag_value]:
+    def parse(self, args: Iterable[str]) -> 'ParseResult':
         """Parses the sequence of strings. Typical use is .parse(sys.argv), but you can pass \
             anything. Updates the data of the flags in place, but also returns \
-            a dictionary with the values.
+            the values.
 
         Args:
-            args (Sequence[str]): The sequence of strs to be parsed. \
+            args (Iterable[str]): The strs to be parsed. \
                 Each flag/word/value/token should be its own element of the array.
 
         Raises:
             ValueError: When it doesn't understand one of the parsed flags.
 
         Returns:
-            dict[str, flag_value]: A dict mapping flags main names to their values.
+            ParseResult: A read-only mapping from the flags main names (or aliases, or the flags \
+                themselves) to their values.
         """
-        _flags_debug_trace("All my flags: ")
-        _flags_debug_trace(self.flags)
-        _flags_debug_trace(f"ARGS: {args}")
+        if _FLAGS_DEBUG:  # Checked here, so nothing is formatted when debugging is off.
+            _flags_debug_trace("All my flags: ")
+            _flags_debug_trace(self.flags)
+
+        if self._subcommands:
+            args, subcommand = self._resolve_subcommand(args)
+            if subcommand is not None:
+                return subcommand.handler.parse(args)._of_subcommand(subcommand.name)
+        return self._parser().parse(args)
+
+    def _parser(self) -> 'CompiledParser':
+        # The compiled parser once frozen. Before that, a parser that is rebuilt after new flags
+        # are added.
+        if self._compiled is not None:
+            return self._compiled
+        self._add_default_help_flag()
+        if self._parser_cache is None:
+            self._parser_cache = CompiledParser(self)
+        return self._parser_cache
+
+    def compile(self, cache_dir: Optional[str] = None) -> 'CompiledParser':
+        """Freezes the flags of this handler and returns a parser specialized to them. \
+            The compiled parser gives the same results as FlagHandler.parse, but looks every token \
+            up in a precomputed dispatch table instead of checking the flag types each time. \
+            After compiling, FlagHandler.parse uses the compiled parser and adding flags raises \
+            an error. Calling it again returns the same parser.
 
-        result: dict[str, flag_value] = {}
+        Args:
+            cache_dir (Optional[str], optional): A directory where the expensive parts derived \
+                from the flags (the typo-suggestion index and the help messages) are saved, \
+                under a hash of the flags. Later runs with the same flags load them instead of \
+                building them again. The files are in the marshal format (data only, never \
+                objects or code), and files that can't be loaded are built again. \
+                Defaults to None (no cache).
 
-        program_path = args[0]  # Consumes index 0 already.
+        Returns:
+            CompiledParser: The parser. Use CompiledParser.parse like FlagHandler.parse.
+        """
+        with self._compile_lock:
+            if self._compiled is None:
+                self._compiled = self._parser()
+            if cache_dir is not None:
+                self._cache_dir = cache_dir
+                if self._schema is None:
+                    self._schema = self._schema_hash()
+        return self._compiled
+
+    def complete(self, words: Sequence[str]) -> list[str]:
+        """Returns the completions of the last word of a command line, in alphabetical order: \
+            the flag names and aliases (and subcommand names, in their place) that start with it. \
+            After a ChoiceFlag, its choices are completed instead, and after the other flags that \
+            take a value, nothing is.
+
+        Args:
+            words (Sequence[str]): The words after the program path. The last one is the word \
+                being completed (empty for a new word).
 
-        if not self.help_flag:
-            # Generate a help flag if there isn't one already.
+        Returns:
+            list[str]: The completions.
+        """
+        *before, prefix = words or [""]
+        if before and (subcommand := self._subcommands.get(before[0])) is not None:
+            return subcommand.handler.complete(words[1:])
+        if before and isinstance(flag := self._flag_index.get(before[-1]), ChoiceFlag):
+            return flag._complete(prefix)
+        if before and isinstance(flag, (IntFlag, StringFlag)):
+            return []  # The value of a flag.
+
+        if self._completion_trie is None:
             self._add_default_help_flag()
-        help_requested = False
-
-        # handle all args
-        i = 1  # Since we consumed index 0 (program name).
-        while i < len(args):
-            arg = args[i]
-            _flags_debug_trace(f"ARG: {arg}")
-            if (flag := self._find(arg)):
-                if flag.flag in result:
-                    # We have parsed this flag before.
-                    warnings.warn(f"Already parsed flag `{arg}`. Did you really mean to repeat this flag? The value will be set to the last instance of the argument.")
-                    # TODO: only throw one warning per flag.
-                    # Comment on above ^ This already happens. Maybe because warnings.warn doesn't throw additional warnings with the same message?
-                # TODO: handle cases where overriding flags that already have values. e.g:
-                # warnings.warn(f"The flag `{arg}` already has a value, despite having not been parsed this time. Now trying to overwrite the previous value with the new value.")
-                _flags_debug_trace(f"found flag {flag.flag}")
-                _assert_that_flag_types_havent_changed(3)
-                match flag:
-                    case IntFlag() | StringFlag():
-                        assert i + 1 < len(args), f"Expected more arguments for flag `{arg}`."
-                        # Try to assign the next token to the flag data.
-                        flag.data = args[i+1]
-                        result[flag.flag] = flag.data
-                        i += 1  # Skip next one, since we already processed it.
-                    case BoolFlag():
-                        flag.data = True
-                        result[flag.flag] = flag.data
-                    case _ as unreachable:
-                        assert_never(unreachable)
-            else:  # bad flag, don't know what to do!
-                if (candidates := self._find_closest_flags(arg)):  # if not empty
-                    self.output_function(f"Unexpected flag `{arg}`. Maybe you meant:\n")
-                    for candidate in candidates:
-                        self.output_function(self._describe_flag(candidate) + "\n")
-                    self.output_function("\n")
-                raise ValueError(f"Couldn't understand token `{arg}`. It is not a valid flag in \
-this program.")
-            i += 1
+            trie = _PrefixTrie()
+            for flag in self.flags:
+                for name in (flag.flag, *flag.aliases):
+                    trie.add(name)
+            self._completion_trie = trie
+        completions = self._completion_trie.complete(prefix)
+        if not before and self._subcommands:
+            completions = sorted(completions + [name for name in self._subcommands
+                                                if name.startswith(prefix)])
+        return completions
+
+    def _print_completions(self, args: Iterable[str]) -> NoReturn:
+        # Answers a completion script (see completion_script) instead of parsing.
+        words = list(args)[1:]
+        print("\n".join(self.complete(words)))
+        raise SystemExit(0)
+
+    def completion_script(self, program_name: str, shell: str = "bash",
+                          socket_path: Optional[str] = None) -> str:
+        """Returns a shell script that completes the flags of this program, for bash or zsh. \
+            Save it to a file and source that file from the shell's startup file (e.g. \
+            `source ~/.mytool-completion.bash` in `~/.bashrc`).
+
+            The script runs the program with FLAGS_COMPLETE set, so parsing prints the \
+            completions and exits before the program does anything else. If `socket_path` is \
+            given and a CompletionServer listens there, it asks the server instead (through \
+            `socat`), which saves starting python on every completion.
 
-        # check if any non-optional flags were forgotten:
-        required_but_not_given_flags = []
-        for flag in self.flags:
-            if flag.flag in result:  # given
-                continue
-            elif flag.optional and flag.default_value is not None:  # optional and has default value
-                flag.data = flag.default_value
-                result[flag.flag] = flag.data
-            else:  # required
-                required_but_not_given_flags.append(flag)
-
-        self.help_flag = cast(BoolFlag, self.help_flag)
-        help_requested = self.help_flag.data  # read the data in the flag
-        if len(required_but_not_given_flags) > 0 or help_requested:
-            # If user asked for help, ignore everything and just show the documentation:
-            if i == 1 or help_requested:
-                # If the user didn't pass any arguments (when they should have)
-                # or if they explicitly asked for help, show the help.
-                self.output_function(self._generate_help_message(program_path))
-            _flags_debug_trace(required_but_not_given_flags)
-            missing_flags = ", ".join(flag.flag for flag in required_but_not_given_flags)
-            assert len(required_but_not_given_flags) == 0, \
-                f"You need to pass the following obligatory flags: {missing_flags}"
+        Args:
+            program_name (str): The command the completions are for.
+            shell (str, optional): "bash" or "zsh". Defaults to "bash".
+            socket_path (Optional[str], optional): The socket of a CompletionServer. \
+                Defaults to None.
 
-        return result
+        Raises:
+            ValueError: For other shells.
+
+        Returns:
+            str: The script.
+        """
+        import re
+        import shlex
+        function = "_flags_complete_" + re.sub(r"\W", "_", program_name)
+        quoted_name = shlex.quote(program_name)
+        quoted_socket = shlex.quote(socket_path or "")
+        if shell == "bash":
+            return f"""{function}() {{
+    local IFS=$'\\n' sock={quoted_socket}
+    if [[ -S "$sock" ]] && command -v socat >/dev/null; then
+        COMPREPLY=($({{ printf '%s\\0' {quoted_name} "${{COMP_WORDS[@]:1:COMP_CWORD}}"; printf '\\n'; }} \\
+            | socat - "UNIX-CONNECT:$sock" 2>/dev/null))
+    else
+        COMPREPLY=($({_COMPLETION_VARIABLE}=1 "${{COMP_WORDS[0]}}" "${{COMP_WORDS[@]:1:COMP_CWORD}}" 2>/dev/null))
+    fi
+}}
+complete -o default -F {function} {quoted_name}
+"""
+        if shell == "zsh":
+            return f"""{function}() {{
+    local -a completions
+    local sock={quoted_socket}
+    if [[ -S "$sock" ]] && (( $+commands[socat] )); then
+        completions=(${{(f)"$({{ printf '%s\\0' {quoted_name} "${{(@)words[2,CURRENT]}}"; printf '\\n'; }} \\
+            | socat - "UNIX-CONNECT:$sock" 2>/dev/null)"}})
+    else
+        completions=(${{(f)"$({_COMPLETION_VARIABLE}=1 "${{words[1]}}" "${{(@)words[2,CURRENT]}}" 2>/dev/null)"}})
+    fi
+    compadd -a completions
+}}
+compdef {function} {quoted_name}
+"""
+        raise ValueError(f"Can't generate a completion script for the shell `{shell}`, only for \
+bash and zsh.")
+
+    def _schema_hash(self) -> str:
+        # Identifies everything the cached files are derived from.
+        import hashlib
+        schema = (_CACHE_VERSION, self.program_description,
+                  [(type(flag).__name__, flag.flag, flag.aliases, flag.description,
+                    flag.default_value, flag.optional, flag.env,
+                    flag._schema_key() if isinstance(flag, ChoiceFlag) else None)
+                   for flag in self.flags],
+                  [(subcommand.name, subcommand.description)
+                   for subcommand in self._subcommands.values()])
+        return hashlib.sha256(repr(schema).encode()).hexdigest()[:32]
+
+    def _cached_on_disk(self, name: str, build: Callable[[], _T],
+                        dump: Callable[[_T], Any] = _unchanged,
+                        load: Callable[[Any], _T] = _unchanged) -> _T:
+        # Loads `name` from the cache directory of a compiled handler, or builds and saves it.
+        # The files hold `dump(value)` in the marshal format: only strings, bytes, numbers and
+        # containers of them, which `load` turns back into the value. A file that can't be read
+        # or turned back, whatever the reason, is built and saved again.
+        if self._compiled is None or self._cache_dir is None:
+            return build()
+        import marshal
+        import os
+        path = os.path.join(self._cache_dir, f"flags-{self._schema}-{name}.marshal")
+        try:
+            with open(path, "rb") as file:
+                return load(marshal.loads(file.read()))
+        except Exception:
+            pass  # Not cached yet, or unreadable: build it.
+
+        value = build()
+        try:
+            data = marshal.dumps(dump(value), _MARSHAL_VERSION)
+            os.makedirs(self._cache_dir, exist_ok=True)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)  # Atomic, so readers never see half a file.
+        except (OSError, ValueError):
+            pass  # The cache is only an optimization.
+        return value
+
+    def parse_many(self, argvs: Iterable[Sequence[str]], processes: Optional[int] = None,
+                   chunk_size: int = 8192) -> 'BatchResult':
+        """Parses many argument lists at once and returns the values by column. The first call \
+            compiles (and freezes) the handler. See CompiledParser.parse_many.
+
+        Args:
+            argvs (Iterable[Sequence[str]]): The argument lists. The first string of each one is \
+                the program path.
+            processes (Optional[int], optional): If given, parse on a pool of this many processes. \
+                Defaults to None.
+            chunk_size (int, optional): Number of rows sent to a process at a time. \
+                Defaults to 8192.
+
+        Returns:
+            BatchResult: The columns and the errors of the rows.
+        """
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        return compiled.parse_many(argvs, processes, chunk_size)
+
+    def parse_string(self, command_line: str) -> 'ParseResult':
+        """Parses a whole command line, splitting it into words without `shlex.split`. \
+            Like FlagHandler.parse_many, it doesn't look for subcommands. The first call \
+            compiles (and freezes) the handler. See CompiledParser.parse_string.
+
+        Args:
+            command_line (str): The command line. The first word is the program path.
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags, a quote is never \
+                closed or the command line is empty.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        return compiled.parse_string(command_line)
+
+    def parse_strings(self, command_lines: Iterable[str], processes: Optional[int] = None,
+                      chunk_size: int = 8192) -> 'BatchResult':
+        """Parses many command lines at once and returns the values by column. The first call \
+            compiles (and freezes) the handler. See CompiledParser.parse_strings.
+
+        Args:
+            command_lines (Iterable[str]): The command lines, e.g. the lines of a file.
+            processes (Optional[int], optional): If given, parse on a pool of this many processes. \
+                Defaults to None.
+            chunk_size (int, optional): Number of rows sent to a process at a time. \
+                Defaults to 8192.
+
+        Returns:
+            BatchResult: The columns and the errors of the rows.
+        """
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        return compiled.parse_strings(command_lines, processes, chunk_size)
+
+    def stream(self, program_path: str) -> 'StreamParser':
+        """Starts parsing tokens that arrive one at a time (e.g. from a pipe): feed them to the \
+            returned StreamParser, then close it to get the values. The flags are not changed.
+
+        Args:
+            program_path (str): The program path (what would be the first string for `parse`).
+
+        Returns:
+            StreamParser: The stream parser.
+        """
+        return self._parser().stream(program_path)
+
+    def parse_result(self, args: Iterable[str]) -> 'ParseResult':
+        """Parses the strings without changing the handler or its flags, and returns the values \
+            in an immutable ParseResult. The first call compiles (and freezes) the handler, see \
+            FlagHandler.compile. After that, any number of threads can call this at the same time.
+
+        Args:
+            args (Iterable[str]): The strings to be parsed. The first one is the program path.
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        if self._subcommands:
+            args, subcommand = self._resolve_subcommand(args)
+            if subcommand is not None:
+                return subcommand.handler.parse_result(args)._of_subcommand(subcommand.name)
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        return compiled.parse_result(args)
+
+    async def parse_result_async(self, args: Iterable[str]) -> 'ParseResult':
+        """Like FlagHandler.parse_result, but runs the validators on the running event loop. \
+            See CompiledParser.parse_result_async."""
+        if self._subcommands:
+            args, subcommand = self._resolve_subcommand(args)
+            if subcommand is not None:
+                result = await subcommand.handler.parse_result_async(args)
+                return result._of_subcommand(subcommand.name)
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        return await compiled.parse_result_async(args)
+
+    def _run_validators(self, checks: list[tuple[str, _Validator, Any]]) -> dict[str, list[str]]:
+        # Runs the checks (on threads, if there are many) and returns the error messages by flag.
+        start = perf_counter_ns()
+        to_run, errors = self._validation_plan(checks)
+        if len(to_run) == 1:
+            outcomes = [_run_validator(to_run[0][1], to_run[0][2])]
+        elif to_run:
+            outcomes = list(self._validation_threads().map(
+                _run_validator, [validator for _, validator, _, _ in to_run],
+                [value for _, _, value, _ in to_run]))
+        else:
+            outcomes = []
+        return self._collect_validation(to_run, outcomes, errors, len(checks), start)
+
+    async def _run_validators_async(self, checks: list[tuple[str, _Validator, Any]]
+                                    ) -> dict[str, list[str]]:
+        # Same as _run_validators, with coroutines awaited and the rest on `asyncio.to_thread`.
+        import asyncio
+        start = perf_counter_ns()
+        to_run, errors = self._validation_plan(checks)
+        outcomes = await asyncio.gather(*(
+            _run_validator_async(validator, value) if asyncio.iscoroutinefunction(validator)
+            else asyncio.to_thread(_run_validator, validator, value)
+            for _, validator, value, _ in to_run))
+        return self._collect_validation(to_run, list(outcomes), errors, len(checks), start)
+
+    def _validation_plan(self, checks: list[tuple[str, _Validator, Any]]
+                         ) -> tuple[list[tuple[str, Callable[[Any], Any], Any, Any]],
+                                    dict[str, list[str]]]:
+        # The checks that have to run, with their cache keys (None when not cached), and the
+        # errors already known from the cache.
+        to_run = []
+        errors: dict[str, list[str]] = {}
+        cache = self._validation_cache
+        for name, (validator, pure), value in checks:
+            key = None
+            if pure:
+                # With the type, since equal values of different types (True and 1) hash alike.
+                key = (validator, type(value), value)
+                try:
+                    message = cache.get(key, _UNSET)
+                except TypeError:
+                    key = None  # Unhashable value (e.g. the array of an IntListFlag).
+                else:
+                    if message is not _UNSET:
+                        if message is not None:
+                            errors.setdefault(name, []).append(message)
+                        continue
+            to_run.append((name, validator, value, key))
+        return to_run, errors
+
+    def _collect_validation(self, to_run: list[tuple[str, Callable[[Any], Any], Any, Any]],
+                            outcomes: list[Optional[str]], errors: dict[str, list[str]],
+                            number_of_checks: int, start: int) -> dict[str, list[str]]:
+        cache = self._validation_cache
+        for (name, _, _, key), message in zip(to_run, outcomes):
+            if key is not None:
+                if len(cache) >= _VALIDATION_CACHE_SIZE:
+                    cache.pop(next(iter(cache)), None)
+                cache[key] = message
+            if message is not None:
+                errors.setdefault(name, []).append(message)
+        if (instrumentation := self.instrumentation) is not None:
+            instrumentation.record("validation", perf_counter_ns() - start, number_of_checks)
+        return errors
+
+    def _validation_threads(self) -> ThreadPoolExecutor:
+        if self._validation_executor is None:
+            with self._validation_executor_lock:
+                if self._validation_executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._validation_executor = ThreadPoolExecutor(
+                        thread_name_prefix="flags-validation")
+        return self._validation_executor
+
+    def _resolve_subcommand(self, args: Iterable[str]) -> tuple[Iterable[str], Optional[Subcommand]]:
+        # Looks at the second string only: a subcommand name gives the subcommand and the strings
+        # for its handler (with "program name" as the program path). A flag (or argument file)
+        # there means this handler's own flags, like `--help`, so the strings are given back.
+        if _COMPLETION_REQUESTED:
+            self._print_completions(args)  # Here, since the subcommand name may be incomplete.
+        tokens = iter(args)
+        program_path = next(tokens)
+        name = next(tokens, None)
+        if name is None:
+            self._add_default_help_flag()
+            self.output_function(self._generate_help_message(program_path))
+            raise AssertionError(f"You need to pass a subcommand: {', '.join(self._subcommands)}")
+        if name.startswith(("-", "@")):
+            return chain((program_path, name), tokens), None
+        subcommand = self._subcommands.get(name)
+        if subcommand is None:
+            self._report_unknown_subcommand(name)
+        return chain((f"{program_path} {name}",), tokens), subcommand
+
+    def _report_unknown_flag(self, arg: str) -> NoReturn:
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            candidates = self._find_closest_flags(arg)
+        else:
+            start = perf_counter_ns()
+            candidates = self._find_closest_flags(arg)
+            instrumentation.record("suggestion", perf_counter_ns() - start, len(candidates))
+        if candidates:  # if not empty
+            self.output_function(f"Unexpected flag `{arg}`. Maybe you meant:\n")
+            for candidate in candidates:
+                self.output_function(self._describe_flag(candidate) + "\n")
+            self.output_function("\n")
+        raise ValueError(f"Couldn't understand token `{arg}`. It is not a valid flag in \
+this program.")
+
+    def _report_unknown_subcommand(self, name: str) -> NoReturn:
+        if (candidates := self._find_closest_subcommands(name)):  # if not empty
+            self.output_function(f"Unknown subcommand `{name}`. Maybe you meant:\n")
+            for candidate in candidates:
+                self.output_function(self._describe_subcommand(candidate) + "\n")
+            self.output_function("\n")
+        raise ValueError(f"Couldn't understand token `{name}`. It is not a subcommand of this \
+program.")
 
     def _generate_usage(self, program_path: str) -> str:
+        if (usage_message := self._usage_cache.get(program_path)) is not None:
+            return usage_message
+
         has_optional_flags = False
         program_name = os_path_basename(program_path)  # Strip the folder path
-        usage_message = f"USAGE: python {program_name}"
+        parts = [f"USAGE: python {program_name}"]
+        _assert_that_flag_types_havent_changed(6)
         for flag in self.flags:
             if not flag.optional:
-                usage_message += f" {flag.flag}"
-                _assert_that_flag_types_havent_changed(3)
-                match flag:
-                    case BoolFlag():
-                        pass
-                    case IntFlag():
-                        usage_message += " <int>"
-                    case StringFlag():
-                        usage_message += " <string>"
-                    case _ as unreachable:
-                        assert_never(unreachable)
+                parts.append(flag.flag)
+                if (argument := flag_type_arguments[type(flag)]):
+                    parts.append(argument)
             elif not has_optional_flags:
                 has_optional_flags = True
-        usage_message += " [OPTIONAL-FLAGS]" if has_optional_flags else ""
+        if has_optional_flags:
+            parts.append("[OPTIONAL-FLAGS]")
+        usage_message = " ".join(parts)
+        if self._subcommands:
+            usage_message += f"\n       python {program_name} <subcommand> [SUBCOMMAND-FLAGS]"
+
+        self._usage_cache[program_path] = usage_message
         return usage_message
 
     def set_help_flag(self, flag_name: str, description: str,
@@ -384,62 +1285,2001 @@ this program.")
             pass
 
     def _generate_help_message(self, program_path: str) -> str:
-        help_message: str = ""
-        help_message += self.program_description + "\n"  # Welcome message
-        help_message += self._generate_usage(program_path) + "\n"  # USAGE
-
-        for flag in self.flags:
-            help_message += self._describe_flag(flag) + "\n"
-        help_message += "\n"
+        if (help_message := self._help_cache.get(program_path)) is not None:
+            return help_message
+        if self._compiled is not None and self._cache_dir is not None:
+            import hashlib
+            path_hash = hashlib.sha256(program_path.encode()).hexdigest()[:16]
+            help_message = self._help_cache[program_path] = self._cached_on_disk(
+                f"help-{path_hash}", lambda: self._render_help_message(program_path),
+                load=_loaded_string)
+            return help_message
+
+        help_message = self._help_cache[program_path] = self._render_help_message(program_path)
         return help_message
 
-    @staticmethod
-    def _describe_flag(flag: flag_classes) -> str:
+    def _render_help_message(self, program_path: str) -> str:
+        lines = [self.program_description,  # Welcome message
+                 self._generate_usage(program_path)]  # USAGE
+        lines.extend(self._describe_flag(flag) for flag in self.flags)
+        if self._subcommands:
+            lines.append("SUBCOMMANDS:")
+            lines.extend(self._describe_subcommand(subcommand)
+                         for subcommand in self._subcommands.values())
+        return "\n".join(lines) + "\n\n"
+
+    def _describe_flag(self, flag: flag_classes) -> str:
+        if (description := self._description_cache.get(flag.flag)) is not None:
+            return description
+
         alias_list = f" (alt.: {', '.join(flag.aliases)})" if flag.aliases else ""
-        _assert_that_flag_types_havent_changed(3)
+        _assert_that_flag_types_havent_changed(6)
         argument = flag_type_arguments[type(flag)]
-        description = f"{flag.description}"
         flag_and_argument = f"{flag.flag} {argument}"
         if flag.optional:
             flag_and_argument = "[" + flag_and_argument.strip() + "]"
         default = f" Default Value: `{flag.default_value}`" \
-            if flag.default_value is not None \
+            if flag.default_value is not None and flag.default_value != () \
             else ""
-
-        return f"      * {flag_and_argument:<15} : {description:<40}{alias_list:20}{default:<30}"
+        flag_description = flag.description
+        if isinstance(flag, ChoiceFlag):
+            flag_description += " " + flag._summary()
+        if flag.env is not None:
+            flag_description += f" [env: {flag.env}]"
+
+        description = self._description_cache[flag.flag] = \
+            f"      * {flag_and_argument:<15} : {flag_description:<40}{alias_list:20}{default:<30}"
+        return description
+
+    def _describe_subcommand(self, subcommand: Subcommand) -> str:
+        return f"      * {subcommand.name:<15} : {subcommand.description}"
+
+    def _build_suggestion_index(self) -> _NGramIndex:
+        index = _NGramIndex()
+        for position, flag in enumerate(self.flags):
+            for name in (flag.flag, *flag.aliases):
+                index.add(name, position)
+        return index
+
+    def _build_subcommand_index(self) -> _NGramIndex:
+        index = _NGramIndex()
+        for position, name in enumerate(self._subcommands):
+            index.add(name, position)
+        return index
 
     def _find_closest_flags(self, attempted_flag: str,
                             tolerance: int = 3, limit: int = 5) -> list[flag_classes]:
         """Finds the closest flags to the input string, based on a string distance."""
+        def suggestion_index() -> _NGramIndex:
+            if self._suggestion_index is None:
+                self._suggestion_index = self._cached_on_disk(
+                    "suggestions", self._build_suggestion_index, _NGramIndex.dump,
+                    _NGramIndex.load)
+            return self._suggestion_index
+
+        names = ((position, name) for position, flag in enumerate(self.flags)
+                 for name in (flag.flag, *flag.aliases))
+        return [self.flags[position] for position in
+                self._find_closest(attempted_flag, suggestion_index, names, tolerance, limit)]
+
+    def _find_closest_subcommands(self, attempted_name: str,
+                                  tolerance: int = 3, limit: int = 5) -> list[Subcommand]:
+        """Finds the closest subcommands to the input string, like `_find_closest_flags`."""
+        def subcommand_index() -> _NGramIndex:
+            if self._subcommand_index is None:
+                self._subcommand_index = self._build_subcommand_index()
+            return self._subcommand_index
+
+        subcommands = list(self._subcommands.values())
+        names = enumerate(self._subcommands)
+        return [subcommands[position] for position in
+                self._find_closest(attempted_name, subcommand_index, names, tolerance, limit)]
+
+    def _find_closest(self, attempted: str, index: Callable[[], _NGramIndex],
+                      names: Iterable[tuple[int, str]], tolerance: int, limit: int) -> list[int]:
+        # Positions of the closest candidates, given their index and their (position, name)s.
         assert tolerance >= 0
         assert limit >= 0
 
-        # pairs of flag and the corresponding distances
-        keyed_candidates: list[tuple[flag_classes, int]] = []
+        if self.string_distance_function is levenshtein_distance:
+            # The index relies on properties of the Levenshtein distance to skip most names.
+            matches = index().search(attempted, tolerance)
+        else:
+            # A custom distance function may not be a metric, so check every name.
+            matches = []
+            for position, name in names:
+                distance = self.string_distance_function(attempted, name)
+                if distance <= tolerance:
+                    matches.append((distance, position, name))
+
+        # Keep the shortest distance of each candidate to any of its names.
+        closest: dict[int, int] = {}
+        for distance, position, _ in matches:
+            if distance < closest.get(position, tolerance + 1):
+                closest[position] = distance
+
+        # Return the positions by ascending order of distance (ties in registration order),
+        # up to the defined limit.
+        ranked = sorted(closest, key=lambda position: (closest[position], position))
+        return ranked[:limit]
+
+
+class Subcommand:
+    """A subcommand registered with FlagHandler.subcommand. Its handler is built (importing its \
+    module, if it was given as a module path) the first time it's needed, then kept."""
+    __slots__ = ("name", "description", "_factory", "_handler", "_lock")
+
+    def __init__(self, name: str, description: str,
+                 factory: Union[Callable[[], FlagHandler], str]):
+        self.name = name
+        self.description = description
+        self._factory = factory
+        self._handler: Optional[FlagHandler] = None
+        self._lock = allocate_lock()
 
-        for flag in self.flags:
-            shortest_distance = tolerance + 1  # Initiate outside the tolerance
-            # Update the shortest distance if new shortest distance was found
-            shortest_distance = min(shortest_distance,
-                                    self.string_distance_function(attempted_flag, flag.flag))
-            if flag.aliases is not None and len(flag.aliases) > 0:
-                # Find the shortest distance to any of the aliases
-                min_alias_distance = min(self.string_distance_function(attempted_flag, alias)
-                                         for alias in flag.aliases)
-                # Update the shortest distance if new shortest distance was found
-                # Could be done in one line, but this is easier to see.
-                shortest_distance = min(shortest_distance, min_alias_distance)
-            if shortest_distance <= tolerance:
-                # This candidate is within the tolerance, so it may be returned.
-                keyed_candidates.append((flag, shortest_distance))
-
-        # Return the flags (only the flags, first item of tuple)
-        # by ascending order of distance, up to the defined limit.
-        return [c[0] for c in sorted(keyed_candidates, key=lambda t: t[1])][:limit]
+    @property
+    def loaded(self) -> bool:
+        """Whether the handler was built already."""
+        return self._handler is not None
+
+    @property
+    def handler(self) -> FlagHandler:
+        """The FlagHandler of the subcommand, built on first access."""
+        if (handler := self._handler) is not None:
+            return handler
+        with self._lock:
+            if self._handler is None:
+                self._handler = self._build()
+            return self._handler
+
+    def _build(self) -> FlagHandler:
+        factory = self._factory
+        if isinstance(factory, str):
+            import importlib
+            module_name, attribute = factory.split(":")
+            factory = getattr(importlib.import_module(module_name), attribute)
+        handler = factory if isinstance(factory, FlagHandler) else factory()
+        if not isinstance(handler, FlagHandler):
+            raise ValueError(f"Expected the subcommand {self.name} to be built into a \
+FlagHandler, got {handler!r}.")
+        return handler
+
+    def __repr__(self) -> str:
+        return f"Subcommand({self.name!r}, {self.description!r}, loaded={self.loaded})"
+
+
+def _scan_tokens(tokens: Iterator[str], values: list[Any],
+                 lookup: Callable[[str], Optional[_DispatchEntry]],
+                 greedy_dispatch: dict[str, _GreedyEntry], known_names: frozenset[str],
+                 report_unknown: Callable[[str], NoReturn],
+                 warn_repeated: Optional[Callable[[str], None]]) -> bool:
+    # The token loop of CompiledParser and of parse_many: converts the values of the flags in the
+    # tokens into `values`, by position. `lookup` finds the entry of a token in
+    # CompiledParser._dispatch and `known_names` are the names where the values of a list flag
+    # end. Values that aren't _UNSET when their flag comes up again are repeats, for
+    # `warn_repeated` (None when `values` starts from the defaults). Returns whether there was any
+    # token.
+    given_any = False
+    argfiles_being_read: set[str] = set()
+    while True:
+        for token in tokens:
+            given_any = True
+            entry = lookup(token)
+            if entry is None:
+                if (greedy_entry := greedy_dispatch.get(token)) is not None:
+                    # Takes the values up to the next flag, then continues from that flag.
+                    position, convert_many, stdin = greedy_entry
+                    if values[position] is not _UNSET and warn_repeated is not None:
+                        warn_repeated(token)
+                    taken, tokens = _take_values(tokens, known_names, argfiles_being_read)
+                    if stdin and taken == ["-"]:
+                        taken = _read_stdin_values()
+                    values[position] = convert_many(taken)
+                    break
+                if token.startswith("@") and len(token) > 1:
+                    # Continue with the tokens of the argument file, then the rest.
+                    tokens = chain(_read_argfile(token[1:], argfiles_being_read), tokens)
+                    break
+                report_unknown(token)
+            position, convert = entry
+            if values[position] is not _UNSET and warn_repeated is not None:
+                warn_repeated(token)
+            if convert is None:
+                values[position] = True
+            else:
+                value = next(tokens, None)
+                if value is None:
+                    raise AssertionError(f"Expected more arguments for flag `{token}`.")
+                values[position] = convert(value)
+        else:
+            return given_any
+
+
+def _take_values(tokens: Iterator[str], known_names: frozenset[str],
+                 argfiles_being_read: set[str]) -> tuple[list[str], Iterator[str]]:
+    # The values of a list flag: the tokens up to the next known flag (argument files are read in
+    # place). Also returns the tokens after the values, starting with that flag.
+    taken: list[str] = []
+    take = taken.append
+    while True:
+        for token in tokens:
+            if token in known_names:
+                return taken, chain((token,), tokens)
+            if token[:1] == "@" and len(token) > 1:
+                tokens = chain(_read_argfile(token[1:], argfiles_being_read), tokens)
+                break
+            take(token)
+        else:
+            return taken, tokens
+
+
+class _PhaseClock(_local):
+    # The time spent on, and the number of, the lookups and conversions of the instrumented parse
+    # running in this thread (one clock per parser, kept apart by thread).
+    lookup_ns = lookups = conversion_ns = conversions = 0
+
+
+_GIVEN_MASKS_KEPT = 1024  # Distinct masks of given values shared per parser.
+
+
+class CompiledParser:
+    """A parser specialized to the flags of a FlagHandler, as they were when it was created. \
+    FlagHandler.compile() freezes the flags and returns one.
+
+    Every name and alias is mapped ahead of time to the flag's position and to the function that \
+    converts its value (None for flags that take no value), so parsing a token is a single \
+    dictionary lookup. The list flags have a table of their own, only checked when that lookup \
+    fails. Defaults are converted once, here, instead of on every parse."""
+
+    def __init__(self, handler: FlagHandler):
+        assert handler.help_flag is not None
+        self._handler = handler
+        self._flags: tuple[flag_classes, ...] = tuple(handler.flags)
+        positions = {flag.flag: position for position, flag in enumerate(self._flags)}
+        self._help_position: int = positions[handler.help_flag.flag]
+
+        _assert_that_flag_types_havent_changed(6)
+        self._dispatch: dict[str, _DispatchEntry] = {}
+        # Names of the list flags -> their position, the function that converts all their values
+        # at once and whether `-` reads the values from stdin.
+        self._greedy_dispatch: dict[str, _GreedyEntry] = {}
+        defaults: list[Any] = []
+        for position, flag in enumerate(self._flags):
+            convert: Optional[Callable[[str], flag_value]]
+            match flag:
+                case IntFlag():
+                    convert = flag._convert
+                case StringFlag():
+                    # The tokens are strings already: `str` returns them as they are, in C.
+                    convert = str
+                case BoolFlag():
+                    convert = None  # Switch: present means True.
+                case IntListFlag() | StringListFlag():
+                    for name in (flag.flag, *flag.aliases):
+                        self._greedy_dispatch[name] = (position, flag._convert_many, flag.stdin)
+                    defaults.append(flag._convert_many(flag.default_value)  # type: ignore[arg-type]
+                                    if flag.optional else None)
+                    continue
+                case ChoiceFlag():
+                    # The default isn't checked against the choices here, so that the choices
+                    # are only loaded when the flag is given.
+                    for name in (flag.flag, *flag.aliases):
+                        self._dispatch[name] = (position, flag._convert)
+                    defaults.append(flag.default_value
+                                    if flag.optional and flag.default_value is not None else None)
+                    continue
+                case _ as unreachable:
+                    _assert_never(unreachable)
+            for name in (flag.flag, *flag.aliases):
+                self._dispatch[name] = (position, convert)
+            defaults.append(flag._convert(flag.default_value)  # type: ignore[arg-type]
+                            if flag.optional and flag.default_value is not None else None)
+        entries: Iterable[tuple[str, _DispatchEntry | _GreedyEntry]] = chain(
+            self._dispatch.items(), self._greedy_dispatch.items())
+        self._layout = _ResultLayout(
+            tuple(positions), {name: entry[0] for name, entry in entries})
+
+        # Every name and alias, where the values of a list flag end.
+        self._known_names = frozenset(self._layout.positions)
+
+        # Converted default of each flag, or None for flags that must be given.
+        self._defaults: tuple[Optional[flag_value], ...] = tuple(defaults)
+        self._required_positions: tuple[int, ...] = tuple(
+            position for position, default in enumerate(self._defaults) if default is None)
+        # Values that are mutable (the arrays of IntListFlags), so each result gets a copy of the
+        # default (or of the value from the config file).
+        self._copied_defaults: tuple[int, ...] = tuple(
+            position for position, flag in enumerate(self._flags) if isinstance(flag, IntListFlag))
+
+        # The flags bound to environment variables, as (position, variable), and the config file.
+        # With either, the parser is "layered": the values that the strings don't give are looked
+        # up there before falling back to the defaults, see _apply_layers.
+        self._env_bindings: tuple[tuple[int, str], ...] = tuple(
+            (position, flag.env) for position, flag in enumerate(self._flags)
+            if flag.env is not None)
+        self._config_file = handler._config_file
+        self._layered = bool(self._env_bindings) or self._config_file is not None
+        # What _layer_values last returned, after what it was computed from.
+        self._layer_memo: Optional[tuple[Any, dict[int, tuple[Any, str]], dict[int, Any]]] = None
+        self._schema: Optional[str] = None  # Hash of the flags, for the config cache.
+        # Masks of the values given, shared by the results, see _origins.
+        self._given_masks: dict[int, int] = {}
+        # The timing lookup and tables of instrumented parses, see _timed_tables.
+        self._timed: Optional[tuple[Callable[[str], Optional[_DispatchEntry]],
+                                    dict[str, _GreedyEntry], _PhaseClock]] = None
+
+        self._batch_spec = _BatchSpec(
+            names=self._layout.names,
+            kinds=tuple(type(flag) for flag in self._flags),
+            dispatch=self._dispatch,
+            # A row never reads the values of a list flag from stdin.
+            greedy_dispatch={name: (position, convert_many, False)
+                             for name, (position, convert_many, _) in self._greedy_dispatch.items()},
+            known_names=self._known_names,
+            defaults=self._defaults)
+
+    def parse(self, args: Iterable[str]) -> 'ParseResult':
+        """Parses the strings, like FlagHandler.parse (the first one is the program path). \
+            Updates the data of the flags in place, but also returns the values.
+
+        Args:
+            args (Iterable[str]): The strings to be parsed. Any iterable works, including \
+                generators.
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        result = self.parse_result(args)
+        for flag, value in zip(self._flags, result._values):
+            flag._data = value
+        return result
+
+    def parse_result(self, args: Iterable[str]) -> 'ParseResult':
+        """Parses the strings, like CompiledParser.parse, but doesn't touch the flags: the values \
+            are only returned, in an immutable ParseResult. Many threads can use the same parser \
+            at once: each call parses into values of its own, and the state kept between calls \
+            (the shared masks of ParseResult.source, the last environment and config layers, the \
+            outcomes of pure validators) is only added to or replaced whole, never changed in \
+            place, so a call never sees another one half done.
+
+        Args:
+            args (Iterable[str]): The strings to be parsed. Any iterable works, including \
+                generators.
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        program_path, values, given_any = self._tokenize(args)
+        layers = self._apply_layers(values) if self._layered else None
+        if self._handler._validators:
+            self._validate(values)
+        return self._finish(program_path, values, given_any, layers)
+
+    async def parse_result_async(self, args: Iterable[str]) -> 'ParseResult':
+        """Like CompiledParser.parse_result, but runs the validators (see \
+            FlagHandler.add_validator) on the running event loop: coroutine functions are \
+            awaited, the others run in threads (`asyncio.to_thread`).
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags.
+            ValidationError: When validators reject values.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        program_path, values, given_any = self._tokenize(args)
+        layers = self._apply_layers(values) if self._layered else None
+        if self._handler._validators:
+            self._raise_validation_errors(
+                await self._handler._run_validators_async(self._validation_checks(values)))
+        return self._finish(program_path, values, given_any, layers)
+
+    def _tokenize(self, args: Iterable[str]) -> tuple[str, list[Any], bool]:
+        # The program path, the converted values given by the strings (_UNSET for the flags that
+        # weren't given) and whether any string was given.
+        if _COMPLETION_REQUESTED:
+            self._handler._print_completions(args)
+        tokens = iter(args)
+        program_path = next(tokens)
+        values: list[Any] = [_UNSET] * len(self._flags)
+        if (instrumentation := self._handler.instrumentation) is None:
+            given_any = _scan_tokens(tokens, values, self._dispatch.get, self._greedy_dispatch,
+                                     self._known_names, self._handler._report_unknown_flag,
+                                     self._warn_repeated)
+            return program_path, values, given_any
+
+        # The same loop, on tables that time their lookups and conversions.
+        lookup, greedy_dispatch, clock = self._timed_tables()
+        clock.lookup_ns = clock.lookups = clock.conversion_ns = clock.conversions = 0
+        try:
+            given_any = _scan_tokens(tokens, values, lookup, greedy_dispatch, self._known_names,
+                                     self._handler._report_unknown_flag, self._warn_repeated)
+        finally:
+            # Recorded even when parsing fails, so the time spent on bad input shows up too.
+            instrumentation.record("lookup", clock.lookup_ns, clock.lookups)
+            instrumentation.record("conversion", clock.conversion_ns, clock.conversions)
+        return program_path, values, given_any
+
+    def _timed_tables(self) -> tuple[Callable[[str], Optional[_DispatchEntry]],
+                                     dict[str, _GreedyEntry], _PhaseClock]:
+        # The lookup of _dispatch and the table of the list flags, timing into a _PhaseClock.
+        # Built on the first instrumented parse, so that the others don't pay for it.
+        if (timed := self._timed) is not None:
+            return timed
+        clock = _PhaseClock()
+
+        def timed_convert(convert: Callable[[str], flag_value]) -> Callable[[str], flag_value]:
+            def convert_timed(value: str) -> flag_value:
+                start = perf_counter_ns()
+                converted = convert(value)
+                clock.conversion_ns += perf_counter_ns() - start
+                clock.conversions += 1
+                return converted
+            return convert_timed
+
+        def timed_convert_many(convert_many: Callable[[Sequence[str]], Any]
+                               ) -> Callable[[Sequence[str]], Any]:
+            def convert_many_timed(values: Sequence[str]) -> Any:
+                start = perf_counter_ns()
+                converted = convert_many(values)
+                clock.conversion_ns += perf_counter_ns() - start
+                clock.conversions += len(values)
+                return converted
+            return convert_many_timed
+
+        dispatch = {name: (position, None if convert is None else timed_convert(convert))
+                    for name, (position, convert) in self._dispatch.items()}
+        greedy_dispatch = {name: (position, timed_convert_many(convert_many), stdin)
+                           for name, (position, convert_many, stdin)
+                           in self._greedy_dispatch.items()}
+
+        def lookup(token: str) -> Optional[_DispatchEntry]:
+            start = perf_counter_ns()
+            entry = dispatch.get(token)
+            clock.lookup_ns += perf_counter_ns() - start
+            clock.lookups += 1
+            return entry
+
+        self._timed = timed = (lookup, greedy_dispatch, clock)
+        return timed
+
+    def _validation_checks(self, values: list[Any]) -> list[tuple[str, _Validator, Any]]:
+        # (flag name, validator, value) for every validator of a flag that was given.
+        checks: list[tuple[str, _Validator, Any]] = []
+        positions = self._layout.positions
+        for name, validators in self._handler._validators.items():
+            value = values[positions[name]]
+            if value is not _UNSET:
+                checks.extend((name, validator, value) for validator in validators)
+        return checks
+
+    def _validate(self, values: list[Any]) -> None:
+        self._raise_validation_errors(
+            self._handler._run_validators(self._validation_checks(values)))
+
+    @staticmethod
+    def _raise_validation_errors(errors: dict[str, list[str]]) -> None:
+        if errors:
+            raise ValidationError(errors)
+
+    @staticmethod
+    def _warn_repeated(token: str) -> None:
+        import warnings
+        warnings.warn(f"Already parsed flag `{token}`. Did you really mean to repeat this flag? The value will be set to the last instance of the argument.")
+
+    def stream(self, program_path: str) -> 'StreamParser':
+        """Starts parsing tokens that arrive one at a time. See StreamParser.
+
+        Args:
+            program_path (str): The program path (what would be the first string for `parse`).
+
+        Returns:
+            StreamParser: Feed it the tokens, then close it to get the result.
+        """
+        if _COMPLETION_REQUESTED:
+            # The tokens only come later: complete the command line of this process, which is
+            # what the completion scripts pass.
+            import sys
+            self._handler._print_completions([program_path, *sys.argv[1:]])
+        return StreamParser(self, program_path)
+
+    def _finish(self, program_path: str, values: list[Any], given_any: bool,
+                layers: Optional[dict[int, str]]) -> 'ParseResult':
+        # Fills in the defaults, checks the obligatory flags and the help flag. `layers` is the
+        # layer of the values that came from the environment or the config file.
+        if (instrumentation := self._handler.instrumentation) is not None:
+            start = perf_counter_ns()
+        missing = False
+        given = 0  # Bit `position` is set for the values that aren't defaults.
+        for position, default in enumerate(self._defaults):
+            if values[position] is _UNSET:
+                if default is None:
+                    missing = True
+                else:
+                    values[position] = default
+            else:
+                given |= 1 << position
+        for position in self._copied_defaults:
+            if values[position] is self._defaults[position]:
+                values[position] = values[position][:]
+        if instrumentation is not None:
+            elapsed = perf_counter_ns() - start
+            filled = len(values) - given.bit_count() - sum(
+                values[position] is _UNSET for position in self._required_positions)
+            instrumentation.record("defaults", elapsed, filled)
+            start = perf_counter_ns()
+        try:
+            if missing or values[self._help_position]:
+                self._report_missing_flags(program_path, values, given_any)
+        finally:
+            if instrumentation is not None:
+                instrumentation.record("required", perf_counter_ns() - start,
+                                       len(self._required_positions))
+        return ParseResult(program_path, tuple(values), self._layout,
+                           self._origins(given, layers))
+
+    def _origins(self, given: int, layers: Optional[dict[int, str]]
+                 ) -> Union[int, tuple[int, dict[int, str]]]:
+        # What ParseResult.source needs: the mask of the values that aren't defaults and, for a
+        # layered parser, the layers. Results with the same flags given share one mask (python
+        # only shares the ints up to 256), so a result is hardly bigger than its values.
+        shared = self._given_masks.get(given)
+        if shared is not None:
+            given = shared
+        elif len(self._given_masks) < _GIVEN_MASKS_KEPT:
+            self._given_masks[given] = given
+        return given if layers is None else (given, layers)
+
+    def _apply_layers(self, values: list[Any]) -> dict[int, str]:
+        # Fills the values that the strings didn't give from the environment variables, then from
+        # the config file. Returns the layer ("env" or "config") of each value filled.
+        layers: dict[int, str] = {}
+        layer_values, env_values = self._layer_values()
+        for position, (value, layer) in layer_values.items():
+            if values[position] is not _UNSET:
+                continue
+            if layer == "env":
+                # Converted only when it's used: a bad variable doesn't get in the way of a value
+                # given in the strings (and the choices of a ChoiceFlag aren't loaded for nothing).
+                text = value
+                value = env_values.get(position, _UNSET)
+                if value is _UNSET:
+                    value = env_values[position] = self._env_value(position, text)
+            values[position] = value[:] if position in self._copied_defaults else value
+            layers[position] = layer
+        return layers
+
+    def _layer_values(self) -> tuple[dict[int, tuple[Any, str]], dict[int, Any]]:
+        # The value and the layer of every flag that the environment or the config file give (the
+        # environment wins), with the text of the variables unconverted; and the variables
+        # converted so far, by position. Only recomputed when a variable or the file changes.
+        environment = tuple(os_environ.get(variable) for _, variable in self._env_bindings)
+        config_key = self._config_key()
+        memo = self._layer_memo
+        if memo is not None and memo[0] == (environment, config_key):
+            return memo[1], memo[2]
+
+        layer_values: dict[int, tuple[Any, str]] = {}
+        if config_key is not None:
+            for position, value in self._config_values(config_key).items():
+                layer_values[position] = (value, "config")
+        for (position, _), text in zip(self._env_bindings, environment):
+            if text is not None:
+                layer_values[position] = (text, "env")
+        env_values: dict[int, Any] = {}
+        self._layer_memo = ((environment, config_key), layer_values, env_values)
+        return layer_values, env_values
+
+    def _env_value(self, position: int, text: str) -> Any:
+        flag = self._flags[position]
+        variable = flag.env
+        try:
+            if isinstance(flag, (IntListFlag, StringListFlag)):
+                return flag._convert_many(text.split())
+            return flag._convert(text)
+        except ValueError as e:
+            raise ValueError(f"{e} (From the environment variable {variable}, for the flag \
+{flag.flag}.)") from None
+
+    def _config_key(self) -> Optional[tuple[str, Optional[str], int, int]]:
+        # Identifies the current contents of the config file: (absolute path, table, modification
+        # time, size). None if there is no config file.
+        if self._config_file is None:
+            return None
+        path, table, required = self._config_file
+        try:
+            stat = os_stat(path)
+        except FileNotFoundError:
+            if required:
+                raise ValueError(f"The config file `{path}` doesn't exist.") from None
+            return None
+        except OSError as e:
+            raise ValueError(f"Couldn't read the config file `{path}`: {e.strerror}.") from None
+        return (os_path_abspath(path), table, stat.st_mtime_ns, stat.st_size)
+
+    def _config_values(self, key: tuple[str, Optional[str], int, int]) -> dict[int, Any]:
+        # The checked values of the config file by position: from memory, from the cache
+        # directory, or read and checked now.
+        if self._schema is None:
+            self._schema = self._handler._schema or self._handler._schema_hash()
+        memory_key = (*key, self._schema)
+        values = _config_cache.get(memory_key)
+        if values is None:
+            import hashlib
+            name = "config-" + hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+            values = self._handler._cached_on_disk(
+                name, lambda: self._read_config(key[0], key[1]), self._dump_config_values,
+                self._load_config_values)
+            if len(_config_cache) >= _CONFIG_CACHE_SIZE:
+                del _config_cache[next(iter(_config_cache))]
+            _config_cache[memory_key] = values
+        return values
+
+    def _dump_config_values(self, values: dict[int, Any]) -> dict[int, Any]:
+        # For the cache: the arrays of IntListFlags as lists.
+        return {position: value.tolist() if isinstance(self._flags[position], IntListFlag)
+                else value for position, value in values.items()}
+
+    def _load_config_values(self, data: dict[int, Any]) -> dict[int, Any]:
+        from array import array
+        if not all(type(position) is int and 0 <= position < len(self._flags)
+                   for position in data):
+            raise ValueError("Not the values of a config file.")
+        return {position: array("q", value) if isinstance(self._flags[position], IntListFlag)
+                else value for position, value in data.items()}
+
+    def _read_config(self, path: str, table: Optional[str]) -> dict[int, Any]:
+        document = _read_config_file(path, table)
+        positions = {name.lstrip("-"): position for position, flag in enumerate(self._flags)
+                     for name in (flag.flag, *flag.aliases)}
+
+        values: dict[int, Any] = {}
+        keys: dict[int, str] = {}
+        errors: dict[str, list[str]] = {}
+        for key, value in document.items():
+            position = positions.get(key)
+            if position is None:
+                if not isinstance(value, dict):  # Other tables are someone else's.
+                    errors.setdefault(key, []).append(f"Not a flag of this program (in `{path}`).")
+                continue
+            flag = self._flags[position]
+            if position in keys:
+                errors.setdefault(key, []).append(
+                    f"The flag {flag.flag} is already given as `{keys[position]}` (in `{path}`).")
+                continue
+            keys[position] = key
+            try:
+                values[position] = _config_value(flag, value)
+            except ValueError as e:
+                errors.setdefault(key, []).append(f"{e} (In `{path}`.)")
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def parse_many(self, argvs: Iterable[Sequence[str]], processes: Optional[int] = None,
+                   chunk_size: int = 8192) -> 'BatchResult':
+        """Parses many argument lists (each one like the argument of CompiledParser.parse) and \
+            returns the values by column: an `array.array('q')` for each IntFlag, a Bitmap for \
+            each BoolFlag and a list for each StringFlag (and for each list flag, a list of its \
+            arrays or tuples). The input is consumed as a stream.
+
+            The rows go through the same token loop as CompiledParser.parse, so argument files \
+            (`@file`) are read, but `-` is just a value (it doesn't read the values of a list \
+            flag from stdin). Rows that fail to parse don't raise: their exception is stored in \
+            BatchResult.errors and their columns hold placeholders (0, False, "" or empty \
+            lists). Nothing is printed, repeated flags don't warn (the last value wins), asking \
+            for help is just a True in the help flag's column and `FLAGS_COMPLETE` is ignored \
+            (see FlagHandler.completion_script). Environment variables and the config file (see \
+            FlagHandler.config_file) are not read: the rows only get the defaults. The flags are \
+            not changed.
+
+            In one process, this is about 2 to 3 times as fast as a loop around parse: the rows \
+            skip building a ParseResult, the layers and the validators, but each token is still \
+            looked up and converted by python. Beyond that, use `processes`.
+
+        Args:
+            argvs (Iterable[Sequence[str]]): The argument lists.
+            processes (Optional[int], optional): If given, parse the input in chunks on a pool of \
+                this many processes. Defaults to None (parse in this process).
+            chunk_size (int, optional): Number of rows sent to a process at a time. Rounded up to \
+                a multiple of 8. Defaults to 8192.
+
+        Returns:
+            BatchResult: The columns and the errors of the rows.
+        """
+        if processes is None:
+            return _parse_batch(self._batch_spec, argvs)
+        return self._parse_in_processes(_parse_batch, argvs, processes, chunk_size)
+
+    def parse_string(self, command_line: str) -> 'ParseResult':
+        """Parses a whole command line, like CompiledParser.parse_result would parse its words, \
+            without `shlex.split`: the words are found with the same rules (POSIX mode) by one \
+            regular expression (or `str.split`, when there are no quotes or backslashes), and \
+            only then rewritten for the parser, one at a time. \
+            `--flag=value` and bundled switches (`-abc` for `-a -b -c`; the last one may take a \
+            value, as in `-vn5`) are also accepted. The flags are not changed.
+
+        Args:
+            command_line (str): The command line. The first word is the program path.
+
+        Raises:
+            ValueError: When it doesn't understand one of the parsed flags, a quote is never \
+                closed or the command line is empty.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        if not command_line or command_line.isspace():
+            raise ValueError("The command line is empty: it needs at least the program path.")
+        return self.parse_result(
+            _split_command_line(command_line, self._dispatch, self._greedy_dispatch))
+
+    def parse_strings(self, command_lines: Iterable[str], processes: Optional[int] = None,
+                      chunk_size: int = 8192) -> 'BatchResult':
+        """Parses many command lines (each one like the argument of CompiledParser.parse_string) \
+            and returns the values by column, like CompiledParser.parse_many. The input is \
+            consumed as a stream, e.g. the lines of a file. An empty line is a row that gives \
+            no flags.
+
+        Args:
+            command_lines (Iterable[str]): The command lines.
+            processes (Optional[int], optional): If given, split and parse the input in chunks \
+                on a pool of this many processes. Defaults to None (parse in this process).
+            chunk_size (int, optional): Number of rows sent to a process at a time. Rounded up to \
+                a multiple of 8. Defaults to 8192.
+
+        Returns:
+            BatchResult: The columns and the errors of the rows.
+        """
+        if processes is None:
+            return _parse_string_batch(self._batch_spec, command_lines)
+        return self._parse_in_processes(_parse_string_batch, command_lines, processes, chunk_size)
+
+    def _parse_in_processes(self, parse_chunk: Callable[[_BatchSpec, Any], 'BatchResult'],
+                            rows: Iterable[Any], processes: int, chunk_size: int) -> 'BatchResult':
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import islice
+
+        chunk_size = -(-chunk_size // 8) * 8  # Keeps the bitmaps of the chunks byte aligned.
+        rows = iter(rows)
+        result = _parse_batch(self._batch_spec, ())
+        # The spec goes to each process once, not with every chunk.
+        with ProcessPoolExecutor(processes, initializer=_set_process_spec,
+                                 initargs=(self._batch_spec,)) as executor:
+            # Only keep a few chunks in flight, so the input is never fully in memory.
+            pending: deque[Future[BatchResult]] = deque()
+            while True:
+                while len(pending) < 2 * processes and (chunk := list(islice(rows, chunk_size))):
+                    pending.append(executor.submit(_parse_process_chunk, parse_chunk, chunk))
+                if not pending:
+                    break
+                result._extend(pending.popleft().result())
+        return result
+
+    def _report_missing_flags(self, program_path: str, values: list[Any], given_any: bool) -> None:
+        if not given_any or values[self._help_position]:
+            # If the user didn't pass any arguments (when they should have)
+            # or if they explicitly asked for help, show the help.
+            self._handler.output_function(self._handler._generate_help_message(program_path))
+        missing_flags = ", ".join(flag.flag for flag, value in zip(self._flags, values)
+                                  if value is _UNSET)
+        assert not missing_flags, \
+            f"You need to pass the following obligatory flags: {missing_flags}"
+
+
+class StreamParser:
+    """Parses tokens as they arrive, e.g. from a pipe, instead of needing all of them up front. \
+    Create it with FlagHandler.stream or CompiledParser.stream.
+
+    Unknown flags and bad values raise from `feed` as soon as they are seen. `close` fills in the \
+    defaults, checks the obligatory flags and returns an immutable ParseResult; the flags \
+    themselves are not changed.
+
+        stream = fh.stream("job")
+        for token in tokens_from_pipe():
+            stream.feed(token)
+        result = stream.close()
+    """
+    __slots__ = ("_parser", "_program_path", "_values", "_pending", "_taking", "_given_any",
+                 "_closed", "_argfiles_being_read")
+
+    def __init__(self, parser: CompiledParser, program_path: str):
+        self._parser = parser
+        self._program_path = program_path
+        self._values: list[Any] = [_UNSET] * len(parser._flags)
+        # The flag token, position and converter of a flag still waiting for its value.
+        self._pending: Optional[tuple[str, int, Callable[[str], flag_value]]] = None
+        # The entry of a list flag taking values, and the values so far.
+        self._taking: Optional[tuple[_GreedyEntry, list[str]]] = None
+        self._given_any = False
+        self._closed = False
+        self._argfiles_being_read: set[str] = set()
+
+    def feed(self, token: str) -> None:
+        """Parses one more token.
+
+        Raises:
+            ValueError: When the token isn't a known flag, or isn't a valid value for the flag \
+                before it.
+        """
+        assert not self._closed, "Can't feed a StreamParser after closing it."
+        self._given_any = True
+        if (pending := self._pending) is not None:
+            self._pending = None
+            self._values[pending[1]] = pending[2](token)
+            return
+
+        entry = self._parser._dispatch.get(token)
+        if self._taking is not None:
+            if entry is None and token not in self._parser._greedy_dispatch:
+                if token.startswith("@") and len(token) > 1:
+                    self.feed_many(_read_argfile(token[1:], self._argfiles_being_read))
+                else:
+                    self._taking[1].append(token)
+                return
+            self._stop_taking()  # The next flag ends the values of the list flag.
+        if entry is None:
+            if (greedy_entry := self._parser._greedy_dispatch.get(token)) is not None:
+                if self._values[greedy_entry[0]] is not _UNSET:
+                    self._parser._warn_repeated(token)
+                self._taking = (greedy_entry, [])
+                return
+            if token.startswith("@") and len(token) > 1:
+                self.feed_many(_read_argfile(token[1:], self._argfiles_being_read))
+                return
+            self._parser._handler._report_unknown_flag(token)
+        position, convert = entry
+        if self._values[position] is not _UNSET:
+            self._parser._warn_repeated(token)
+        if convert is None:
+            self._values[position] = True
+        else:
+            self._pending = (token, position, convert)
+
+    def feed_many(self, tokens: Iterable[str]) -> None:
+        """Parses every token of any iterable (e.g. a generator), one at a time."""
+        for token in tokens:
+            self.feed(token)
+
+    def _stop_taking(self) -> None:
+        # Converts the values taken by a list flag, all at once.
+        assert self._taking is not None
+        (position, convert_many, stdin), taken = self._taking
+        self._taking = None
+        if stdin and taken == ["-"]:
+            taken = _read_stdin_values()
+        self._values[position] = convert_many(taken)
+
+    def close(self) -> 'ParseResult':
+        """Finishes parsing.
+
+        Raises:
+            AssertionError: When the last flag is missing its value or obligatory flags are \
+                missing.
+
+        Returns:
+            ParseResult: The values, accessible by flag (`result[flag]`) or by name/alias.
+        """
+        assert not self._closed, "This StreamParser was already closed."
+        self._closed = True
+        if self._pending is not None:
+            raise AssertionError(f"Expected more arguments for flag `{self._pending[0]}`.")
+        if self._taking is not None:
+            self._stop_taking()
+        parser = self._parser
+        layers = parser._apply_layers(self._values) if parser._layered else None
+        if parser._handler._validators:
+            parser._validate(self._values)
+        return parser._finish(self._program_path, self._values, self._given_any, layers)
+
+
+# VALIDATION
+
+_VALIDATION_CACHE_SIZE = 4096  # Outcomes of pure validators kept per handler.
+
+
+class ValidationError(ValueError):
+    """Raised when validators (see FlagHandler.add_validator) reject values, or when a config \
+    file (see FlagHandler.config_file) has unknown keys or values of the wrong type. `errors` \
+    maps the name of each flag (or key) with rejected values to the messages."""
+
+    def __init__(self, errors: dict[str, list[str]]):
+        self.errors = errors
+        lines = [f"  {name}: {message}" for name, messages in errors.items()
+                 for message in messages]
+        super().__init__("Some values are not valid:\n" + "\n".join(lines))
+
+
+def _validator_failure(validator: Callable[[Any], Any], outcome: Any,
+                       error: Optional[BaseException]) -> Optional[str]:
+    # The message of a validator's rejection, or None if it accepted the value.
+    if error is not None:
+        return str(error) or type(error).__name__
+    if outcome is False:
+        return f"Rejected by `{getattr(validator, '__name__', repr(validator))}`."
+    return None
+
+
+def _run_validator(validator: Callable[[Any], Any], value: Any) -> Optional[str]:
+    try:
+        outcome = validator(value)
+        if hasattr(outcome, "__await__"):
+            import asyncio
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # A coroutine function, outside of asyncio.
+                outcome = asyncio.run(_awaited(outcome))
+            else:
+                # A synchronous parse inside an event loop, where asyncio.run can't be used: run the
+                # coroutine on a loop of its own, on another thread (parse_result_async wouldn't
+                # block the loop).
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(1) as executor:
+                    outcome = executor.submit(asyncio.run, _awaited(outcome)).result()
+    except Exception as error:
+        return _validator_failure(validator, None, error)
+    return _validator_failure(validator, outcome, None)
+
+
+async def _run_validator_async(validator: Callable[[Any], Any], value: Any) -> Optional[str]:
+    try:
+        outcome = await validator(value)
+    except Exception as error:
+        return _validator_failure(validator, None, error)
+    return _validator_failure(validator, outcome, None)
+
+
+async def _awaited(awaitable: Any) -> Any:
+    return await awaitable
+
+
+# COMPLETION
+
+class _PrefixTrie:
+    """Radix trie over words, for prefix completion in O(prefix length + size of the results).
+
+    A node is a dict from the first character of each outgoing edge to (edge label, child node), \
+    plus the key "" (which no edge starts with) holding the word that ends there. Chains of nodes \
+    with a single child are merged into one edge, so there are at most two nodes per word."""
+    __slots__ = ("_root",)
+
+    def __init__(self) -> None:
+        self._root: dict[str, Any] = {}
+
+    def add(self, word: str) -> None:
+        node = self._root
+        i = 0
+        while i < len(word):
+            edge = node.get(word[i])
+            if edge is None:
+                node[word[i]] = (word[i:], {"": word})
+                return
+            label, child = edge
+            common = 0
+            limit = min(len(label), len(word) - i)
+            while common < limit and label[common] == word[i + common]:
+                common += 1
+            if common < len(label):
+                # Split the edge where the word leaves it.
+                middle = {label[common]: (label[common:], child)}
+                node[word[i]] = (label[:common], middle)
+                child = middle
+            node = child
+            i += common
+        node[""] = word
+
+    def complete(self, prefix: str) -> list[str]:
+        """Returns the words that start with `prefix`, in alphabetical order."""
+        node = self._root
+        i = 0
+        while i < len(prefix):
+            edge = node.get(prefix[i])
+            if edge is None:
+                return []
+            label, child = edge
+            if prefix.startswith(label, i):
+                i += len(label)
+            elif not label.startswith(prefix[i:]):
+                return []
+            else:
+                i = len(prefix)  # The prefix ends inside this edge.
+            node = child
+
+        words: list[str] = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, value in node.items():
+                if key:
+                    stack.append(value[1])
+                else:
+                    words.append(value)
+        words.sort()
+        return words
+
+
+class CompletionServer:
+    """Answers completion requests for many programs over a local Unix socket, keeping their \
+    handlers (and completion tries) in memory, so a completion takes a round trip instead of \
+    starting python. Point FlagHandler.completion_script at the same socket.
+
+    Programs are registered like subcommands (a factory, a handler or "package.module:attribute") \
+    and are built on their first request, or all at once with `warm`.
+
+        server = flags.CompletionServer("/tmp/flags-completion.sock")
+        server.register("mytool", "mytool.cli:build_flag_handler")
+        server.serve_forever()
+
+    A request is the program name and the words after it (the last one being completed), each \
+    followed by a NUL byte, then a newline. The answer is one completion per line.
+    """
+    __slots__ = ("socket_path", "_programs", "_server")
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._programs: dict[str, Subcommand] = {}
+        self._server: Any = None
+
+    def register(self, program_name: str,
+                 factory: Union[FlagHandler, Callable[[], FlagHandler], str]) -> None:
+        """Adds a program, built on its first request. See FlagHandler.subcommand for `factory`."""
+        self._programs[program_name] = Subcommand(program_name, "", factory)  # type: ignore[arg-type]
+
+    def warm(self) -> None:
+        """Builds the handlers and completion tries of every program now."""
+        for program in self._programs.values():
+            program.handler.complete([""])
+
+    def complete(self, program_name: str, words: Sequence[str]) -> list[str]:
+        """Returns the completions of FlagHandler.complete for a registered program (none for \
+            unknown programs)."""
+        program = self._programs.get(program_name)
+        return program.handler.complete(words) if program is not None else []
+
+    def serve_forever(self) -> None:
+        """Listens on the socket until `shutdown` is called. Requests are answered in threads. \
+            A socket file left behind by a server that is gone is replaced.
+
+        Raises:
+            ValueError: When the path exists and isn't a socket, or another server is listening \
+                on it.
+        """
+        import os
+        import socketserver
+
+        server = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                request = self.rfile.readline()
+                if not request:
+                    return  # Only connected, e.g. by a server checking that this one is alive.
+                program_name, *words = request.rstrip(b"\n").decode().split("\0")
+                if words and words[-1] == "":
+                    words.pop()  # After the last NUL.
+                try:
+                    completions = server.complete(program_name, words)
+                except Exception:
+                    completions = []  # A broken program shouldn't break the server.
+                try:
+                    self.wfile.write("".join(f"{completion}\n"
+                                             for completion in completions).encode())
+                except OSError:
+                    pass  # The client is gone (e.g. the completion was interrupted).
+
+        self._remove_stale_socket()
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler)
+        self._server.daemon_threads = True
+        inode = os.stat(self.socket_path).st_ino
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                if os.stat(self.socket_path).st_ino == inode:  # Still ours.
+                    os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_stale_socket(self) -> None:
+        # Removes the socket file of a server that is gone, and refuses to touch anything else.
+        import os
+        import socket
+        import stat
+        try:
+            mode = os.lstat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ValueError(f"`{self.socket_path}` exists and isn't a socket, it won't be \
+replaced.")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                pass  # Nobody listening: stale.
+            else:
+                raise ValueError(f"Another server is listening on `{self.socket_path}`.")
+        os.unlink(self.socket_path)
+
+    def shutdown(self) -> None:
+        """Stops `serve_forever` (from another thread)."""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+# INSTRUMENTATION
+
+class Instrumentation:
+    """Receives the timings of the phases of parsing. Set an instance (of a subclass) as \
+    `FlagHandler.instrumentation` to profile a handler; without one, nothing is timed or \
+    formatted. LatencyCollector is a ready-made one.
+
+    `record(phase, elapsed_ns, count)` is called once per phase per parse, with the nanoseconds \
+    spent in the phase and how many items it handled:
+    - "lookup": finding each token in the dispatch table (count: tokens);
+    - "conversion": converting the values of int and string flags (count: values);
+    - "defaults": filling in the defaults of flags that weren't given (count: defaults filled);
+    - "required": checking the obligatory flags, including showing the help when asked for \
+        (count: obligatory flags);
+    - "suggestion": finding the flags closest to an unknown one (count: suggestions);
+    - "validation": running the validators of FlagHandler.add_validator, all together \
+        (count: validators, including the ones answered from the cache).
+
+    FlagHandler.parse, FlagHandler.parse_result and the compiled parser report every phase. \
+    StreamParser only reports "defaults", "required" and "suggestion", and parse_many reports \
+    nothing. It may be called from many threads at once.
+    """
+    __slots__ = ()
+
+    phases = ("lookup", "conversion", "defaults", "required", "suggestion", "validation")
+
+    def record(self, phase: str, elapsed_ns: int, count: int) -> None:
+        pass
+
+
+class LatencyCollector(Instrumentation):
+    """Instrumentation that counts calls, items and time per phase, and keeps a latency \
+    histogram of each phase with power-of-two buckets (so percentiles are upper bounds, within a \
+    factor of two).
+
+        fh.instrumentation = collector = flags.LatencyCollector()
+        ...
+        print(collector.report())
+    """
+    __slots__ = ("_lock", "_calls", "_items", "_total_ns", "_histograms")
+
+    _BUCKETS = 64  # Bucket `i` holds the latencies below 2**i ns (and at least 2**(i-1) ns).
+
+    def __init__(self) -> None:
+        self._lock = allocate_lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets everything recorded so far."""
+        with self._lock:
+            self._calls: dict[str, int] = dict.fromkeys(self.phases, 0)
+            self._items: dict[str, int] = dict.fromkeys(self.phases, 0)
+            self._total_ns: dict[str, int] = dict.fromkeys(self.phases, 0)
+            self._histograms: dict[str, list[int]] = {
+                phase: [0] * self._BUCKETS for phase in self.phases}
+
+    def record(self, phase: str, elapsed_ns: int, count: int) -> None:
+        bucket = min(elapsed_ns.bit_length(), self._BUCKETS - 1)
+        with self._lock:
+            self._calls[phase] += 1
+            self._items[phase] += count
+            self._total_ns[phase] += elapsed_ns
+            self._histograms[phase][bucket] += 1
+
+    def histogram(self, phase: str) -> list[tuple[int, int]]:
+        """Returns (upper bound in ns, number of calls) for every non-empty bucket of a phase."""
+        with self._lock:
+            return [(1 << bucket, calls) for bucket, calls in enumerate(self._histograms[phase])
+                    if calls]
+
+    def percentile(self, phase: str, percent: float) -> int:
+        """Returns an upper bound, in ns, of the given percentile of the latency of a phase \
+            (0 if it was never recorded)."""
+        assert 0 <= percent <= 100
+        with self._lock:
+            histogram = list(self._histograms[phase])
+        remaining = percent / 100 * sum(histogram)
+        for bucket, calls in enumerate(histogram):
+            remaining -= calls
+            if calls and remaining <= 0:
+                return 1 << bucket
+        return 0
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        """Returns, for each phase: calls, items, total_ns, p50_ns, p90_ns and p99_ns."""
+        with self._lock:
+            counters = [(phase, self._calls[phase], self._items[phase], self._total_ns[phase])
+                        for phase in self.phases]
+        return {phase: {"calls": calls, "items": items, "total_ns": total_ns,
+                        "p50_ns": self.percentile(phase, 50), "p90_ns": self.percentile(phase, 90),
+                        "p99_ns": self.percentile(phase, 99)}
+                for phase, calls, items, total_ns in counters}
+
+    def report(self) -> str:
+        """Returns a table of the summary, for people."""
+        lines = [f"{'phase':<11}{'calls':>9}{'items':>11}{'total ms':>11}"
+                 f"{'p50 us':>9}{'p90 us':>9}{'p99 us':>9}"]
+        for phase, numbers in self.summary().items():
+            lines.append(f"{phase:<11}{numbers['calls']:>9}{numbers['items']:>11}"
+                         f"{numbers['total_ns'] / 1e6:>11.3f}{numbers['p50_ns'] / 1e3:>9.1f}"
+                         f"{numbers['p90_ns'] / 1e3:>9.1f}{numbers['p99_ns'] / 1e3:>9.1f}")
+        return "\n".join(lines) + "\n"
+
+
+# COMMAND STRINGS
+
+# A shell word: runs of unquoted characters, single or double quoted strings and escaped characters,
+# with nothing between them. A quote that is never closed, or a trailing backslash, is matched alone
+# (see _SHELL_ERRORS).
+_SHELL_WORD = r"""(?:[^\s'"\\]+|'[^']*'|"(?:[^"\\]|\\.)*"|\\.)+|['"]|\\$"""
+_SHELL_ERRORS = frozenset(("'", '"', "\\"))
+# One piece of a shell word that has quotes or backslashes.
+_SHELL_WORD_PART = r"""([^'"\\]+)|'([^']*)'|"((?:[^"\\]|\\.)*)"|\\(.)"""
+
+
+def _unquote_shell_word(word: str) -> str:
+    import re
+    parts = []
+    for match in re.finditer(_SHELL_WORD_PART, word, re.S):
+        unquoted, single_quoted, double_quoted, escaped = match.groups()
+        if unquoted is not None:
+            parts.append(unquoted)
+        elif single_quoted is not None:
+            parts.append(single_quoted)
+        elif double_quoted is not None:
+            # Like `shlex` (POSIX mode): in double quotes, a backslash only escapes `"` and `\`.
+            parts.append(re.sub(r'\\([\\"])', r"\1", double_quoted))
+        else:
+            parts.append(escaped)
+    return "".join(parts)
+
+
+def _split_command_line(command_line: str,
+                        dispatch: dict[str, _DispatchEntry],
+                        greedy_dispatch: dict[str, _GreedyEntry]) -> Iterator[str]:
+    """Yields the tokens of a command line, like `shlex.split` (POSIX mode) would split it, with \
+    `--flag=value` split in two and bundled switches (`-abc`) split into one flag each (the last \
+    one may take a value: `-vn5` or `-vn 5`). The words are split up front; they are only \
+    rewritten when they aren't known flags themselves, and never when they are the value of a \
+    flag (or the program path)."""
+    if "'" in command_line or '"' in command_line or "\\" in command_line:
+        import re
+        words = []
+        for word in re.findall(_SHELL_WORD, command_line, re.S):
+            if word in _SHELL_ERRORS:
+                raise ValueError(f"No closing quotation or escaped character in the command line "
+                                 f"`{command_line}`.")
+            if "'" in word or '"' in word or "\\" in word:
+                word = _unquote_shell_word(word)
+            words.append(word)
+    else:
+        # Without quotes or escapes, the words are just separated by whitespace: `str.split` finds
+        # them much faster than the regular expression.
+        words = command_line.split()
+
+    value_expected = True  # The program path is yielded as is.
+    for word in words:
+        if value_expected or word in dispatch or word in greedy_dispatch or word[:1] != "-":
+            if value_expected:
+                value_expected = False
+            elif (entry := dispatch.get(word)) is not None:
+                value_expected = entry[1] is not None
+            yield word
+        elif "=" in word:
+            name, value = word.split("=", 1)
+            if (entry := dispatch.get(name)) is not None and entry[1] is not None \
+                    or name in greedy_dispatch:
+                yield name
+                yield value
+            else:
+                yield word  # Reported as an unknown flag.
+        elif len(word) > 2 and word[1] != "-":
+            # Bundled switches: every letter is a flag, and the rest after one that takes a value
+            # is its value.
+            expanded = []
+            for i in range(1, len(word)):
+                flag = "-" + word[i]
+                entry = dispatch.get(flag)
+                if entry is None:
+                    expanded = [word]  # Not a bundle after all: reported as an unknown flag.
+                    break
+                expanded.append(flag)
+                if entry[1] is not None:
+                    if i + 1 < len(word):
+                        expanded.append(word[i+1:])
+                    else:
+                        value_expected = True
+                    break
+            yield from expanded
+        else:
+            yield word
+
+
+# CONFIG FILES
+
+_CONFIG_CACHE_SIZE = 16
+# (absolute path, table, mtime, size, hash of the flags) -> the checked values of a config file by
+# position, so parsing again (with this or another handler with the same flags) doesn't read an
+# unchanged file.
+_config_cache: dict[tuple[str, Optional[str], int, int, str], dict[int, Any]] = {}
+
+
+def _read_config_file(path: str, table: Optional[str]) -> dict[str, Any]:
+    # The keys and values of the table of a TOML file.
+    import tomllib  # Python 3.11+.
+    try:
+        with open(path, "rb") as file:
+            document = tomllib.load(file)
+    except OSError as e:
+        raise ValueError(f"Couldn't read the config file `{path}`: {e.strerror}.") from None
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"The config file `{path}` isn't valid TOML: {e}.") from None
+    if table is not None:
+        for part in table.split("."):
+            document = document.get(part, {})
+            if not isinstance(document, dict):
+                raise ValueError(f"`{table}` in the config file `{path}` isn't a table.")
+    return document
+
+
+def _config_value(flag: flag_classes, value: Any) -> Any:
+    # Checks the type of a value of a config file and converts it like the flag's values.
+    _assert_that_flag_types_havent_changed(6)
+    match flag:
+        case IntFlag():
+            expected, valid = "an integer", type(value) is int
+        case BoolFlag():
+            expected, valid = "a boolean", type(value) is bool
+        case StringFlag() | ChoiceFlag():
+            expected, valid = "a string", type(value) is str
+        case IntListFlag():
+            expected = "an array of integers"
+            valid = type(value) is list and all(type(item) is int for item in value)
+        case StringListFlag():
+            expected = "an array of strings"
+            valid = type(value) is list and all(type(item) is str for item in value)
+        case _ as unreachable:
+            _assert_never(unreachable)
+    if not valid:
+        raise ValueError(f"Expected {expected} for the flag {flag.flag}, got `{value!r}`.")
+    if isinstance(flag, (IntListFlag, StringListFlag)):
+        return flag._convert_many(value)
+    if isinstance(flag, ChoiceFlag):
+        return flag._convert(value)
+    return value
+
+
+# ARGUMENT FILES
+
+# The tokens of an argument file are shell words, quoted and escaped like the command lines of
+# parse_string (`--name="x y"` is one token). Compiled on first use, to keep `re` out of the import.
+_ARGFILE_WORD = _SHELL_WORD.encode()
+_ARGFILE_CACHE_SIZE = 16
+# (real path, mtime, size) -> (start, end) byte offsets of every token in the file, so reading an
+# unchanged file again skips the tokenizing.
+_argfile_cache: dict[tuple[str, int, int], 'array[int]'] = {}
+
+
+def _read_argfile(path: str, being_read: set[str]) -> Iterator[str]:
+    """Yields the tokens of the argument file at `path`, one at a time.
+
+    The file is memory-mapped and each token is decoded only when it's reached, so huge files are \
+    never copied into memory as a whole. `being_read` holds the files currently being read (the \
+    ones that include this one), to refuse cycles of files that include each other."""
+    import mmap
+    import re
+    from array import array
+
+    real_path = os_path_realpath(path)
+    if real_path in being_read:
+        raise ValueError(f"The argument file `{path}` includes itself (through `@{path}`).")
+    try:
+        file = open(real_path, "rb")
+    except OSError as e:
+        raise ValueError(f"Couldn't read the argument file `{path}`: {e.strerror}.")
+
+    being_read.add(real_path)
+    try:
+        with file:
+            stat = os_fstat(file.fileno())
+            if stat.st_size == 0:
+                return  # Can't mmap an empty file, and there is nothing to read anyway.
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                key = (real_path, stat.st_mtime_ns, stat.st_size)
+                offsets = _argfile_cache.get(key)
+                if offsets is not None:
+                    for i in range(0, len(offsets), 2):
+                        yield _argfile_token(mapped[offsets[i]:offsets[i+1]], path)
+                    return
+
+                offsets = array("Q")
+                for match in re.finditer(_ARGFILE_WORD, mapped, re.S):
+                    start, end = match.span()
+                    offsets.append(start)
+                    offsets.append(end)
+                    yield _argfile_token(mapped[start:end], path)
+                # Only cache files that were read to the end.
+                if len(_argfile_cache) >= _ARGFILE_CACHE_SIZE:
+                    del _argfile_cache[next(iter(_argfile_cache))]
+                _argfile_cache[key] = offsets
+    finally:
+        being_read.discard(real_path)
+
+
+def _argfile_token(word: bytes, path: str) -> str:
+    # A word of an argument file, without its quotes and escapes.
+    if b"'" in word or b'"' in word or b"\\" in word:
+        if len(word) == 1:  # See _SHELL_ERRORS.
+            raise ValueError(f"No closing quotation or escaped character in the argument file \
+`{path}`.")
+        return _unquote_shell_word(word.decode())
+    return word.decode()
+
+
+_UNSET: Any = object()  # Value of the flags that haven't been given (yet) while parsing.
+
+
+class _ResultLayout:
+    # Shared by all the ParseResults of a CompiledParser.
+    __slots__ = ("names", "positions")
+
+    def __init__(self, names: tuple[str, ...], positions: dict[str, int]):
+        self.names = names  # Main names, in the order of the values.
+        self.positions = positions  # Any name or alias -> position of the value.
+
+
+class ParseResult:
+    """Immutable result of parsing, returned by FlagHandler.parse and FlagHandler.parse_result.
+
+    Works as a read-only mapping from the main names of the flags to their values. Indexing with \
+    the flag returned by FlagHandler.int_flag (etc.) gives a value of the right type, and aliases \
+    work as keys too:
+
+        name = fh.str_flag("-n", "The name.", aliases=["--name"])
+        result = fh.parse_result(sys.argv)
+        result[name], result["--name"]
+
+    Only holds a tuple of values; the names are shared with every other result of the same parser.
+    It has the methods of a read-only Mapping, without inheriting from `collections.abc.Mapping`
+    (importing `collections` isn't free).
+    """
+    __slots__ = ("program_path", "subcommand", "_values", "_layout", "_origins")
+
+    program_path: str
+    subcommand: Optional[str]  # Name of the subcommand that was parsed, if any.
+    _values: tuple[flag_value, ...]
+    _layout: _ResultLayout
+    # For `source`: an int with bit `position` set for the values that aren't defaults or, when
+    # the parser has an environment or config layer, that int and the layer of the values that
+    # came from there. See CompiledParser._origins.
+    _origins: Union[int, tuple[int, dict[int, str]]]
+
+    def __init__(self, program_path: str, values: tuple[flag_value, ...], layout: _ResultLayout,
+                 origins: Union[int, tuple[int, dict[int, str]]],
+                 subcommand: Optional[str] = None):
+        object.__setattr__(self, "program_path", program_path)
+        object.__setattr__(self, "subcommand", subcommand)
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_layout", layout)
+        object.__setattr__(self, "_origins", origins)
+
+    def _of_subcommand(self, subcommand: str) -> ParseResult:
+        return ParseResult(self.program_path, self._values, self._layout, self._origins,
+                           subcommand)
+
+    def source(self, key: Union[str, Flag]) -> str:
+        """Where the value of a flag came from: "argv" (the parsed strings), "env" (its \
+        environment variable), "config" (the config file, see FlagHandler.config_file) or \
+        "default"."""
+        name = key.flag if isinstance(key, Flag) else key
+        position = self._layout.positions[name]
+        origins = self._origins
+        if isinstance(origins, tuple):
+            given, layers = origins
+            if (layer := layers.get(position)) is not None:
+                return layer
+        else:
+            given = origins
+        return "argv" if given >> position & 1 else "default"
+
+    def sources(self) -> dict[str, str]:
+        """The source (see ParseResult.source) of every value, by main name."""
+        return {name: self.source(name) for name in self._layout.names}
+
+    if TYPE_CHECKING:
+        @overload
+        def __getitem__(self, key: IntFlag) -> int: ...
+        @overload
+        def __getitem__(self, key: BoolFlag) -> bool: ...
+        @overload
+        def __getitem__(self, key: StringFlag | ChoiceFlag) -> str: ...
+        @overload
+        def __getitem__(self, key: IntListFlag) -> array[int]: ...
+        @overload
+        def __getitem__(self, key: StringListFlag) -> tuple[str, ...]: ...
+        @overload
+        def __getitem__(self, key: Union[str, Flag]) -> flag_value | list_flag_value: ...
+
+    def __getitem__(self, key: Union[str, Flag]) -> flag_value | list_flag_value:
+        name = key.flag if isinstance(key, Flag) else key
+        return self._values[self._layout.positions[name]]
+
+    def __contains__(self, key: object) -> bool:
+        name = key.flag if isinstance(key, Flag) else key
+        return name in self._layout.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout.names)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Union[str, Flag], default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> tuple[str, ...]:
+        return self._layout.names
+
+    def values(self) -> tuple[flag_value, ...]:
+        return self._values
+
+    def items(self) -> Iterator[tuple[str, flag_value]]:
+        return zip(self._layout.names, self._values)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ParseResult):
+            return dict(self.items()) == dict(other.items())
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ParseResult is immutable.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("ParseResult is immutable.")
+
+    def __repr__(self) -> str:
+        if self.subcommand is not None:
+            return f"ParseResult({self.program_path!r}, {dict(self.items())!r}, " \
+                f"subcommand={self.subcommand!r})"
+        return f"ParseResult({self.program_path!r}, {dict(self.items())!r})"
+
+
+class Bitmap:
+    """Compact column of bools, one bit per row (bit `i % 8` of byte `i // 8`)."""
+    __slots__ = ("_bytes", "_length")
+
+    def __init__(self) -> None:
+        self._bytes = bytearray()
+        self._length = 0
+
+    def extend(self, values: Sequence[bool]) -> None:
+        if self._length % 8 == 0:
+            # Byte aligned: pack the new bits in one go.
+            bits = "".join("1" if value else "0" for value in reversed(values))
+            self._bytes += int(bits or "0", 2).to_bytes((len(values) + 7) // 8, "little")
+            self._length += len(values)
+        else:
+            for value in values:
+                if self._length % 8 == 0:
+                    self._bytes.append(0)
+                if value:
+                    self._bytes[-1] |= 1 << (self._length % 8)
+                self._length += 1
+
+    def __getitem__(self, row: int) -> bool:
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError("Bitmap index out of range.")
+        return bool(self._bytes[row >> 3] >> (row & 7) & 1)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bool]:
+        for row in range(self._length):
+            yield bool(self._bytes[row >> 3] >> (row & 7) & 1)
+
+    def count(self) -> int:
+        """Number of rows that are True."""
+        return sum(byte.bit_count() for byte in self._bytes)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bytes)
+
+    def __repr__(self) -> str:
+        return f"Bitmap({''.join('1' if value else '0' for value in self)})"
+
+
+if TYPE_CHECKING:
+    column_classes = Union[array[int], Bitmap, list[str], list[array[int]],
+                           list[tuple[str, ...]]]
+
+
+class BatchResult:
+    """Columns of values returned by CompiledParser.parse_many or parse_strings (or the same methods
+    of FlagHandler).
+
+    `result[flag]` or `result[name]` gives the column of a flag. `errors` maps the index of each \
+    row that failed to parse to its exception; those rows hold placeholders in the columns."""
+    __slots__ = ("rows", "columns", "errors", "_names")
+
+    def __init__(self, columns: dict[str, column_classes], names: dict[str, str]):
+        self.rows = 0
+        self.columns = columns
+        self.errors: dict[int, Exception] = {}
+        self._names = names
+
+    if TYPE_CHECKING:
+        @overload
+        def __getitem__(self, key: IntFlag) -> array[int]: ...
+        @overload
+        def __getitem__(self, key: BoolFlag) -> Bitmap: ...
+        @overload
+        def __getitem__(self, key: StringFlag | ChoiceFlag) -> list[str]: ...
+        @overload
+        def __getitem__(self, key: IntListFlag) -> list[array[int]]: ...
+        @overload
+        def __getitem__(self, key: StringListFlag) -> list[tuple[str, ...]]: ...
+        @overload
+        def __getitem__(self, key: str) -> column_classes: ...
+
+    def __getitem__(self, key: Union[str, Flag]) -> column_classes:
+        name = key.flag if isinstance(key, Flag) else self._names[key]
+        return self.columns[name]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _extend(self, other: 'BatchResult') -> None:
+        for name, column in self.columns.items():
+            column.extend(other.columns[name])  # type: ignore[arg-type]
+        for row, error in other.errors.items():
+            self.errors[self.rows + row] = error
+        self.rows += other.rows
+
+    def __repr__(self) -> str:
+        return f"BatchResult(rows={self.rows}, errors={len(self.errors)})"
+
+
+class _BatchSpec:
+    # Everything parse_many needs, indexed by flag position. Picklable, for the process pool.
+    __slots__ = ("names", "kinds", "dispatch", "greedy_dispatch", "known_names", "defaults")
+
+    def __init__(self, names: tuple[str, ...], kinds: tuple[flag_classes_type, ...],
+                 dispatch: dict[str, _DispatchEntry],
+                 greedy_dispatch: dict[str, _GreedyEntry],
+                 known_names: frozenset[str],
+                 defaults: tuple[Any, ...]):
+        self.names = names
+        self.kinds = kinds
+        self.dispatch = dispatch
+        self.greedy_dispatch = greedy_dispatch
+        self.known_names = known_names
+        self.defaults = defaults  # None for flags that must be given.
+
+
+_BATCH_ROWS_PER_TRANSPOSE = 8192  # Multiple of 8, to keep the bitmaps byte aligned.
+
+
+def _parse_batch(spec: _BatchSpec, argvs: Iterable[Iterable[str]]) -> BatchResult:
+    from array import array
+    _assert_that_flag_types_havent_changed(6)
+    placeholders: dict[flag_classes_type, Any] = {
+        IntFlag: 0, BoolFlag: False, StringFlag: "", IntListFlag: None, StringListFlag: (),
+        ChoiceFlag: ""}
+    column_factories: dict[flag_classes_type, Callable[[], column_classes]] = {
+        IntFlag: lambda: array("q"), BoolFlag: Bitmap, StringFlag: list, IntListFlag: list,
+        StringListFlag: list, ChoiceFlag: list}
+    dispatch = spec.dispatch
+    greedy_dispatch = spec.greedy_dispatch
+    entries: Iterable[tuple[str, _DispatchEntry | _GreedyEntry]] = chain(
+        dispatch.items(), greedy_dispatch.items())
+    result = BatchResult(
+        {name: column_factories[kind]() for name, kind in zip(spec.names, spec.kinds)},
+        {token: spec.names[entry[0]] for token, entry in entries})
+    int_positions = [position for position, kind in enumerate(spec.kinds) if kind is IntFlag]
+    placeholder_row = tuple(placeholders[kind] for kind in spec.kinds)
+    int_list_positions = [position for position, kind in enumerate(spec.kinds)
+                          if kind is IntListFlag]
+
+    def placeholder() -> list[Any]:
+        # Each failed row gets its own empty arrays, like the other rows.
+        row = list(placeholder_row)
+        for position in int_list_positions:
+            row[position] = array("q")
+        return row
+
+    defaults = list(spec.defaults)
+    # Each row gets its own copy of the default arrays of IntListFlags.
+    copied_defaults = [position for position, kind in enumerate(spec.kinds)
+                       if kind is IntListFlag and defaults[position] is not None]
+    errors = result.errors
+
+    required_positions = [position for position, default in enumerate(defaults) if default is None]
+
+    lookup = dispatch.get
+    known_names = spec.known_names
+    rows: list[Sequence[flag_value]] = []
+    first_row = 0  # Index of rows[0].
+    for row_index, argv in enumerate(argvs):
+        row = defaults.copy()
+        tokens = iter(argv)
+        try:
+            next(tokens, None)  # Program path.
+            _scan_tokens(tokens, row, lookup, greedy_dispatch, known_names, _refuse_unknown_flag,
+                         None)
+            for position in copied_defaults:
+                if row[position] is defaults[position]:
+                    row[position] = row[position][:]
+            for position in required_positions:
+                if row[position] is None:
+                    missing_flags = ", ".join(name for name, value in zip(spec.names, row)
+                                              if value is None)
+                    raise AssertionError(
+                        f"You need to pass the following obligatory flags: {missing_flags}")
+        except (ValueError, AssertionError) as error:
+            errors[row_index] = error
+            row = placeholder()
+        rows.append(row)
+
+        if len(rows) == _BATCH_ROWS_PER_TRANSPOSE:
+            _append_rows(result, rows, first_row, int_positions, placeholder)
+            first_row += len(rows)
+            rows = []
+    _append_rows(result, rows, first_row, int_positions, placeholder)
+    return result
+
+
+_process_spec: Optional[_BatchSpec] = None  # Of the pool processes of parse_many.
+
+
+def _set_process_spec(spec: _BatchSpec) -> None:
+    global _process_spec
+    _process_spec = spec
+
+
+def _parse_process_chunk(parse_chunk: Callable[[_BatchSpec, Any], BatchResult],
+                         chunk: list[Any]) -> BatchResult:
+    assert _process_spec is not None
+    return parse_chunk(_process_spec, chunk)
+
+
+def _refuse_unknown_flag(token: str) -> NoReturn:
+    # What parse_many does with an unknown flag, instead of printing suggestions.
+    raise ValueError(f"Couldn't understand token `{token}`. It is not a valid flag in this \
+program.")
+
+
+def _parse_string_batch(spec: _BatchSpec, command_lines: Iterable[str]) -> BatchResult:
+    return _parse_batch(spec, (_split_command_line(command_line, spec.dispatch,
+                                                   spec.greedy_dispatch)
+                               for command_line in command_lines))
+
+
+def _append_rows(result: BatchResult, rows: list[Sequence[flag_value]], first_row: int,
+                 int_positions: list[int], placeholder: Callable[[], list[Any]]) -> None:
+    # Transposes the rows and appends them to the columns of the result.
+    from array import array
+    columns = list(result.columns.values())
+    values_by_column = list(zip(*rows)) if rows else [() for _ in columns]
+    try:
+        int_columns = {position: array("q", values_by_column[position])
+                       for position in int_positions}
+    except OverflowError:
+        # Some int doesn't fit in 64 bits. Turn those rows into errors and try again.
+        for row_offset, row in enumerate(rows):
+            for position in int_positions:
+                if not -2**63 <= row[position] < 2**63:  # type: ignore[operator]
+                    result.errors[first_row + row_offset] = ValueError(
+                        f"`{row[position]}` doesn't fit in the 64 bit column of \
+`{list(result.columns)[position]}`.")
+                    rows[row_offset] = placeholder()
+                    break
+        _append_rows(result, rows, first_row, int_positions, placeholder)
+        return
+
+    for position, column in enumerate(columns):
+        column.extend(int_columns.get(position, values_by_column[position]))
+    result.rows += len(rows)
+
+
+class _NGramIndex:
+    """Bigram index over words, used to find every word within a Levenshtein distance of a query.
+
+    Each edit destroys at most two of a word's bigrams, so a word within `tolerance` edits of the \
+    query shares all but `2 * tolerance` of the query's bigrams. Candidates come from the posting \
+    lists of the rarest `2 * tolerance + 1` bigrams of the query (at least one must be shared), are \
+    filtered by how many bigrams they share, and only then checked with the (bounded) distance."""
+
+    def __init__(self) -> None:
+        # Parallel lists indexed by word id. The bigram sets are only built for words that come up \
+        # as candidates, which keeps the index small and cheap to load back from disk.
+        self._words: list[str] = []
+        self._payloads: list[int] = []
+        self._bigrams: list[Optional[frozenset[str]]] = []
+        self._word_ids: dict[str, int] = {}
+        # bigram -> word length -> ids of the words with that length that contain the bigram
+        self._postings: dict[str, dict[int, list[int]]] = {}
+        # bigram -> ids of the words that contain it, as the bytes of an array("I"), for an index
+        # loaded from disk. Turned into entries of _postings when a search needs them.
+        self._packed_postings: dict[str, bytes] = {}
+        self._by_length: dict[int, list[int]] = {}  # length -> ids of the words with that length
+
+    def add(self, word: str, payload: int) -> None:
+        if word in self._word_ids:
+            return  # Already indexed.
+        word_id = len(self._words)
+        self._words.append(word)
+        self._payloads.append(payload)
+        self._bigrams.append(None)
+        self._word_ids[word] = word_id
+        self._by_length.setdefault(len(word), []).append(word_id)
+        for bigram in {word[i:i+2] for i in range(len(word) - 1)}:
+            self._postings.setdefault(bigram, {}).setdefault(len(word), []).append(word_id)
+
+    def search(self, word: str, tolerance: int) -> list[tuple[int, int, str]]:
+        """Returns (distance, payload, word) for every indexed word within `tolerance`."""
+        bigrams = [word[i:i+2] for i in range(len(word) - 1)]
+        probes = 2 * tolerance + 1
+        unique_bigrams = frozenset(bigrams)
+        # Bigrams shared with a close enough word, not counting repeated bigrams of the query.
+        minimum_shared = len(bigrams) - 2 * tolerance - (len(bigrams) - len(unique_bigrams))
+        # Words more than `tolerance` characters longer or shorter can't be close enough.
+        lengths = range(len(word) - tolerance, len(word) + tolerance + 1)
+        candidates: set[int] = set()
+        if len(unique_bigrams) < probes:
+            # Too short for the filter to guarantee anything, check every word of a close length.
+            for length in lengths:
+                candidates.update(self._by_length.get(length, ()))
+        else:
+            def posting_size(bigram: str) -> int:
+                by_length = self._posting(bigram)
+                return sum(len(by_length.get(length, ())) for length in lengths)
+
+            for bigram in sorted(unique_bigrams, key=posting_size)[:probes]:
+                by_length = self._posting(bigram)
+                for length in lengths:
+                    candidates.update(by_length.get(length, ()))
+
+        matches: list[tuple[int, int, str]] = []
+        for word_id in candidates:
+            candidate = self._words[word_id]
+            candidate_bigrams = self._bigrams[word_id]
+            if candidate_bigrams is None:
+                candidate_bigrams = frozenset(candidate[i:i+2] for i in range(len(candidate) - 1))
+                self._bigrams[word_id] = candidate_bigrams
+            if len(unique_bigrams & candidate_bigrams) < minimum_shared:
+                continue
+            distance = levenshtein_distance(word, candidate, tolerance)
+            if distance <= tolerance:
+                matches.append((distance, self._payloads[word_id], candidate))
+        return matches
+
+    def _posting(self, bigram: str) -> dict[int, list[int]]:
+        posting = self._postings.get(bigram)
+        if posting is None:
+            packed = self._packed_postings.get(bigram)
+            if packed is None:
+                return {}
+            from array import array
+            word_ids = array("I")
+            word_ids.frombytes(packed)
+            posting = {}
+            for word_id in word_ids:
+                posting.setdefault(len(self._words[word_id]), []).append(word_id)
+            self._postings[bigram] = posting
+        return posting
+
+    def dump(self) -> tuple[tuple[str, ...], tuple[int, ...], dict[str, bytes]]:
+        """Returns the words, their payloads and the packed posting lists, for marshal."""
+        from array import array
+        packed = dict(self._packed_postings)
+        for bigram, by_length in self._postings.items():
+            packed[bigram] = array("I", chain.from_iterable(by_length.values())).tobytes()
+        return tuple(self._words), tuple(self._payloads), packed
+
+    @classmethod
+    def load(cls, data: Any) -> '_NGramIndex':
+        """Turns what dump returned back into an index. Raises ValueError if it isn't that."""
+        from array import array
+        words, payloads, packed = data
+        if not (isinstance(words, tuple) and isinstance(payloads, tuple)
+                and len(words) == len(payloads) and isinstance(packed, dict)
+                and all(isinstance(word, str) for word in words)
+                and all(isinstance(posting, bytes) and len(posting) % array("I").itemsize == 0
+                        for posting in packed.values())):
+            raise ValueError("Not a dumped _NGramIndex.")
+        word_ids = array("I")
+        word_ids.frombytes(b"".join(packed.values()))
+        if word_ids and max(word_ids) >= len(words):
+            raise ValueError("Not a dumped _NGramIndex.")
+        index = cls()
+        index._words = list(words)
+        index._payloads = list(payloads)
+        index._bigrams = [None] * len(words)
+        index._word_ids = dict(zip(words, range(len(words))))
+        index._packed_postings = packed
+        for word_id, word in enumerate(words):
+            index._by_length.setdefault(len(word), []).append(word_id)
+        return index
+
+
+def levenshtein_distance(str1: str, str2: str, tolerance: Optional[int] = None) -> int:
+    """Levenshtein distance using dynamic programming, keeping only one row of the table.
+
+    Args:
+        str1 (str): The origin string.
+        str2 (str): The target string.
+        tolerance (Optional[int], optional): If given, stop as soon as the distance is known to \
+            be larger than `tolerance` and return `tolerance + 1`. Defaults to None.
+
+    Returns:
+        int: The levenshtein distance (or `tolerance + 1`, if it is larger than `tolerance`).
+    """
+    if str1 == str2:
+        return 0
+    if len(str1) < len(str2):
+        # The distance is symmetric, so keep the shorter string as the row.
+        str1, str2 = str2, str1
+    if tolerance is not None and len(str1) - len(str2) > tolerance:
+        return tolerance + 1  # Would need too many insertions alone.
+    if len(str2) == 0:
+        return len(str1)
+
+    if tolerance is None:
+        previous_row = list(range(len(str2) + 1))
+        for i, char1 in enumerate(str1, 1):
+            current_row = [i]
+            for j, char2 in enumerate(str2, 1):
+                current_row.append(min(previous_row[j] + 1,                     # deletion
+                                       current_row[j - 1] + 1,                  # insertion
+                                       previous_row[j - 1] + (char1 != char2)))  # substitution
+            previous_row = current_row
+        return previous_row[-1]
+
+    # With a tolerance, only the cells at most `tolerance` away from the diagonal can hold a
+    # distance within it. Everything else is capped at `tolerance + 1`.
+    too_far = tolerance + 1
+    previous_row = [j if j <= tolerance else too_far for j in range(len(str2) + 1)]
+    for i, char1 in enumerate(str1, 1):
+        current_row = [too_far] * (len(str2) + 1)
+        if i <= tolerance:
+            current_row[0] = i
+        low = max(1, i - tolerance)
+        high = min(len(str2), i + tolerance)
+        for j in range(low, high + 1):
+            current_row[j] = min(previous_row[j] + 1,                          # deletion
+                                 current_row[j - 1] + 1,                       # insertion
+                                 previous_row[j - 1] + (char1 != str2[j - 1]))  # substitution
+        if min(current_row[low - 1:high + 1]) > tolerance:
+            return too_far  # The distance can only grow from here.
+        previous_row = current_row
+
+    return min(previous_row[-1], too_far)
 
 
 def naive_levenshtein_distance(str1: str, str2: str) -> int:
-    """Naive recursive implementation of Levenshtein distance
+    """Naive recursive implementation of Levenshtein distance. Exponential time, prefer \
+    `levenshtein_distance`.
 
     Args:
         str1 (str): The origin string.
@@ -449,7 +3289,6 @@ def naive_levenshtein_distance(str1: str, str2: str) -> int:
         int: The levenshtein distance.
     """
 
-    # TODO: write the non-naive dynamic programming version of lev distance
     if len(str2) == 0:  # Goal is empty string
         return len(str1)  # Remove all characters
     elif len(str1) == 0:  # Start is empty string
@@ -0,0 +1,98 @@
+import shlex
+
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1, aliases=["--count"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+@pytest.mark.parametrize("content", [
+    "--tags a b\nc",
+    "--tags 'a b' \"c d\" e\\ f",
+    '--tags x"y z"w \'it\'"s" ""',
+    "--tags \t\n  a\r\n\n",
+    "--tags é ü",
+])
+def test_tokens_match_shlex_split(tmp_path, content):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text(content, encoding="utf-8")
+    result = build_handler().parse_result(["prog", f"@{argfile}"])
+    assert result["--tags"] == tuple(shlex.split(content)[1:])
+
+
+def test_argfiles_nest(tmp_path):
+    inner = tmp_path / "inner.txt"
+    inner.write_text("--tags 'a b' c\n")
+    outer = tmp_path / "outer.txt"
+    outer.write_text(f'--name x" "y @{inner} -c 2\n')
+    result = build_handler().parse_result(["prog", f"@{outer}"])
+    assert result["--name"] == "x y"
+    assert result["--tags"] == ("a b", "c")
+    assert result["-c"] == 2
+
+
+def test_argfile_cycle_is_refused(tmp_path):
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text(f"-c 2 @{second}\n")
+    second.write_text(f"-v @{first}\n")
+    with pytest.raises(ValueError, match="includes itself"):
+        build_handler().parse_result(["prog", f"@{first}"])
+
+
+def test_same_file_twice_is_not_a_cycle(tmp_path):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text("-v\n")
+    with pytest.warns(UserWarning, match="Already parsed flag `-v`"):
+        result = build_handler().parse_result(["prog", f"@{argfile}", "-c", "3", f"@{argfile}"])
+    assert result["-v"] is True and result["-c"] == 3
+
+
+@pytest.mark.parametrize("content", ["-n 'open", '-n "open', "-n open\\"])
+def test_unclosed_quotes_are_refused(tmp_path, content):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text(content)
+    with pytest.raises(ValueError, match="No closing quotation"):
+        build_handler().parse_result(["prog", f"@{argfile}"])
+
+
+def test_missing_and_empty_files(tmp_path):
+    with pytest.raises(ValueError, match="Couldn't read the argument file"):
+        build_handler().parse_result(["prog", f"@{tmp_path / 'missing.txt'}"])
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+    assert build_handler().parse_result(["prog", f"@{empty}"])["-c"] == 1
+
+
+def test_changed_files_are_read_again(tmp_path):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text("-c 2\n")
+    fh = build_handler()
+    assert fh.parse_result(["prog", f"@{argfile}"])["-c"] == 2
+    assert fh.parse_result(["prog", f"@{argfile}"])["-c"] == 2  # From the cached offsets.
+    argfile.write_text("-c 33 -v\n")
+    result = fh.parse_result(["prog", f"@{argfile}"])
+    assert result["-c"] == 33 and result["-v"] is True
+
+
+def test_big_file(tmp_path):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text("--tags " + " ".join(f"tag-{i}" for i in range(100_000)) + " -c 5\n")
+    result = build_handler().parse_result(["prog", f"@{argfile}"])
+    assert len(result["--tags"]) == 100_000
+    assert result["--tags"][-1] == "tag-99999"
+    assert result["-c"] == 5
+
+
+def test_lone_at_sign_is_not_a_file():
+    with pytest.raises(ValueError, match="Couldn't understand token `@`"):
+        build_handler().parse_result(["prog", "@"])
@@ -0,0 +1,89 @@
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1, aliases=["--count"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+def rows(result: flags.BatchResult) -> list[dict]:
+    return [{name: column[row] for name, column in result.columns.items()}
+            for row in range(len(result))]
+
+
+ARGVS = [
+    ["prog"],
+    ["prog", "-n", "x", "-c", "3", "-v"],
+    ["prog", "--ids", "1", "2", "--tags", "a", "-c", "4"],
+    ["prog", "-c", "not-a-number"],
+    ["prog", "--name", "y", "--name", "z"],
+]
+
+
+def test_parse_many_reports_row_errors():
+    result = build_handler().parse_many([
+        ["prog", "-c", "2"],
+        ["prog", "-c", "not-a-number"],
+        ["prog", "--unknown"],
+        ["prog", "-c", "3"],
+        ["prog", "-c"],
+    ])
+    assert sorted(result.errors) == [1, 2, 4]
+    assert isinstance(result.errors[1], ValueError)
+    assert isinstance(result.errors[2], ValueError)
+    assert isinstance(result.errors[4], AssertionError)
+    assert list(result.columns["-c"]) == [2, 0, 0, 3, 0]  # Rows with errors get placeholders.
+
+
+def test_rows_match_parse_result():
+    fh = build_handler()
+    argvs = ARGVS[:3]
+    assert rows(fh.parse_many(argvs)) == [dict(fh.parse_result(argv).items()) for argv in argvs]
+
+
+def test_repeated_flags_dont_warn(recwarn):
+    result = build_handler().parse_many([["prog", "--name", "y", "--name", "z"]])
+    assert result["-n"] == ["z"]
+    assert not recwarn
+
+
+def test_failed_rows_get_arrays_of_their_own():
+    result = build_handler().parse_many([["prog", "--unknown"], ["prog", "-c", "x"]])
+    first, second = result["--ids"]
+    assert len(first) == len(second) == 0
+    first.append(1)
+    assert len(second) == 0
+
+
+def test_rows_read_argument_files(tmp_path):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text("-n 'from file' --tags a b\n")
+    result = build_handler().parse_many([["prog", f"@{argfile}", "-c", "2"],
+                                         ["prog", "@missing-file"]])
+    assert result["-n"][0] == "from file"
+    assert result["--tags"][0] == ("a", "b")
+    assert result["-c"][0] == 2
+    assert list(result.errors) == [1]
+
+
+def test_dash_is_a_value_in_rows(monkeypatch):
+    fh = flags.FlagHandler("Test program.")
+    fh.str_list_flag("--files", "Files.", stdin=True)
+    monkeypatch.setattr("sys.stdin", None)  # Reading it would fail.
+    assert fh.parse_many([["prog", "--files", "-"]])["--files"][0] == ("-",)
+
+
+def test_processes_give_the_same_result():
+    fh = build_handler()
+    argvs = ARGVS * 7
+    local = fh.parse_many(argvs)
+    pooled = fh.parse_many(argvs, processes=2, chunk_size=5)
+    assert rows(pooled) == rows(local)
+    assert {row: str(error) for row, error in pooled.errors.items()} == \
+        {row: str(error) for row, error in local.errors.items()}
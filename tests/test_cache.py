@@ -0,0 +1,118 @@
+import os
+import random
+
+import pytest
+
+import flags
+
+
+def build_handler(cache_dir=None, description="Test program.") -> flags.FlagHandler:
+    fh = flags.FlagHandler(description)
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x")
+    fh.int_flag("--count", "Count.", 1)
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.compile(cache_dir=cache_dir)
+    return fh
+
+
+def suggest(fh: flags.FlagHandler, attempt: str) -> list[str]:
+    return [flag.flag for flag in fh._find_closest_flags(attempt)]
+
+
+def fail(*args):
+    raise AssertionError("built again")
+
+
+def test_warm_runs_load_instead_of_building(tmp_path, monkeypatch):
+    cold = build_handler(str(tmp_path))
+    assert suggest(cold, "--nmae") == ["--name"]
+    help_message = cold._generate_help_message("prog")
+    assert len(os.listdir(tmp_path)) == 2
+
+    monkeypatch.setattr(flags.FlagHandler, "_build_suggestion_index", fail)
+    monkeypatch.setattr(flags.FlagHandler, "_render_help_message", fail)
+    warm = build_handler(str(tmp_path))
+    assert suggest(warm, "--nmae") == ["--name"]
+    assert warm._generate_help_message("prog") == help_message
+
+
+def test_other_flags_dont_share_the_files(tmp_path):
+    build_handler(str(tmp_path))._generate_help_message("prog")
+    other = build_handler(str(tmp_path), "Another program.")
+    assert other._generate_help_message("prog").startswith("Another program.")
+    assert len(os.listdir(tmp_path)) == 2
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"\x80\x09garbage",  # Once an unsupported pickle protocol.
+    b"\xff" * 64,
+    b"c\x00\x00\x00",  # Cut short.
+])
+def test_unreadable_files_are_rebuilt(tmp_path, content):
+    build_handler(str(tmp_path))._generate_help_message("prog")
+    suggest(build_handler(str(tmp_path)), "--nmae")
+    for name in os.listdir(tmp_path):
+        (tmp_path / name).write_bytes(content)
+
+    fh = build_handler(str(tmp_path))
+    assert suggest(fh, "--nmae") == ["--name"]
+    assert fh._generate_help_message("prog").startswith("Test program.")
+    assert all((tmp_path / name).read_bytes() != content for name in os.listdir(tmp_path))
+
+
+def test_files_of_the_wrong_shape_are_rebuilt(tmp_path):
+    import marshal
+    suggest(build_handler(str(tmp_path)), "--nmae")
+    build_handler(str(tmp_path))._generate_help_message("prog")
+    for name in os.listdir(tmp_path):
+        (tmp_path / name).write_bytes(marshal.dumps((("--name",), (99,), {"-n": b"\x05\0\0\0"})))
+
+    fh = build_handler(str(tmp_path))
+    assert suggest(fh, "--nmae") == ["--name"]
+    assert fh._generate_help_message("prog").startswith("Test program.")
+
+
+def test_unwritable_cache_dir_still_works(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("not a directory")
+    fh = build_handler(str(blocker / "cache"))
+    assert suggest(fh, "--nmae") == ["--name"]
+    assert fh._generate_help_message("prog").startswith("Test program.")
+
+
+def test_config_values_round_trip(tmp_path, monkeypatch):
+    config = tmp_path / "config.toml"
+    config.write_text('ids = [1, 2, 3]\nname = "from config"\n')
+    cache_dir = tmp_path / "cache"
+
+    def parse():
+        fh = flags.FlagHandler("Test program.")
+        fh.str_flag("--name", "Name.", "x")
+        fh.int_list_flag("--ids", "Ids.", [7])
+        fh.config_file(str(config))
+        fh.compile(cache_dir=str(cache_dir))
+        return fh.parse_result(["prog"])
+
+    cold = parse()
+    assert len(os.listdir(cache_dir)) == 1
+    flags._config_cache.clear()  # As in a new process.
+    monkeypatch.setattr(flags, "_read_config_file", fail)
+    warm = parse()
+    assert list(warm["--ids"]) == list(cold["--ids"]) == [1, 2, 3]
+    assert warm["--name"] == "from config"
+    assert warm.source("--ids") == "config"
+
+
+def test_index_dump_and_load_search_alike():
+    rng = random.Random(0)
+    index = flags._NGramIndex()
+    words = {"".join(rng.choice("abc-") for _ in range(rng.randint(1, 9))) for _ in range(400)}
+    for payload, word in enumerate(sorted(words)):
+        index.add(word, payload)
+    loaded = flags._NGramIndex.load(index.dump())
+    for query in rng.sample(sorted(words), 30) + ["", "a", "abcabcabc", "zzz"]:
+        for tolerance in range(4):
+            assert sorted(loaded.search(query, tolerance)) == sorted(index.search(query, tolerance))
+    assert loaded.dump()[:2] == index.dump()[:2]
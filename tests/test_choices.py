@@ -0,0 +1,80 @@
+import pytest
+
+import flags
+
+
+def build_handler(**choice_args) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x")
+    fh.choice_flag("--region", "Region.", "eu-west", **choice_args)
+    return fh
+
+
+def test_given_choice_is_accepted():
+    fh = build_handler(choices=["eu-west", "eu-north", "us-east"])
+    assert fh.parse_result(["prog", "--region", "us-east"])["--region"] == "us-east"
+    assert fh.parse_result(["prog"])["--region"] == "eu-west"
+
+
+def test_choices_file_is_only_read_when_the_flag_is_given(tmp_path):
+    path = tmp_path / "regions.txt"
+    fh = build_handler(choices_file=str(path))
+    region = fh._find("--region")
+    assert fh.parse_result(["prog", "--name", "y"])["--region"] == "eu-west"
+    assert region._choices is None
+    assert "One of the lines of" in fh._generate_help_message("prog")
+    assert region._choices is None
+
+    path.write_text("eu-west\n\n  us-east  \n")
+    assert fh.parse_result(["prog", "--region", "us-east"])["--region"] == "us-east"
+    assert region.choices == {"eu-west", "us-east"}
+
+
+def test_missing_choices_file_is_reported(tmp_path):
+    fh = build_handler(choices_file=str(tmp_path / "missing.txt"))
+    with pytest.raises(ValueError, match="Couldn't read the choices of the flag `--region`"):
+        fh.parse_result(["prog", "--region", "eu-west"])
+
+
+def test_choices_and_file_are_exclusive(tmp_path):
+    with pytest.raises(ValueError, match="Give either"):
+        build_handler()
+    with pytest.raises(ValueError, match="Give either"):
+        build_handler(choices=["a"], choices_file=str(tmp_path / "choices.txt"))
+
+
+def test_mistyped_value_gets_the_closest_choices():
+    fh = build_handler(choices=["eu-west", "eu-north", "us-east", "ap-south"])
+    with pytest.raises(ValueError, match="`eu-wset` is not one of the choices of `--region`. "
+                                         "Maybe you meant: eu-west"):
+        fh.parse_result(["prog", "--region", "eu-wset"])
+    with pytest.raises(ValueError) as raised:
+        fh.parse_result(["prog", "--region", "nowhere-at-all"])
+    assert "Maybe" not in str(raised.value)
+
+
+def test_suggestions_are_sorted_and_limited():
+    region = build_handler(choices=[f"zone-{i}" for i in range(20)])._find("--region")
+    suggestions = region._closest_choices("zone-1")
+    assert len(suggestions) == 5
+    assert suggestions[0] == "zone-1"
+
+
+def test_help_shows_only_a_few_choices():
+    choices = [f"zone-{i}" for i in range(12)]
+    help_message = build_handler(choices=choices)._generate_help_message("prog")
+    assert "One of: zone-0, zone-1, zone-2, zone-3, zone-4 (and 7 more)." in help_message
+    assert "zone-5" not in help_message
+
+    short = build_handler(choices=["a", "b"])._generate_help_message("prog")
+    assert "One of: a, b." in short
+
+
+def test_complete_choices(tmp_path):
+    path = tmp_path / "regions.txt"
+    path.write_text("eu-west\neu-north\nus-east\n")
+    region = build_handler(choices_file=str(path))._find("--region")
+    assert region._complete("eu-") == ["eu-north", "eu-west"]
+    assert region._complete("") == ["eu-north", "eu-west", "us-east"]
+    assert region._complete("x") == []
@@ -0,0 +1,190 @@
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import flags
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.int_flag("--count", "Count.", 1)
+    fh.bool_flag("--verbose", "Verbose.")
+    fh.choice_flag("--region", "Region.", "eu-west", choices=["eu-west", "eu-north", "us-east"])
+    return fh
+
+
+def test_prefix_trie_matches_brute_force():
+    rng = random.Random(0)
+    words = {"".join(rng.choice("ab-") for _ in range(rng.randint(1, 6))) for _ in range(300)}
+    trie = flags._PrefixTrie()
+    for word in words:
+        trie.add(word)
+    for prefix in ["", "a", "-", "ab", "b-a", "aaaa", "zz", *rng.sample(sorted(words), 20)]:
+        assert trie.complete(prefix) == sorted(word for word in words if word.startswith(prefix))
+
+
+def test_complete_flags_choices_and_values():
+    fh = build_handler()
+    assert fh.complete(["--"]) == ["--count", "--help", "--name", "--region", "--verbose"]
+    assert fh.complete(["--verbose", "--c"]) == ["--count"]
+    assert fh.complete(["--region", "eu-"]) == ["eu-north", "eu-west"]
+    assert fh.complete(["--count", ""]) == []  # The value of a flag.
+    assert fh.complete([]) == fh.complete([""])
+
+
+def test_complete_subcommands():
+    fh = build_handler()
+    fh.subcommand("deploy", "Deploy.", build_handler)
+    fh.subcommand("destroy", "Destroy.", build_handler)
+    assert fh.complete(["de"]) == ["deploy", "destroy"]
+    assert fh.complete(["deploy", "--re"]) == ["--region"]
+
+
+PROGRAM = f"""#!{sys.executable}
+import sys
+sys.path.insert(0, {ROOT!r})
+sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})
+import test_completion
+test_completion.build_handler().parse(sys.argv)
+print("the program ran")
+"""
+
+
+@pytest.fixture
+def program(tmp_path):
+    path = tmp_path / "mytool"
+    path.write_text(PROGRAM)
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_completion_variable_answers_instead_of_running(program):
+    output = subprocess.run([program, "--re"], env={**os.environ, "FLAGS_COMPLETE": "1"},
+                            capture_output=True, text=True, check=True).stdout
+    assert output == "--region\n"
+
+
+def test_bash_script_runs_the_program(program):
+    if shutil.which("bash") is None:
+        pytest.skip("bash isn't installed")
+    script = build_handler().completion_script("mytool", "bash")
+    output = subprocess.run(
+        ["bash", "-c", script + f'COMP_WORDS=({program} --verbose --c); COMP_CWORD=2; '
+         '_flags_complete_mytool; printf "%s\\n" "${COMPREPLY[@]}"'],
+        capture_output=True, text=True, check=True).stdout
+    assert output == "--count\n"
+
+
+def test_zsh_script_runs_the_program(program):
+    if shutil.which("zsh") is None:
+        pytest.skip("zsh isn't installed")
+    script = build_handler().completion_script("mytool", "zsh")
+    # Stand-ins for the functions of zsh's completion system.
+    stubs = 'compdef() { :; }\ncompadd() { shift; printf "%s\\n" "${(@P)1}"; }\n'
+    output = subprocess.run(
+        ["zsh", "-c", stubs + script + f'words=({program} --re); CURRENT=2; '
+         '_flags_complete_mytool'],
+        capture_output=True, text=True, check=True).stdout
+    assert output == "--region\n"
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "completion.sock")
+    server = flags.CompletionServer(path)
+    server.register("mytool", build_handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    yield server
+    server.shutdown()
+    thread.join()
+    assert not os.path.exists(path)
+
+
+def ask(path: str, request: bytes) -> bytes:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(request)
+        answer = b""
+        while chunk := client.recv(4096):
+            answer += chunk
+    return answer
+
+
+def test_server_round_trip(server):
+    assert ask(server.socket_path, b"mytool\0--region\0eu\0\n") == b"eu-north\neu-west\n"
+    assert ask(server.socket_path, b"mytool\0--v\0\n") == b"--verbose\n"
+    assert ask(server.socket_path, b"unknown\0--v\0\n") == b""
+
+
+def test_server_refuses_a_live_socket_or_other_files(server, tmp_path):
+    with pytest.raises(ValueError, match="listening"):
+        flags.CompletionServer(server.socket_path).serve_forever()
+    other = tmp_path / "not-a-socket"
+    other.write_text("data")
+    with pytest.raises(ValueError, match="isn't a socket"):
+        flags.CompletionServer(str(other)).serve_forever()
+    assert other.read_text() == "data"
+
+
+def test_server_replaces_a_stale_socket(tmp_path):
+    path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(path)  # Bound, then closed without listening: nobody answers.
+    server = flags.CompletionServer(path)
+    server.register("mytool", build_handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        for _ in range(100):
+            try:
+                assert ask(path, b"mytool\0--n\0\n") == b"--name\n"
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                time.sleep(0.01)
+        else:
+            pytest.fail("the server never answered")
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+# Stands in for `socat - UNIX-CONNECT:<path>` where socat isn't installed.
+SOCAT = f"""#!{sys.executable}
+import socket, sys
+with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+    client.connect(sys.argv[2].removeprefix("UNIX-CONNECT:"))
+    client.sendall(sys.stdin.buffer.read())
+    while chunk := client.recv(4096):
+        sys.stdout.buffer.write(chunk)
+"""
+
+
+def test_bash_script_asks_the_server(server, tmp_path):
+    if shutil.which("bash") is None:
+        pytest.skip("bash isn't installed")
+    path = os.environ["PATH"]
+    if shutil.which("socat") is None:
+        (tmp_path / "bin").mkdir()
+        (tmp_path / "bin" / "socat").write_text(SOCAT)
+        (tmp_path / "bin" / "socat").chmod(0o755)
+        path = f"{tmp_path / 'bin'}{os.pathsep}{path}"
+    script = build_handler().completion_script("mytool", "bash", server.socket_path)
+    output = subprocess.run(
+        ["bash", "-c", script + 'COMP_WORDS=(/not/run --region us); COMP_CWORD=2; '
+         '_flags_complete_mytool; printf "%s\\n" "${COMPREPLY[@]}"'],
+        env={**os.environ, "PATH": path}, capture_output=True, text=True, check=True).stdout
+    assert output == "us-east\n"
@@ -0,0 +1,56 @@
+"""Tests of the parse paths of `flags`. Run from the repository root with `python -m pytest`."""
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1, aliases=["--count"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.str_list_flag("--tags", "Tags.")
+    fh.choice_flag("--mode", "Mode.", "fast", choices=["fast", "slow"])
+    return fh
+
+
+ARGVS = [
+    ["prog"],
+    ["prog", "-n", "x", "-c", "3", "-v"],
+    ["prog", "--name", "y", "--ids", "1", "2", "3", "--count", "4"],
+    ["prog", "--tags", "a", "b", "--mode", "slow", "--ids"],
+    ["prog", "--verbose", "--ids", "-1", "--tags"],
+]
+
+
+def as_dict(result: flags.ParseResult) -> dict:
+    return dict(result.items())
+
+
+@pytest.mark.parametrize("argv", ARGVS)
+def test_compiled_parser_matches_uncompiled(argv):
+    expected = as_dict(build_handler().parse_result(argv))
+
+    compiled = build_handler()
+    compiled.compile()
+    assert as_dict(compiled.parse_result(argv)) == expected
+
+    instrumented = build_handler()
+    instrumented.instrumentation = flags.LatencyCollector()
+    assert as_dict(instrumented.parse_result(argv)) == expected
+
+    stream = build_handler().stream(argv[0])
+    stream.feed_many(argv[1:])
+    assert as_dict(stream.close()) == expected
+
+    columns = build_handler().parse_many([argv]).columns
+    assert {name: column[0] for name, column in columns.items()} == expected
+
+
+def test_parse_updates_flag_data():
+    fh = flags.FlagHandler("Test program.")
+    count = fh.int_flag("-c", "Count.", 1)
+    fh.parse(["prog", "-c", "5"])
+    assert count.data == 5
@@ -0,0 +1,57 @@
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.int_flag("--count", "Count.", optional=False)
+    return fh
+
+
+def test_help_is_rendered_once_per_program_path(monkeypatch):
+    fh = build_handler()
+    help_message = fh._generate_help_message("/usr/bin/prog")
+    assert "USAGE: python prog --count <int> [OPTIONAL-FLAGS]" in help_message
+    assert "--name" in help_message and "(alt.: -n)" in help_message
+
+    def fail(*args):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(flags.FlagHandler, "_render_help_message", fail)
+    assert fh._generate_help_message("/usr/bin/prog") is help_message
+
+
+def test_new_flags_show_up_in_the_help():
+    fh = build_handler()
+    before = fh._generate_help_message("prog")
+    fh.bool_flag("--verbose", "Be verbose.")
+    after = fh._generate_help_message("prog")
+    assert "--verbose" not in before
+    assert "Be verbose." in after
+    assert after.replace(fh._describe_flag(fh._find("--verbose")) + "\n", "") == before
+
+
+def test_new_subcommands_and_descriptions_show_up_in_the_help():
+    fh = build_handler()
+    fh._generate_help_message("prog")
+    fh.subcommand("deploy", "Deploy it.", build_handler)
+    help_message = fh._generate_help_message("prog")
+    assert "SUBCOMMANDS:" in help_message and "Deploy it." in help_message
+    assert "python prog <subcommand> [SUBCOMMAND-FLAGS]" in help_message
+    fh.program_description = "Another description."
+    assert fh._generate_help_message("prog").startswith("Another description.\n")
+
+
+def test_help_flag_prints_the_cached_help():
+    fh = build_handler()
+    printed = []
+    fh.output_function = printed.append
+    try:
+        fh.parse(["prog", "--help"])
+    except AssertionError:
+        pass  # --count is obligatory.
+    assert printed == [fh._generate_help_message("prog")]
+    fh.compile()
+    printed.clear()
+    fh.parse(["prog", "-h", "--count", "1"])
+    assert printed == [fh._generate_help_message("prog")]
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import flags
+
+
+class Recorder(flags.Instrumentation):
+    def __init__(self):
+        self.records = []
+
+    def record(self, phase, elapsed_ns, count):
+        self.records.append((phase, count))
+
+
+def build_handler(instrumentation) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.int_flag("--count", "Count.", 1)
+    fh.bool_flag("--verbose", "Verbose.")
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.str_flag("--token", "Token.")  # Obligatory.
+    fh.instrumentation = instrumentation
+    return fh
+
+
+def test_every_phase_of_a_parse_is_recorded_once():
+    recorder = Recorder()
+    fh = build_handler(recorder)
+    count = next(flag for flag in fh.flags if flag.flag == "--count")
+    fh.add_validator(count, lambda count: count > 0)
+    fh.parse_result(["prog", "-n", "y", "--ids", "1", "2", "--verbose", "--token", "t"])
+    # 4 flags looked up; 2 single values and 2 list values converted; --count and -h defaulted.
+    assert recorder.records == [("lookup", 4), ("conversion", 4), ("validation", 0),
+                                ("defaults", 2), ("required", 1)]
+    recorder.records.clear()
+    fh.parse_result(["prog", "--count", "3", "--token", "t"])
+    assert recorder.records == [("lookup", 2), ("conversion", 2), ("validation", 1),
+                                ("defaults", 4), ("required", 1)]
+
+
+def test_failed_parses_are_recorded_too():
+    recorder = Recorder()
+    fh = build_handler(recorder)
+    with pytest.raises(ValueError):
+        fh.parse_result(["prog", "--count", "3", "--nmae", "y"])
+    assert [phase for phase, _ in recorder.records] == ["suggestion", "lookup", "conversion"]
+    assert recorder.records[1:] == [("lookup", 2), ("conversion", 1)]
+
+    recorder.records.clear()
+    with pytest.raises(AssertionError):
+        fh.parse_result(["prog"])  # --token is missing.
+    assert recorder.records == [("lookup", 0), ("conversion", 0), ("defaults", 5),
+                                ("required", 1)]
+
+
+def test_stream_and_batch_phases():
+    recorder = Recorder()
+    fh = build_handler(recorder)
+    stream = fh.stream("prog")
+    stream.feed_many(["--token", "t"])
+    stream.close()
+    assert [phase for phase, _ in recorder.records] == ["defaults", "required"]
+    recorder.records.clear()
+    fh.parse_many([["prog", "--token", "t"]])
+    assert recorder.records == []
+
+
+def test_uninstrumented_results_are_the_same():
+    argv = ["prog", "-n", "y", "--ids", "1", "2", "--verbose", "--token", "t"]
+    plain = build_handler(None).parse_result(argv)
+    collected = build_handler(flags.LatencyCollector()).parse_result(argv)
+    assert dict(collected.items()) == dict(plain.items())
+
+
+def test_threads_keep_their_counts_apart():
+    recorder = Recorder()
+    fh = build_handler(recorder)
+    parser = fh.compile()
+    short = ["prog", "--token", "t"]
+    long = ["prog", "--ids", *map(str, range(50)), "--token", "t"]
+
+    def parse(argv):
+        for _ in range(200):
+            parser.parse_result(argv)
+
+    threads = [threading.Thread(target=parse, args=(argv,)) for argv in (short, long) * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {count for phase, count in recorder.records if phase == "conversion"} == {1, 51}
+    assert {count for phase, count in recorder.records if phase == "lookup"} == {1, 2}
+
+
+def test_latency_collector_summary():
+    collector = flags.LatencyCollector()
+    fh = build_handler(collector)
+    for _ in range(3):
+        fh.parse_result(["prog", "--count", "2", "--token", "t"])
+    summary = collector.summary()
+    assert summary["lookup"]["calls"] == 3
+    assert summary["lookup"]["items"] == 6
+    assert summary["suggestion"]["calls"] == 0
+    assert collector.percentile("lookup", 50) >= 1
+    assert "lookup" in collector.report()
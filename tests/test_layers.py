@@ -0,0 +1,128 @@
+import pytest
+
+import flags
+
+
+def build_handler(config=None, table=None, required=False) -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.int_flag("--count", "Count.", 1, env="TEST_FLAGS_COUNT")
+    fh.int_list_flag("--ids", "Ids.", [7], env="TEST_FLAGS_IDS")
+    fh.str_list_flag("--tags", "Tags.", env="TEST_FLAGS_TAGS")
+    fh.choice_flag("--mode", "Mode.", "fast", choices=["fast", "slow"], env="TEST_FLAGS_MODE")
+    if config is not None:
+        fh.config_file(str(config), table, required)
+    return fh
+
+
+def test_layer_precedence_and_source(tmp_path, monkeypatch):
+    config = tmp_path / "config.toml"
+    config.write_text('name = "from config"\ncount = 5\nmode = "slow"\n')
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "default", aliases=["--name"], env="TEST_FLAGS_NAME")
+    fh.int_flag("--count", "Count.", 1, env="TEST_FLAGS_COUNT")
+    fh.str_flag("--mode", "Mode.", "fast")
+    fh.bool_flag("-v", "Verbose.")
+    fh.config_file(str(config))
+    monkeypatch.setenv("TEST_FLAGS_NAME", "from env")
+    monkeypatch.setenv("TEST_FLAGS_COUNT", "3")
+
+    result = fh.parse_result(["prog", "--count", "9"])
+    assert (result["-n"], result["--count"], result["--mode"], result["-v"]) == \
+        ("from env", 9, "slow", False)
+    assert result.sources() == {"-h": "default", "-n": "env", "--count": "argv",
+                                "--mode": "config", "-v": "default"}
+    assert result.source("--name") == "env"
+
+    monkeypatch.delenv("TEST_FLAGS_NAME")
+    result = fh.parse_result(["prog"])
+    assert (result["-n"], result["--count"]) == ("from config", 3)
+    assert result.source("-n") == "config"
+
+
+def test_config_file_errors_are_reported(tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text('count = "three"\nunknown = 1\n')
+    fh = flags.FlagHandler("Test program.")
+    fh.int_flag("--count", "Count.", 1)
+    fh.config_file(str(config))
+    with pytest.raises(flags.ValidationError) as raised:
+        fh.parse_result(["prog"])
+    assert set(raised.value.errors) == {"count", "unknown"}
+
+
+def test_bad_env_value_only_fails_when_used(monkeypatch):
+    fh = build_handler()
+    monkeypatch.setenv("TEST_FLAGS_COUNT", "three")
+    monkeypatch.setenv("TEST_FLAGS_MODE", "medium")
+    result = fh.parse_result(["prog", "--count", "2", "--mode", "slow"])
+    assert (result["--count"], result["--mode"]) == (2, "slow")
+    with pytest.raises(ValueError, match="From the environment variable TEST_FLAGS_COUNT"):
+        fh.parse_result(["prog", "--mode", "slow"])
+    with pytest.raises(ValueError, match="From the environment variable TEST_FLAGS_MODE"):
+        fh.parse_result(["prog", "--count", "2"])
+
+
+def test_list_env_values_are_split_on_whitespace(monkeypatch):
+    fh = build_handler()
+    monkeypatch.setenv("TEST_FLAGS_IDS", " 1\t2\n3 ")
+    monkeypatch.setenv("TEST_FLAGS_TAGS", "a  b")
+    result = fh.parse_result(["prog"])
+    assert list(result["--ids"]) == [1, 2, 3]
+    assert list(result["--tags"]) == ["a", "b"]
+    assert result.source("--ids") == result.source("--tags") == "env"
+
+    monkeypatch.setenv("TEST_FLAGS_IDS", "")
+    assert list(fh.parse_result(["prog"])["--ids"]) == []
+
+
+def test_env_changes_are_seen_by_the_next_parse(monkeypatch):
+    fh = build_handler()
+    monkeypatch.setenv("TEST_FLAGS_COUNT", "3")
+    assert fh.parse_result(["prog"])["--count"] == 3
+    monkeypatch.setenv("TEST_FLAGS_COUNT", "4")
+    assert fh.parse_result(["prog"])["--count"] == 4
+    monkeypatch.delenv("TEST_FLAGS_COUNT")
+    result = fh.parse_result(["prog"])
+    assert (result["--count"], result.source("--count")) == (1, "default")
+
+
+def test_missing_config_file(tmp_path):
+    missing = tmp_path / "missing.toml"
+    assert build_handler(missing).parse_result(["prog"]).source("--count") == "default"
+    with pytest.raises(ValueError, match="doesn't exist"):
+        build_handler(missing, required=True).parse_result(["prog"])
+
+
+def test_config_table(tmp_path):
+    config = tmp_path / "pyproject.toml"
+    config.write_text('count = 1\n[tool.prog]\ncount = 5\nids = [1, 2]\n[other]\nnot-a-flag = 1\n')
+    result = build_handler(config, "tool.prog").parse_result(["prog"])
+    assert (result["--count"], list(result["--ids"])) == (5, [1, 2])
+    assert result.source("--ids") == "config"
+
+    result = build_handler(config, "tool.missing").parse_result(["prog"])
+    assert result.sources()["--count"] == "default"
+    with pytest.raises(ValueError, match="isn't a table"):
+        build_handler(config, "count").parse_result(["prog"])
+
+
+def test_config_file_changes_are_read_again(tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text("count = 5\n")
+    fh = build_handler(config)
+    assert fh.parse_result(["prog"])["--count"] == 5
+    config.write_text("count = 66\n")  # Another size, whatever the modification time.
+    assert fh.parse_result(["prog"])["--count"] == 66
+
+
+def test_config_values_are_checked(tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text('mode = "medium"\nids = [1, "2"]\n')
+    with pytest.raises(flags.ValidationError) as raised:
+        build_handler(config).parse_result(["prog"])
+    assert set(raised.value.errors) == {"mode", "ids"}
+    config.write_text("count = [1\n")
+    with pytest.raises(ValueError, match="isn't valid TOML"):
+        build_handler(config).parse_result(["prog"])
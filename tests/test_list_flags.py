@@ -0,0 +1,72 @@
+import io
+from array import array
+
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.int_list_flag("--ids", "Ids.", [7], aliases=["-i"], stdin=True)
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_values_end_at_the_next_known_flag(compiled):
+    fh = build_handler()
+    if compiled:
+        fh.compile()
+    result = fh.parse_result(["prog", "--tags", "a", "-x", "--y", "-i", "1", "-2", "--verbose"])
+    assert result["--tags"] == ("a", "-x", "--y")  # Unknown names are values.
+    assert result["--ids"] == array("q", [1, -2])
+    assert result["-v"] is True
+
+
+def test_defaults_and_empty_lists():
+    fh = build_handler()
+    assert fh.parse_result(["prog"])["--ids"] == array("q", [7])
+    assert fh.parse_result(["prog"])["--tags"] == ()
+    result = fh.parse_result(["prog", "--ids", "--tags"])
+    assert result["--ids"] == array("q") and result["--tags"] == ()
+
+
+def test_flag_data_is_set():
+    fh = flags.FlagHandler("Test program.")
+    ids = fh.int_list_flag("--ids", "Ids.")
+    tags = fh.str_list_flag("--tags", "Tags.")
+    fh.parse(["prog", "--ids", "3", "4", "--tags", "x"])
+    assert ids.data == array("q", [3, 4])
+    assert tags.data == ("x",)
+
+
+def test_list_flag_error_names_the_bad_value():
+    with pytest.raises(ValueError, match=r"value 1 of the list"):
+        build_handler().parse_result(["prog", "--ids", "1", "x", "3"])
+    result = build_handler().parse_many([["prog", "--ids", "1", "2", "y"]])
+    assert "value 2 of the list" in str(result.errors[0])
+
+
+def test_ints_that_dont_fit_in_64_bits_are_refused():
+    with pytest.raises(ValueError, match="value 1 of the list"):
+        build_handler().parse_result(["prog", "--ids", "1", str(2**63)])
+    assert build_handler().parse_result(["prog", "--ids", str(-2**63)])["--ids"][0] == -2**63
+
+
+def test_dash_reads_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("1 2\n3\n"))
+    assert build_handler().parse_result(["prog", "--ids", "-"])["--ids"] == array("q", [1, 2, 3])
+    # Only for flags with stdin=True, and only as the single value.
+    monkeypatch.setattr("sys.stdin", io.StringIO("ignored"))
+    assert build_handler().parse_result(["prog", "--tags", "-"])["--tags"] == ("-",)
+    assert build_handler().parse_result(["prog", "--tags", "-", "a"])["--tags"] == ("-", "a")
+
+
+def test_dash_reads_stdin_in_streams(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("4 5"))
+    stream = build_handler().stream("prog")
+    stream.feed_many(["--ids", "-", "-v"])
+    assert stream.close()["--ids"] == array("q", [4, 5])
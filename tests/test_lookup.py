@@ -0,0 +1,48 @@
+import pytest
+
+import flags
+
+
+def test_find_by_name_and_alias():
+    fh = flags.FlagHandler("Test program.")
+    name = fh.str_flag("--name", "Name.", "x", aliases=["-n", "--nom"])
+    count = fh.int_flag("--count", "Count.", 1)
+    assert fh._find("--name") is name
+    assert fh._find("-n") is name
+    assert fh._find("--nom") is name
+    assert fh._find("--count") is count
+    assert fh._find("--unknown") is None
+    assert fh._find("name") is None
+
+
+@pytest.mark.parametrize("name, aliases", [
+    ("--name", None),  # Same name.
+    ("--other", ["-n"]),  # Alias of another flag.
+    ("-n", None),  # Name that is an alias of another flag.
+    ("--other", ["--name"]),  # Alias that is the name of another flag.
+    ("deploy", None),  # Name of a subcommand.
+])
+def test_duplicates_are_refused(name, aliases):
+    fh = flags.FlagHandler("Test program.")
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.subcommand("deploy", "Deploy.", lambda: flags.FlagHandler("Deploy."))
+    with pytest.raises(ValueError, match="already in use"):
+        fh.bool_flag(name, "Duplicate.", aliases=aliases)
+    assert [flag.flag for flag in fh.flags] == ["--name"]
+    assert fh._find("--other") is None
+
+
+def test_subcommand_named_like_a_flag_is_refused():
+    fh = flags.FlagHandler("Test program.")
+    fh.str_flag("--name", "Name.", "x", aliases=["deploy"])
+    with pytest.raises(ValueError, match="already in use"):
+        fh.subcommand("deploy", "Deploy.", lambda: flags.FlagHandler("Deploy."))
+
+
+def test_many_flags_are_found():
+    fh = flags.FlagHandler("Test program.")
+    created = [fh.int_flag(f"--flag-{i}", "A flag.", i, aliases=[f"-f{i}"]) for i in range(5000)]
+    for i in (0, 1234, 4999):
+        assert fh._find(f"--flag-{i}") is created[i]
+        assert fh._find(f"-f{i}") is created[i]
+    assert fh.parse_result(["prog", "-f4321", "7"])["--flag-4321"] == 7
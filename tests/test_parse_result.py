@@ -0,0 +1,78 @@
+import random
+import threading
+
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.int_flag("--count", "Count.", 1)
+    fh.bool_flag("--verbose", "Verbose.")
+    fh.int_list_flag("--ids", "Ids.", [7])
+    return fh
+
+
+def test_result_is_an_immutable_mapping():
+    fh = build_handler()
+    name = fh._find("--name")
+    result = fh.parse_result(["prog", "-n", "y", "--verbose"])
+    assert result[name] == result["--name"] == result["-n"] == "y"
+    assert "-n" in result and name in result and "--other" not in result
+    assert list(result) == ["-h", "--name", "--count", "--verbose", "--ids"]
+    assert len(result) == 5
+    assert result.get("--other", "missing") == "missing"
+    assert result == {"-h": False, "--name": "y", "--count": 1, "--verbose": True,
+                      "--ids": result["--ids"]}
+    with pytest.raises(AttributeError):
+        result.program_path = "other"
+    with pytest.raises(AttributeError):
+        del result._values
+    with pytest.raises(TypeError):
+        result["--name"] = "z"  # type: ignore[index]
+    with pytest.raises(TypeError):
+        hash(result)
+
+
+def test_parse_result_leaves_the_flags_alone():
+    fh = build_handler()
+    count = fh._find("--count")
+    fh.parse_result(["prog", "--count", "5"])
+    assert count._data is None
+    fh.parse(["prog", "--count", "6"])
+    assert count.data == 6
+
+
+def test_results_get_their_own_arrays():
+    fh = build_handler()
+    first = fh.parse_result(["prog"])
+    second = fh.parse_result(["prog"])
+    first["--ids"].append(8)
+    assert list(second["--ids"]) == [7]
+    assert list(fh.parse_result(["prog"])["--ids"]) == [7]
+
+
+def test_threads_share_a_parser():
+    fh = build_handler()
+    fh.compile()
+    rng = random.Random(0)
+    argvs = [["prog", "-n", f"name-{i}", "--count", str(i), *(["--verbose"] if i % 2 else []),
+              "--ids", *map(str, range(i % 5))] for i in range(200)]
+    expected = [dict(fh.parse_result(argv).items()) for argv in argvs]
+    failures = []
+
+    def parse(order):
+        for i in order:
+            if dict(fh.parse_result(argvs[i]).items()) != expected[i]:
+                failures.append(i)
+
+    threads = [threading.Thread(target=parse, args=(rng.sample(range(200), 200),))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
@@ -0,0 +1,91 @@
+import shlex
+
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1, aliases=["--count"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.bool_flag("-q", "Quiet.")
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+def as_dict(result: flags.ParseResult) -> dict:
+    return dict(result.items())
+
+
+def first_row(batch: flags.BatchResult) -> dict:
+    return {name: column[0] for name, column in batch.columns.items()}
+
+
+@pytest.mark.parametrize("command_line", [
+    "prog",
+    "prog -n 'two words' -c 3",
+    'prog --name "with \\"quotes\\"" --tags a "b c" d',
+    "prog --tags it\\'s \"\" -v",
+    "prog -n a\\ b --ids 1 2",
+    "  prog\t-c 3  \n",
+])
+def test_parse_string_matches_shlex_split(command_line):
+    fh = build_handler()
+    expected = as_dict(fh.parse_result(shlex.split(command_line)))
+    assert as_dict(fh.parse_string(command_line)) == expected
+    assert first_row(fh.parse_strings([command_line])) == expected
+
+
+@pytest.mark.parametrize("command_line", ["prog -n 'open", 'prog -n "open', "prog -n open\\"])
+def test_parse_string_rejects_unclosed_quote(command_line):
+    with pytest.raises(ValueError, match="No closing quotation"):
+        build_handler().parse_string(command_line)
+
+
+@pytest.mark.parametrize("command_line, expected", [
+    ("prog --name=x", ["prog", "--name", "x"]),
+    ("prog --name=a=b", ["prog", "--name", "a=b"]),
+    ("prog --name=", ["prog", "--name", ""]),
+    ("prog -vq", ["prog", "-v", "-q"]),
+    ("prog -vn5", ["prog", "-v", "-n", "5"]),
+    ("prog -vn 5", ["prog", "-v", "-n", "5"]),
+    ("prog -n -vq", ["prog", "-n", "-vq"]),  # The value of a flag is never rewritten.
+])
+def test_equals_and_bundled_switches(command_line, expected):
+    fh = build_handler()
+    assert as_dict(fh.parse_string(command_line)) == as_dict(fh.parse_result(expected))
+
+
+@pytest.mark.parametrize("command_line, unknown", [
+    ("prog --verbose=yes", "--verbose=yes"),  # A switch takes no value.
+    ("prog -vx", "-vx"),
+])
+def test_unknown_rewrites_are_reported_whole(command_line, unknown):
+    with pytest.raises(ValueError, match=unknown):
+        build_handler().parse_string(command_line)
+
+
+@pytest.mark.parametrize("command_line", ["", "   ", "\n"])
+def test_empty_command_line_is_refused(command_line):
+    with pytest.raises(ValueError, match="The command line is empty"):
+        build_handler().parse_string(command_line)
+
+
+def test_parse_strings_empty_lines_give_defaults():
+    batch = build_handler().parse_strings(["prog -c 2 -v", "", "prog --name=y"])
+    assert batch.rows == 3
+    assert not batch.errors
+    assert list(batch.columns["-c"]) == [2, 1, 1]
+    assert list(batch.columns["-v"]) == [True, False, False]
+    assert batch.columns["-n"] == ["anonymous", "anonymous", "y"]
+
+
+def test_parse_strings_keeps_bad_rows_as_errors():
+    batch = build_handler().parse_strings(["prog -c 2", "prog -c two", "prog 'open"])
+    assert batch.rows == 3
+    assert set(batch.errors) == {1, 2}
+    assert list(batch.columns["-c"])[0] == 2
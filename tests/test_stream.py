@@ -0,0 +1,71 @@
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1, aliases=["--count"])
+    fh.bool_flag("-v", "Verbose.", aliases=["--verbose"])
+    fh.int_list_flag("--ids", "Ids.", [7])
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+def test_stream_feed_and_close():
+    fh = build_handler()
+    stream = fh.stream("prog")
+    for token in ["-n", "streamed", "--ids", "4", "5", "-v"]:
+        stream.feed(token)
+    result = stream.close()
+    assert result["-n"] == "streamed"
+    assert list(result["--ids"]) == [4, 5]
+    assert result["-v"] is True
+    with pytest.raises(AssertionError):
+        stream.feed("-c")
+    with pytest.raises(AssertionError):
+        stream.close()
+
+
+def test_stream_rejects_unknown_flag():
+    stream = build_handler().stream("prog")
+    with pytest.raises(ValueError):
+        stream.feed("--unknown")
+
+
+def test_stream_rejects_a_bad_value_when_it_arrives():
+    stream = build_handler().stream("prog")
+    stream.feed("-c")
+    with pytest.raises(ValueError, match="not a valid value"):
+        stream.feed("three")
+
+
+def test_missing_value_is_reported_at_close():
+    stream = build_handler().stream("prog")
+    stream.feed("--name")
+    with pytest.raises(AssertionError, match="Expected more arguments for flag `--name`"):
+        stream.close()
+
+
+def test_feed_many_takes_a_generator():
+    stream = build_handler().stream("prog")
+    stream.feed_many(token for token in ["--tags", "a", "b", "--count", "2"])
+    with pytest.warns(UserWarning, match="Already parsed flag `--tags`"):
+        stream.feed_many(["--tags", "c"])  # The last one wins.
+    result = stream.close()
+    assert result["--tags"] == ("c",)
+    assert result["-c"] == 2
+    assert result.source("-n") == "default"
+
+
+def test_stream_reads_argument_files(tmp_path):
+    argfile = tmp_path / "args.txt"
+    argfile.write_text("--ids 1 2\n")
+    stream = build_handler().stream("prog")
+    stream.feed_many(["--tags", "a", f"@{argfile}", "-v"])
+    result = stream.close()
+    assert list(result["--ids"]) == [1, 2]
+    assert result["--tags"] == ("a",)
+    assert result["-v"] is True
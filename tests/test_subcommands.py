@@ -0,0 +1,117 @@
+import sys
+import threading
+
+import pytest
+
+import flags
+
+built = []
+
+
+def build_deploy() -> flags.FlagHandler:
+    built.append("deploy")
+    fh = flags.FlagHandler("Deploy.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--region", "Region.", "eu")
+    fh.bool_flag("--dry-run", "Don't change anything.")
+    return fh
+
+
+def build_handler(printed=None) -> flags.FlagHandler:
+    built.clear()
+    fh = flags.FlagHandler("Tool.")
+    fh.output_function = (printed.append if printed is not None else lambda text: None)
+    fh.bool_flag("--verbose", "Verbose.")
+    fh.subcommand("deploy", "Deploys.", build_deploy)
+    fh.subcommand("destroy", "Destroys.", build_deploy)
+    return fh
+
+
+def test_only_the_given_subcommand_is_built():
+    fh = build_handler()
+    result = fh.parse(["tool", "deploy", "--region", "us", "--dry-run"])
+    assert result.subcommand == "deploy"
+    assert result.program_path == "tool deploy"
+    assert result["--region"] == "us" and result["--dry-run"] is True
+    assert built == ["deploy"]
+    assert fh._subcommands["deploy"].loaded and not fh._subcommands["destroy"].loaded
+    fh.parse_result(["tool", "deploy"])
+    assert built == ["deploy"]  # Built once, then kept.
+
+
+def test_a_flag_in_place_of_the_subcommand_is_the_tools_own():
+    fh = build_handler()
+    result = fh.parse_result(["tool", "--verbose"])
+    assert result.subcommand is None and result["--verbose"] is True
+    assert built == []
+
+
+def test_missing_and_unknown_subcommands():
+    printed = []
+    fh = build_handler(printed)
+    with pytest.raises(AssertionError, match="You need to pass a subcommand: deploy, destroy"):
+        fh.parse_result(["tool"])
+    assert "SUBCOMMANDS:" in printed[0]
+    printed.clear()
+    with pytest.raises(ValueError, match="deplyo"):
+        fh.parse_result(["tool", "deplyo"])
+    assert "Unknown subcommand `deplyo`. Maybe you meant:" in printed[0]
+    assert "deploy" in "".join(printed)
+
+
+def test_subcommands_from_a_module_path(tmp_path, monkeypatch):
+    (tmp_path / "lazy_commands.py").write_text(
+        "import flags\n"
+        "handler = flags.FlagHandler('Lazy.')\n"
+        "handler.int_flag('--level', 'Level.', 3)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    fh = flags.FlagHandler("Tool.")
+    fh.subcommand("lazy", "Lazy.", "lazy_commands:handler")
+    assert "lazy_commands" not in sys.modules
+    assert fh.parse_result(["tool", "lazy", "--level", "5"])["--level"] == 5
+    assert "lazy_commands" in sys.modules
+    monkeypatch.delitem(sys.modules, "lazy_commands")
+
+
+@pytest.mark.parametrize("name, factory, message", [
+    ("deploy", build_deploy, "already in use"),
+    ("--verbose", build_deploy, "already in use"),
+    ("-x", build_deploy, "can't start with"),
+    ("@x", build_deploy, "can't start with"),
+    ("bad", "no_colon_here", "package.module:attribute"),
+])
+def test_bad_subcommands_are_refused(name, factory, message):
+    fh = build_handler()
+    with pytest.raises(ValueError, match=message):
+        fh.subcommand(name, "Bad.", factory)
+
+
+def test_factory_must_give_a_handler():
+    fh = flags.FlagHandler("Tool.")
+    fh.subcommand("odd", "Odd.", lambda: "not a handler")
+    with pytest.raises(ValueError, match="Expected the subcommand odd to be built into a"):
+        fh.parse_result(["tool", "odd"])
+
+
+def test_handler_is_built_once_across_threads():
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        calls.append(1)
+        return flags.FlagHandler("Sub.")
+
+    subcommand = flags.FlagHandler("Tool.").subcommand("sub", "Sub.", factory)
+    handlers = []
+
+    def get():
+        barrier.wait()
+        handlers.append(subcommand.handler)
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(handler is handlers[0] for handler in handlers)
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import flags
+
+
+def table_distance(str1: str, str2: str) -> int:
+    # The full dynamic-programming table, as the reference.
+    rows = [[i + j if i == 0 or j == 0 else 0 for j in range(len(str2) + 1)]
+            for i in range(len(str1) + 1)]
+    for i in range(1, len(str1) + 1):
+        for j in range(1, len(str2) + 1):
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1,
+                             rows[i - 1][j - 1] + (str1[i - 1] != str2[j - 1]))
+    return rows[-1][-1]
+
+
+def random_word(rng: random.Random, alphabet: str = "abc-", longest: int = 9) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, longest)))
+
+
+def test_levenshtein_distance_matches_the_full_table():
+    rng = random.Random(0)
+    for _ in range(2000):
+        str1, str2 = random_word(rng), random_word(rng)
+        expected = table_distance(str1, str2)
+        assert flags.levenshtein_distance(str1, str2) == expected
+        for tolerance in range(5):
+            assert flags.levenshtein_distance(str1, str2, tolerance) == \
+                min(expected, tolerance + 1)
+
+
+def test_naive_levenshtein_distance_matches_too():
+    rng = random.Random(1)
+    for _ in range(200):
+        str1, str2 = random_word(rng, longest=6), random_word(rng, longest=6)
+        assert flags.naive_levenshtein_distance(str1, str2) == table_distance(str1, str2)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    words = sorted({random_word(rng, "ab-" if seed % 2 else "abcdefgh-") for _ in range(300)})
+    index = flags._NGramIndex()
+    for payload, word in enumerate(words):
+        index.add(word, payload)
+    index.add(words[0], 12345)  # Already indexed: ignored.
+    for query in [random_word(rng) for _ in range(30)] + rng.sample(words, 10):
+        distances = [flags.levenshtein_distance(query, word) for word in words]
+        for tolerance in range(4):
+            expected = sorted((distance, payload, word)
+                              for payload, (word, distance) in enumerate(zip(words, distances))
+                              if distance <= tolerance)
+            assert sorted(index.search(query, tolerance)) == expected
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("--name", "Name.", "x", aliases=["-n"])
+    fh.str_flag("--named", "Named.", "x")
+    fh.int_flag("--count", "Count.", 1)
+    fh.bool_flag("--verbose", "Verbose.")
+    return fh
+
+
+def test_closest_flags_are_ranked_by_distance():
+    fh = build_handler()
+    assert [flag.flag for flag in fh._find_closest_flags("--nam")] == ["--name", "--named"]
+    assert [flag.flag for flag in fh._find_closest_flags("--nmae", limit=1)] == ["--name"]
+    assert fh._find_closest_flags("--zzzzzzzz") == []
+
+
+def test_custom_distance_function_checks_every_name():
+    indexed = build_handler()
+    custom = build_handler()
+    custom.string_distance_function = flags.naive_levenshtein_distance
+    for attempt in ["--nam", "--cuont", "-m", "--verbos", "--name"]:
+        assert [flag.flag for flag in custom._find_closest_flags(attempt)] == \
+            [flag.flag for flag in indexed._find_closest_flags(attempt)]
+
+
+def test_unknown_flag_prints_suggestions():
+    fh = build_handler()
+    printed = []
+    fh.output_function = printed.append
+    with pytest.raises(ValueError, match="--verbos"):
+        fh.parse(["prog", "--verbos"])
+    assert "--verbose" in "".join(printed)
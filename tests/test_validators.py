@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import flags
+
+
+def build_handler() -> flags.FlagHandler:
+    fh = flags.FlagHandler("Test program.")
+    fh.output_function = lambda text: None
+    fh.str_flag("-n", "Name.", "anonymous", aliases=["--name"])
+    fh.int_flag("-c", "Count.", 1)
+    fh.str_list_flag("--tags", "Tags.")
+    return fh
+
+
+def test_validator_errors_are_aggregated():
+    fh = build_handler()
+    name = fh._find("-n")
+    count = fh._find("-c")
+    tags = fh._find("--tags")
+    fh.add_validator(name, lambda value: value != "bad")
+    fh.add_validator(name, lambda value: len(value) < 2)
+
+    def positive(value):
+        if value <= 0:
+            raise ValueError("must be positive")
+
+    fh.add_validator(count, positive, pure=True)
+    fh.add_validator(tags, lambda value: pytest.fail("not given, so not validated"))
+
+    with pytest.raises(flags.ValidationError) as raised:
+        fh.parse_result(["prog", "-n", "bad", "-c", "0"])
+    assert set(raised.value.errors) == {"-n", "-c"}
+    assert len(raised.value.errors["-n"]) == 2
+    assert raised.value.errors["-c"] == ["must be positive"]
+
+    assert fh.parse_result(["prog", "-n", "a", "-c", "2"])["-c"] == 2
+
+
+def test_validator_of_another_handler_is_refused():
+    flag = build_handler()._find("-n")
+    with pytest.raises(ValueError):
+        build_handler().add_validator(flag, bool)
+
+
+def test_pure_validators_are_remembered_by_value_and_type():
+    fh = flags.FlagHandler("Test program.")
+    number = fh.int_flag("-i", "Number.", 5)
+    switch = fh.bool_flag("-x", "Switch.")
+    calls = []
+
+    def record(value):
+        calls.append(value)
+
+    fh.add_validator(number, record, pure=True)
+    fh.add_validator(switch, record, pure=True)
+    fh.parse_result(["prog", "-i", "1"])
+    fh.parse_result(["prog", "-i", "1"])
+    fh.parse_result(["prog", "-x"])  # True == 1, but it's another value.
+    assert calls == [1, True]
+
+
+def test_impure_validators_run_every_time():
+    fh = build_handler()
+    calls = []
+    fh.add_validator(fh._find("-c"), calls.append)
+    fh.parse_result(["prog", "-c", "3"])
+    fh.parse_result(["prog", "-c", "3"])
+    assert calls == [3, 3]
+
+
+def test_coroutine_validators():
+    fh = build_handler()
+
+    async def not_reserved(value):
+        await asyncio.sleep(0)
+        return value != "root"
+
+    fh.add_validator(fh._find("-n"), not_reserved)
+    assert fh.parse_result(["prog", "-n", "alice"])["-n"] == "alice"
+    with pytest.raises(flags.ValidationError):
+        fh.parse_result(["prog", "-n", "root"])
+
+    async def main():
+        # Inside a running event loop: parse_result still works, and parse_result_async
+        # awaits the validators on the loop.
+        assert fh.parse_result(["prog", "-n", "bob"])["-n"] == "bob"
+        with pytest.raises(flags.ValidationError):
+            await fh.parse_result_async(["prog", "-n", "root"])
+        return (await fh.parse_result_async(["prog", "-n", "carol"]))["-n"]
+
+    assert asyncio.run(main()) == "carol"